@@ -5,12 +5,39 @@ import { runDeforestationCheck } from "../services/google-earth/deforestation/de
 import { runFloodCheck } from "../services/google-earth/flooding/flooding.js";
 import { runGlacierMeltingCheck } from "../services/google-earth/glacier/glacier_melting.js";
 import { runCoastalErosionCheck } from "../services/google-earth/coastal_erosion/coastal_erosion.js";
+import { runRenderThumbnail } from "../services/google-earth/thumbnail/render_thumbnail.js";
 import dotenv from "dotenv"
 
 dotenv.config()
 const __filename = fileURLToPath(import.meta.url);
 const __dirname = path.dirname(__filename);
 
+/**
+ * Resolves GOOGLE_APPLICATION_CREDENTIALS to an absolute, existing path.
+ * @returns {{ path?: string, error?: string }}
+ */
+function resolveCredentialsPath() {
+  let credentialsPath = process.env.GOOGLE_APPLICATION_CREDENTIALS;
+  if (
+    credentialsPath &&
+    credentialsPath.startsWith('"') &&
+    credentialsPath.endsWith('"')
+  ) {
+    credentialsPath = credentialsPath.slice(1, -1);
+  }
+  if (!credentialsPath) {
+    return { error: "GEE credentials path env not set" };
+  }
+  if (!path.isAbsolute(credentialsPath)) {
+    credentialsPath = path.resolve(process.cwd(), credentialsPath);
+  }
+  console.log("Resolved credentialsPath:", credentialsPath);
+  if (!fs.existsSync(credentialsPath)) {
+    return { error: "GEE credentials not found" };
+  }
+  return { path: credentialsPath };
+}
+
 export async function generateGEEReport(req, res) {
   try {
     const {
@@ -24,27 +51,9 @@ export async function generateGEEReport(req, res) {
      console.log("Hellooooooooooooooooooooooooooooooooooooooooooooooooo",process.env.GOOGLE_APPLICATION_CREDENTIALS);
 
      
-let credentialsPath = process.env.GOOGLE_APPLICATION_CREDENTIALS;
-if (
-  credentialsPath &&
-  credentialsPath.startsWith('"') &&
-  credentialsPath.endsWith('"')
-) {
-  credentialsPath = credentialsPath.slice(1, -1);
-}
-if (!credentialsPath) {
-  return res
-    .status(500)
-    .json({ success: false, error: "GEE credentials path env not set" });
-}
-if (!path.isAbsolute(credentialsPath)) {
-  credentialsPath = path.resolve(process.cwd(), credentialsPath);
-}
-console.log("Resolved credentialsPath:", credentialsPath);
-if (!fs.existsSync(credentialsPath)) {
-  return res
-    .status(500)
-    .json({ success: false, error: "GEE credentials not found" });
+const credentialsPath = resolveCredentialsPath();
+if (credentialsPath.error) {
+  return res.status(500).json({ success: false, error: credentialsPath.error });
 }
 
     let analysisResult = null;
@@ -54,7 +63,7 @@ if (!fs.existsSync(credentialsPath)) {
           analysisResult = await runDeforestationCheck(
             regionGeoJson,
             regionId,
-            credentialsPath,
+            credentialsPath.path,
             threshold
           );
           break;
@@ -62,7 +71,7 @@ if (!fs.existsSync(credentialsPath)) {
           analysisResult = await runFloodCheck(
             regionGeoJson,
             regionId,
-            credentialsPath,
+            credentialsPath.path,
             thresholdPercent,
             bufferMeters
           );
@@ -71,7 +80,7 @@ if (!fs.existsSync(credentialsPath)) {
           analysisResult = await runGlacierMeltingCheck(
             regionGeoJson,
             regionId,
-            credentialsPath,
+            credentialsPath.path,
             thresholdPercent,
             bufferMeters
           );
@@ -80,7 +89,7 @@ if (!fs.existsSync(credentialsPath)) {
           analysisResult = await runCoastalErosionCheck(
             regionGeoJson,
             regionId,
-            credentialsPath,
+            credentialsPath.path,
             threshold
           );
           break;
@@ -129,3 +138,30 @@ if (!fs.existsSync(credentialsPath)) {
     return res.status(500).json({ success: false, error: err.message });
   }
 }
+
+/**
+ * Renders a thumbnail recipe (start_image_recipe / end_image_recipe from a
+ * scheduled check run with lazy thumbnails) into an image URL on demand.
+ */
+export async function renderThumbnail(req, res) {
+  const { recipe } = req.body;
+  if (!recipe || typeof recipe !== "string") {
+    return res
+      .status(400)
+      .json({ success: false, error: "A thumbnail recipe string is required." });
+  }
+  const credentialsPath = resolveCredentialsPath();
+  if (credentialsPath.error) {
+    return res.status(500).json({ success: false, error: credentialsPath.error });
+  }
+  try {
+    const result = await runRenderThumbnail(recipe, credentialsPath.path);
+    if (result.status !== "success") {
+      return res.status(400).json({ success: false, error: result.message });
+    }
+    return res.json({ success: true, url: result.url });
+  } catch (err) {
+    console.error("Error rendering thumbnail:", err);
+    return res.status(500).json({ success: false, error: err.message });
+  }
+}
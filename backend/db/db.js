@@ -1,4 +1,4 @@
-import { Sequelize } from "sequelize";
+import { Sequelize, DataTypes } from "sequelize";
 import asyncHandler from "../utils/asyncHandler.js";
 import dotenv from "dotenv";
 dotenv.config();
@@ -42,12 +42,23 @@ export const connectDb = asyncHandler(async () => {
     console.log("Database Connection has been established successfully.");
     
     // Import models after connection is established
-    import("../models/user.model.js");
-    import("../models/userSubscription.model.js");
-    import("../models/analysisResult.model.js");
+    await import("../models/user.model.js");
+    await import("../models/userSubscription.model.js");
+    await import("../models/analysisResult.model.js");
     
     // Sync Database
     await sequelize.sync();
+    // sync() doesn't add columns to existing tables; add the thumbnail recipe ones if missing
+    const queryInterface = sequelize.getQueryInterface();
+    const resultColumns = await queryInterface.describeTable("analysis_results");
+    for (const column of ["start_image_recipe", "end_image_recipe"]) {
+      if (!resultColumns[column]) {
+        await queryInterface.addColumn("analysis_results", column, {
+          type: DataTypes.TEXT,
+          allowNull: true,
+        });
+      }
+    }
     console.log("Database & tables have been recreated!");
   } catch (error) {
     console.error("Error connecting to database:", error);
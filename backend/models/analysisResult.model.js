@@ -72,6 +72,15 @@ const AnalysisResult = sequelize.define(
       type: DataTypes.INTEGER,
       allowNull: true,
     },
+    // Signed thumbnail recipes from lazy-thumbnail checks; POST /api/gee-reports/thumbnail renders them
+    start_image_recipe: {
+      type: DataTypes.TEXT,
+      allowNull: true,
+    },
+    end_image_recipe: {
+      type: DataTypes.TEXT,
+      allowNull: true,
+    },
     notification_sent: {
       type: DataTypes.DATE,
       allowNull: true,
@@ -1,7 +1,14 @@
 import express from "express";
-import { generateGEEReport } from "../controllers/geeReportController.js";
+import {
+  generateGEEReport,
+  renderThumbnail,
+} from "../controllers/geeReportController.js";
+import authMiddleware from "../middlewares/auth.middleware.js";
+
 const router = express.Router();
 
 router.post("/generate", generateGEEReport);
+// Rendering runs Earth Engine work on the service account: signed recipes, logged-in users only
+router.post("/thumbnail", authMiddleware, renderThumbnail);
 
 export default router;
@@ -16,6 +16,8 @@ import { runGlacierMeltingCheck } from "../services/google-earth/glacier/glacier
 import { runCoastalErosionCheck } from "../services/google-earth/coastal_erosion/coastal_erosion.js";
 // --- Import fire protection runner ---
 import { runFireProtectionCheck } from "../services/google-earth/fire/fire_protection.js";
+// --- Persistent worker (initializes GEE once for all jobs) ---
+import { GeeWorker } from "../services/google-earth/gee_worker.js";
 
 const __filename = fileURLToPath(import.meta.url);
 const __dirname = path.dirname(__filename);
@@ -27,6 +29,19 @@ const pythonScriptsDir = path.resolve(
   "deforestation"
 );
 
+/**
+ * Result line of a script's stdout. Scripts run with `stream: true` print NDJSON
+ * progress events ({ event: ... }) before it; the result is the last line without one.
+ */
+function parseScriptOutput(output) {
+  const lines = output.split("\n").filter((line) => line.trim());
+  for (let i = lines.length - 1; i >= 0; i--) {
+    const message = JSON.parse(lines[i]);
+    if (!message.event) return message;
+  }
+  throw new Error("No result line in script output.");
+}
+
 function runGeeScript(
   scriptName,
   regionGeoJson,
@@ -87,7 +102,7 @@ function runGeeScript(
             });
             return;
           }
-          const result = JSON.parse(trimmedOutput);
+          const result = parseScriptOutput(trimmedOutput);
           result.region_id = result.region_id || regionId;
           console.log(`   Successfully parsed output from ${scriptName}.`);
           resolve(result);
@@ -216,12 +231,17 @@ function runFireProtectionCheckWrapper(
   credentialsPath,
   days_back
 ) {
-  // days_back is how many days to look back for active fires (default: 1)
+  // days_back is how many days to look back for active fires (default: 1).
+  // Scheduled runs are incremental: only fires newer than the last run are fetched and reported,
+  // and detections are grouped into fire events that later runs extend.
   return runFireProtectionCheck(
     regionGeoJson,
     regionId,
     credentialsPath,
-    days_back ?? 1
+    days_back ?? 1,
+    true,
+    false,
+    true
   );
 }
 
@@ -234,6 +254,173 @@ function normalizeCategory(category) {
     .toUpperCase();
 }
 
+// --- Category display name to internal key mapping ---
+const categoryKeyMap = {
+  DEFORESTATION: "DEFORESTATION",
+  FLOODING: "FLOODING",
+  GLACIER_MELTING: "GLACIER",
+  COASTAL_EROSION: "COASTAL_EROSION",
+  FIRE_PROTECTION: "FIRE_PROTECTION",
+};
+
+function canonicalCategory(category) {
+  const normCat = normalizeCategory(category);
+  return categoryKeyMap[normCat] || normCat;
+}
+
+// --- Parameters sent to the GEE worker for each category ---
+function workerParamsFor(canonical, subscription) {
+  if (canonical === "DEFORESTATION") {
+    return { threshold: subscription.threshold_deforestation || -0.1 };
+  }
+  if (canonical === "FLOODING") {
+    return {
+      threshold_percent: subscription.threshold_flooding || 5.0,
+      buffer_meters: subscription.buffer_flooding || undefined,
+    };
+  }
+  if (canonical === "GLACIER") {
+    return {
+      threshold_percent: subscription.threshold_glacier || 2.0,
+      buffer_meters: subscription.buffer_glacier || undefined,
+    };
+  }
+  if (canonical === "COASTAL_EROSION") {
+    return { threshold: subscription.threshold_coastal_erosion || 5.0 };
+  }
+  if (canonical === "FIRE_PROTECTION") {
+    return {
+      days_back: subscription.days_back_fire_protection || 1,
+      incremental: true,
+      cluster: true,
+    };
+  }
+  return {};
+}
+
+// --- Categories the worker can analyse for many regions in one job ---
+// FIRE_PROTECTION batches are answered from one global fire snapshot.
+const BATCH_CATEGORIES = [
+  "DEFORESTATION",
+  "FLOODING",
+  "GLACIER",
+  "FIRE_PROTECTION",
+];
+const BATCH_SIZE = parseInt(process.env.GEE_BATCH_SIZE || "50", 10);
+// A batch job going this long without progress is abandoned (0 waits indefinitely)
+const STAGE_TIMEOUT_MS = parseInt(process.env.GEE_STAGE_TIMEOUT_MS || "0", 10);
+
+/**
+ * Runs every batchable category for all subscriptions through multi-region
+ * worker jobs. Returns a Map keyed by `${canonical}:${subscriptionId}`;
+ * subscriptions missing from it are analysed one by one as before. Region
+ * results are recorded as they stream in, so a batch that fails or times out
+ * part way keeps the regions it finished.
+ */
+async function runBatchChecks(subscriptions, geeWorker) {
+  const batchResults = new Map();
+  for (const canonical of BATCH_CATEGORIES) {
+    const regions = subscriptions
+      .filter(
+        (sub) =>
+          sub.is_active &&
+          (sub.alert_categories || []).some(
+            (category) => canonicalCategory(category) === canonical
+          )
+      )
+      .map((sub) => ({
+        region_id: sub.id.toString(),
+        geometry: sub.region_geometry,
+        ...workerParamsFor(canonical, sub),
+      }));
+
+    for (let i = 0; i < regions.length; i += BATCH_SIZE) {
+      const chunk = regions.slice(i, i + BATCH_SIZE);
+      console.log(
+        `\n--- Batch ${canonical}: regions ${i + 1}-${i + chunk.length} of ${regions.length} ---`
+      );
+      try {
+        const response = await geeWorker.runBatch(
+          canonical,
+          chunk,
+          {},
+          {
+            stageTimeoutMs: STAGE_TIMEOUT_MS,
+            onEvent: (event) => {
+              if (event.event === "region_result") {
+                batchResults.set(`${canonical}:${event.region_id}`, event.result);
+              }
+            },
+          }
+        );
+        for (const result of response.results || []) {
+          batchResults.set(`${canonical}:${result.region_id}`, result);
+        }
+      } catch (batchError) {
+        console.error(
+          `   Batch ${canonical} failed, regions will be checked individually:`,
+          batchError.message
+        );
+      }
+    }
+  }
+  return batchResults;
+}
+
+// --- Sentinel-2 categories the worker can compute from shared composites ---
+const FUSED_CATEGORIES = ["DEFORESTATION", "COASTAL_EROSION", "GLACIER"];
+
+/**
+ * Runs a subscription's remaining Sentinel-2 categories as one fused worker
+ * job when there are at least two of them. Returns a Map keyed by canonical
+ * category; categories missing from it are analysed one by one as before.
+ */
+async function runFusedChecks(subscription, canonicals, geeWorker, batchResults) {
+  const fusedResults = new Map();
+  const pending = FUSED_CATEGORIES.filter(
+    (canonical) =>
+      canonicals.includes(canonical) &&
+      !batchResults.has(`${canonical}:${subscription.id}`)
+  );
+  // A fused job uses one buffer, so points with a custom glacier buffer stay separate.
+  const customPointBuffer =
+    subscription.region_geometry?.type === "Point" &&
+    pending.includes("GLACIER") &&
+    subscription.buffer_glacier;
+  if (pending.length < 2 || customPointBuffer) return fusedResults;
+
+  const categories = {};
+  for (const canonical of pending) {
+    const { buffer_meters, ...params } = workerParamsFor(canonical, subscription);
+    categories[canonical] = params;
+  }
+  try {
+    console.log(`   -> Running fused Sentinel-2 analysis for ${pending.join(", ")}...`);
+    const response = await geeWorker.runJob(
+      "SENTINEL2_FUSED",
+      subscription.region_geometry,
+      subscription.id.toString(),
+      { categories }
+    );
+    if (response.status !== "success") {
+      console.error(
+        "   Fused analysis failed, categories will be checked individually:",
+        response.message
+      );
+      return fusedResults;
+    }
+    for (const [canonical, result] of Object.entries(response.results || {})) {
+      fusedResults.set(canonical, { ...result, region_id: response.region_id });
+    }
+  } catch (fusedError) {
+    console.error(
+      "   Fused analysis failed, categories will be checked individually:",
+      fusedError.message
+    );
+  }
+  return fusedResults;
+}
+
 async function saveAnalysisResult(resultData) {
   if (!resultData) {
     console.error("No analysis data provided to save.");
@@ -293,7 +480,12 @@ async function saveAnalysisResult(resultData) {
   }
 }
 
-async function processSubscription(subscription, credentialsPath) {
+async function processSubscription(
+  subscription,
+  credentialsPath,
+  geeWorker,
+  batchResults = new Map()
+) {
   const {
     id: subscriptionId,
     user_id,
@@ -325,15 +517,6 @@ async function processSubscription(subscription, credentialsPath) {
   );
   console.log(`   Categories: ${alert_categories.join(", ")}`);
 
-  // --- Category display name to internal key mapping ---
-  const categoryKeyMap = {
-    DEFORESTATION: "DEFORESTATION",
-    FLOODING: "FLOODING",
-    GLACIER_MELTING: "GLACIER",
-    COASTAL_EROSION: "COASTAL_EROSION",
-    FIRE_PROTECTION: "FIRE_PROTECTION",
-  };
-
   // --- Analysis Task Map ---
   const analysisTasks = {
     DEFORESTATION: {
@@ -344,6 +527,7 @@ async function processSubscription(subscription, credentialsPath) {
         credentialsPath,
         threshold_deforestation || -0.1,
       ],
+      workerParams: workerParamsFor("DEFORESTATION", subscription),
     },
     FLOODING: {
       runner: runFloodingCheck,
@@ -354,6 +538,7 @@ async function processSubscription(subscription, credentialsPath) {
         threshold_flooding || 5.0,
         buffer_flooding || undefined,
       ],
+      workerParams: workerParamsFor("FLOODING", subscription),
     },
     GLACIER: {
       runner: runGlacierCheck,
@@ -364,6 +549,7 @@ async function processSubscription(subscription, credentialsPath) {
         threshold_glacier || 2.0,
         buffer_glacier || undefined,
       ],
+      workerParams: workerParamsFor("GLACIER", subscription),
     },
     COASTAL_EROSION: {
       runner: runCoastalErosionCheckWrapper,
@@ -373,6 +559,7 @@ async function processSubscription(subscription, credentialsPath) {
         credentialsPath,
         threshold_coastal_erosion || 5.0,
       ],
+      workerParams: workerParamsFor("COASTAL_EROSION", subscription),
     },
     FIRE_PROTECTION: {
       runner: runFireProtectionCheckWrapper,
@@ -382,12 +569,21 @@ async function processSubscription(subscription, credentialsPath) {
         credentialsPath,
         days_back_fire_protection || 1, // Default to last 1 day
       ],
+      workerParams: workerParamsFor("FIRE_PROTECTION", subscription),
     },
   };
 
+  const fusedResults = geeWorker
+    ? await runFusedChecks(
+        subscription,
+        alert_categories.map(canonicalCategory),
+        geeWorker,
+        batchResults
+      )
+    : new Map();
+
   for (const category of alert_categories) {
-    const normCat = normalizeCategory(category);
-    const canonical = categoryKeyMap[normCat] || normCat;
+    const canonical = canonicalCategory(category);
     const task = analysisTasks[canonical];
     console.log(`\n   Checking category: ${category}...`);
     if (!task || !task.runner) {
@@ -400,7 +596,19 @@ async function processSubscription(subscription, credentialsPath) {
     let analysisResultData = null;
     try {
       console.log(`   -> Running analysis for ${category}...`);
-      const result = await task.runner(...task.args);
+      const batchedResult =
+        batchResults.get(`${canonical}:${subscriptionId}`) ||
+        fusedResults.get(canonical);
+      const result = batchedResult
+        ? batchedResult
+        : geeWorker
+        ? await geeWorker.runJob(
+            canonical,
+            regionGeoJson,
+            subscriptionId.toString(),
+            task.workerParams
+          )
+        : await task.runner(...task.args);
       console.log(`   --- GEE Check Result (${category}) ---`);
       console.log(JSON.stringify(result, null, 2));
 
@@ -420,6 +628,8 @@ async function processSubscription(subscription, credentialsPath) {
           previous_period_start: result.previous_period_start || null,
           previous_period_end: result.previous_period_end || null,
           buffer_radius_meters: result.buffer_radius_meters || null,
+          start_image_recipe: result.start_image_recipe || null,
+          end_image_recipe: result.end_image_recipe || null,
         };
         if (result.status !== "success") {
           delete analysisResultData.recent_period_start;
@@ -443,6 +653,8 @@ async function processSubscription(subscription, credentialsPath) {
           baseline_period_start: result.baseline_period_start || null,
           baseline_period_end: result.baseline_period_end || null,
           buffer_radius_meters: result.buffer_radius_meters || null,
+          start_image_recipe: result.start_image_recipe || null,
+          end_image_recipe: result.end_image_recipe || null,
         };
         if (result.status !== "success") {
           delete analysisResultData.recent_period_start;
@@ -465,6 +677,8 @@ async function processSubscription(subscription, credentialsPath) {
           baseline_period_start: result.baseline_period_start || null,
           baseline_period_end: result.baseline_period_end || null,
           buffer_radius_meters: result.buffer_radius_meters || null,
+          start_image_recipe: result.start_image_recipe || null,
+          end_image_recipe: result.end_image_recipe || null,
         };
         if (result.status !== "success") {
           delete analysisResultData.recent_period_start;
@@ -487,6 +701,8 @@ async function processSubscription(subscription, credentialsPath) {
           baseline_period_start: result.baseline_period_start || null,
           baseline_period_end: result.baseline_period_end || null,
           buffer_radius_meters: result.buffer_radius_meters || null,
+          start_image_recipe: result.start_image_recipe || null,
+          end_image_recipe: result.end_image_recipe || null,
         };
         if (result.status !== "success") {
           delete analysisResultData.recent_period_start;
@@ -500,10 +716,14 @@ async function processSubscription(subscription, credentialsPath) {
           user_id: user_id,
           analysis_type: canonical,
           status: result.status,
-          alert_triggered: (result.active_fire_count ?? 0) > 0,
+          // Only newly detected fires alert; the window total is still recorded.
+          alert_triggered:
+            (result.new_fire_count ?? result.active_fire_count ?? 0) > 0,
           calculated_value: result.active_fire_count ?? null,
           threshold_value: null, // you may add a threshold field if you want to trigger alerts only above a certain count
-          details: result.fires
+          details: result.fire_events
+            ? JSON.stringify(result.fire_events)
+            : result.fires
             ? JSON.stringify(result.fires)
             : result.message || null,
           recent_period_start: null,
@@ -511,6 +731,8 @@ async function processSubscription(subscription, credentialsPath) {
           baseline_period_start: null,
           baseline_period_end: null,
           buffer_radius_meters: null,
+          start_image_recipe: result.start_image_recipe || null,
+          end_image_recipe: result.end_image_recipe || null,
         };
       }
     } catch (error) {
@@ -597,9 +819,46 @@ export async function runAllChecks() {
   }
   console.log(`Found ${subscriptions.length} active subscriptions.`);
 
-  console.log("\n--- Processing subscriptions sequentially ---");
-  for (const sub of subscriptions) {
-    await processSubscription(sub.get({ plain: true }), credentialsPath);
+  // --- Start one long-lived GEE worker instead of a process per check ---
+  // Set GEE_WORKER_MODE=off to fall back to spawning one script per check.
+  let geeWorker = null;
+  if (process.env.GEE_WORKER_MODE !== "off") {
+    try {
+      // Scheduled runs don't store thumbnail URLs, so the worker returns recipes instead of
+      // calling getThumbURL (override with GEE_THUMBNAIL_MODE=eager). The recipes are saved
+      // with the result; POST /api/gee-reports/thumbnail renders one when an image is needed.
+      geeWorker = new GeeWorker(credentialsPath, {
+        thumbnailMode: process.env.GEE_THUMBNAIL_MODE || "lazy",
+      });
+      await geeWorker.start();
+    } catch (workerError) {
+      console.error(
+        "GEE worker failed to start, falling back to per-check scripts:",
+        workerError.message
+      );
+      geeWorker = null;
+    }
+  }
+
+  const plainSubscriptions = subscriptions.map((sub) =>
+    sub.get({ plain: true })
+  );
+
+  try {
+    // Batchable categories share one composite per batch instead of one per subscription.
+    let batchResults = new Map();
+    if (geeWorker) {
+      batchResults = await runBatchChecks(plainSubscriptions, geeWorker);
+    }
+
+    console.log("\n--- Processing subscriptions sequentially ---");
+    for (const sub of plainSubscriptions) {
+      await processSubscription(sub, credentialsPath, geeWorker, batchResults);
+    }
+  } finally {
+    if (geeWorker) {
+      await geeWorker.stop();
+    }
   }
 
   console.log("\n--- Main Orchestration Finished (Sequelize) ---");
@@ -0,0 +1,208 @@
+import os
+import sys
+import json
+import time
+import sqlite3
+import hashlib
+import argparse
+import datetime
+import multiprocessing
+from contextlib import closing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+# Historical backfill: runs detector jobs over a sequence of past anchor dates. Every
+# (job, anchor, chunk of regions) is a slice, run in a process pool through the worker's
+# handle_job (multi-region batches where the detector supports them). A finished slice's
+# results and its checkpoint are written in one transaction, so an interrupted backfill
+# resumes where it stopped when run again with the same arguments:
+#   python backfill.py CREDENTIALS jobs.json --start 2024-10-01 --end 2026-10-01 --step-days 30 \
+#       --workers 4 --output results.jsonl
+# Anchors are start, start + step-days, ... up to --end (default: today), so a run with the
+# same --start and --step-days resumes on the same slices whenever it is started.
+# jobs.json is one job or a list of them, shaped like worker batch jobs:
+#   {"category": "FLOODING", "threshold_percent": 5, "regions": [{"region_id": ..., "geometry": ...}, ...]}
+# --requests-per-second and --max-inflight are totals, split evenly across the processes.
+# Result caching is off and thumbnails are lazy recipes unless GEE_RESULT_CACHE /
+# GEE_THUMBNAIL_MODE say otherwise: thumbnail URLs would expire long before anyone looks.
+
+SERVICES_DIR = Path(__file__).resolve().parent
+DEFAULT_CHECKPOINT_PATH = SERVICES_DIR / '.cache' / 'backfill.sqlite3'
+DATE_FORMAT = '%Y-%m-%d'
+
+_initialized = False
+
+def anchor_dates(start, end, step_days):
+    """
+    Anchors from start forward every step_days up to end, oldest first. The grid is fixed by
+    start, so a later run (a later default end) only adds anchors and keeps the slice ids.
+    """
+    anchors = []
+    anchor = start
+    while anchor <= end:
+        anchors.append(anchor)
+        anchor += datetime.timedelta(days=step_days)
+    return anchors
+
+def load_jobs(path):
+    with open(path) as f:
+        jobs = json.load(f)
+    return jobs if isinstance(jobs, list) else [jobs]
+
+def build_slices(jobs, anchors, batch_size):
+    """[{slice_id, job, anchor}] for every job, anchor and chunk of at most batch_size regions."""
+    slices = []
+    for anchor in anchors:
+        for job in jobs:
+            regions = job.get('regions') or []
+            for i in range(0, len(regions), batch_size):
+                chunk_job = {**job, 'regions': regions[i:i + batch_size], 'anchor': anchor.strftime(DATE_FORMAT)}
+                encoded = json.dumps(chunk_job, sort_keys=True, separators=(',', ':'))
+                slices.append({'slice_id': hashlib.sha256(encoded.encode('utf-8')).hexdigest()[:24], 'job': chunk_job})
+    return slices
+
+def _connect(path):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(path), timeout=30)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS slices ("
+        " slice_id TEXT PRIMARY KEY,"
+        " finished_at REAL NOT NULL)"
+    )
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS results ("
+        " slice_id TEXT NOT NULL,"
+        " position INTEGER NOT NULL,"
+        " category TEXT NOT NULL,"
+        " anchor TEXT NOT NULL,"
+        " region_id TEXT,"
+        " status TEXT,"
+        " result TEXT NOT NULL,"
+        " PRIMARY KEY (slice_id, position))"
+    )
+    return conn
+
+def finished_slices(conn):
+    return {row[0] for row in conn.execute("SELECT slice_id FROM slices")}
+
+def forget_failed_slices(conn):
+    """Drops the checkpoints of slices with error results so they run again."""
+    with conn:
+        failed = [row[0] for row in conn.execute("SELECT DISTINCT slice_id FROM results WHERE status = 'error'")]
+        conn.executemany("DELETE FROM slices WHERE slice_id = ?", [(slice_id,) for slice_id in failed])
+        conn.executemany("DELETE FROM results WHERE slice_id = ?", [(slice_id,) for slice_id in failed])
+    return len(failed)
+
+def store_slice(conn, slice_id, job, results):
+    """Writes a slice's results and marks it finished, in one transaction."""
+    category = str(job.get('category', '')).upper()
+    with conn:
+        conn.execute("DELETE FROM results WHERE slice_id = ?", (slice_id,))
+        conn.executemany(
+            "INSERT INTO results (slice_id, position, category, anchor, region_id, status, result) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [
+                (slice_id, position, category, job['anchor'], result.get('region_id'), result.get('status'), json.dumps(result, default=str))
+                for position, result in enumerate(results)
+            ]
+        )
+        conn.execute("INSERT OR REPLACE INTO slices (slice_id, finished_at) VALUES (?, ?)", (slice_id, time.time()))
+
+def export_results(conn, slices, output_path):
+    """Writes the stored results of slices as JSON lines, in slice order."""
+    count = 0
+    with open(output_path, 'w') as f:
+        for entry in slices:
+            rows = conn.execute(
+                "SELECT category, anchor, result FROM results WHERE slice_id = ? ORDER BY position", (entry['slice_id'],)
+            )
+            for category, anchor, result in rows:
+                f.write(json.dumps({'category': category, 'anchor': anchor, **json.loads(result)}) + "\n")
+                count += 1
+    return count
+
+def init_process(credentials_path):
+    global _initialized
+    import gee_worker
+    _initialized = gee_worker.initialize_gee(credentials_path)
+
+def run_slice(slice_id, job):
+    """Runs one slice in a pool process; returns its per-region results."""
+    if not _initialized:
+        raise RuntimeError("GEE initialization failed in backfill process.")
+    import gee_worker
+    category = str(job.get('category', '')).upper()
+    params = {key: value for key, value in job.items() if key != 'regions'}
+    if category in gee_worker.BATCH_DETECTORS and len(job['regions']) > 1:
+        return gee_worker.handle_job({**job, 'job_id': slice_id}).get('results', [])
+    return [
+        gee_worker.handle_job({**params, **region, 'job_id': slice_id})
+        for region in job['regions']
+    ]
+
+def main():
+    parser = argparse.ArgumentParser(description="Run detectors over a range of past anchor dates.")
+    parser.add_argument('credentials', help="service account key file")
+    parser.add_argument('jobs', help="JSON file with one job or a list of jobs (category, params, regions)")
+    parser.add_argument('--start', required=True, help="first anchor date (YYYY-MM-DD); anchors follow every --step-days")
+    parser.add_argument('--end', help="no anchors after this date (default: today)")
+    parser.add_argument('--step-days', type=int, default=30, help="days between anchors")
+    parser.add_argument('--workers', type=int, default=4, help="processes")
+    parser.add_argument('--batch-size', type=int, default=50, help="regions per slice")
+    parser.add_argument('--requests-per-second', type=float,
+                        default=float(os.environ.get('GEE_REQUESTS_PER_SECOND', 10)), help="EE request rate, all processes together")
+    parser.add_argument('--max-inflight', type=int,
+                        default=int(os.environ.get('GEE_MAX_INFLIGHT_REQUESTS', 4)), help="EE requests in flight, all processes together")
+    parser.add_argument('--checkpoint', default=str(DEFAULT_CHECKPOINT_PATH), help="SQLite file with finished slices and their results")
+    parser.add_argument('--retry-errors', action='store_true', help="run slices with error results again")
+    parser.add_argument('--output', help="write this backfill's results here as JSON lines when done")
+    args = parser.parse_args()
+
+    workers = max(1, args.workers)
+    # Read by common.ee_requests when the pool processes import it
+    os.environ['GEE_REQUESTS_PER_SECOND'] = str(args.requests_per_second / workers)
+    os.environ.setdefault('GEE_REQUESTS_BURST', os.environ['GEE_REQUESTS_PER_SECOND'])
+    os.environ['GEE_MAX_INFLIGHT_REQUESTS'] = str(max(1, args.max_inflight // workers))
+    os.environ.setdefault('GEE_RESULT_CACHE', 'off')
+    os.environ.setdefault('GEE_THUMBNAIL_MODE', 'lazy')
+
+    utc = datetime.timezone.utc
+    start = datetime.datetime.strptime(args.start, DATE_FORMAT).replace(tzinfo=utc)
+    end = datetime.datetime.strptime(args.end, DATE_FORMAT).replace(tzinfo=utc) if args.end else datetime.datetime.now(utc)
+    anchors = anchor_dates(start, end, max(1, args.step_days))
+    slices = build_slices(load_jobs(args.jobs), anchors, max(1, args.batch_size))
+
+    with closing(_connect(Path(args.checkpoint))) as conn:
+        if args.retry_errors:
+            print(f"Retrying {forget_failed_slices(conn)} slices with errors.", file=sys.stderr)
+        done = finished_slices(conn)
+        pending = [entry for entry in slices if entry['slice_id'] not in done]
+        print(f"Backfill: {len(anchors)} anchors, {len(slices)} slices, {len(slices) - len(pending)} already done, {workers} processes.", file=sys.stderr)
+
+        failed = 0
+        if pending:
+            # spawn: pool processes start clean instead of forking this process' state
+            context = multiprocessing.get_context('spawn')
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                     initializer=init_process, initargs=(args.credentials,)) as executor:
+                futures = {executor.submit(run_slice, entry['slice_id'], entry['job']): entry for entry in pending}
+                for finished, future in enumerate(as_completed(futures), 1):
+                    entry = futures[future]
+                    job = entry['job']
+                    label = f"{job.get('category')} @ {job['anchor']} ({len(job['regions'])} regions)"
+                    try:
+                        results = future.result()
+                    except Exception as e:
+                        failed += 1
+                        print(f"ERROR: Slice {label} failed, it will run again next time: {e}", file=sys.stderr)
+                        continue
+                    store_slice(conn, entry['slice_id'], job, results)
+                    errors = sum(1 for result in results if result.get('status') == 'error')
+                    print(f"[{finished}/{len(pending)}] {label}: {len(results)} results, {errors} errors", file=sys.stderr)
+
+        if args.output:
+            count = export_results(conn, slices, args.output)
+            print(f"Wrote {count} results to {args.output}.", file=sys.stderr)
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
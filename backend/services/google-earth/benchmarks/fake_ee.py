@@ -0,0 +1,161 @@
+import sys
+import json
+import time
+import random
+import threading
+
+# Offline stand-in for the earthengine-api module, used by run_benchmarks.py. Every ee.* call
+# builds a node of an expression graph, as the real client does; only the round trips
+# (getInfo, getThumbURL, data.computePixels) are "sent": each one sleeps LATENCY_SECONDS (plus
+# up to JITTER_SECONDS), answers from the graph with placeholder values, and is recorded with
+# its request and response sizes. Scenarios set RESPONSES to pin the values returned for
+# ee.Dictionary keys (e.g. a fire sample) so a detector takes its normal success path.
+
+LATENCY_SECONDS = 0.2
+JITTER_SECONDS = 0.0
+SCENE_COUNT = 3
+NUMBER = 0.1
+BAND_NAMES = ['NDVI', 'NDWI', 'NDSI', 'water', 'flood_water', 'area', 'area_km2', 'glacier', 'valid', 'before', 'after']
+POINT = [10.0, 45.0]
+RESPONSES = {}
+
+_calls_lock = threading.Lock()
+_calls = []
+
+class EEException(Exception):
+    pass
+
+def reset_calls():
+    with _calls_lock:
+        del _calls[:]
+
+def recorded_calls():
+    with _calls_lock:
+        return list(_calls)
+
+def _json_size(value):
+    return len(json.dumps(value, default=str, separators=(',', ':')))
+
+def _round_trip(kind, request, respond):
+    started = time.perf_counter()
+    time.sleep(LATENCY_SECONDS + random.uniform(0, JITTER_SECONDS))
+    response = respond()
+    with _calls_lock:
+        _calls.append({
+            'kind': kind,
+            'request_bytes': len(request),
+            'response_bytes': _json_size(response) if not hasattr(response, 'nbytes') else int(response.nbytes),
+            'seconds': time.perf_counter() - started,
+        })
+    return response
+
+class Node:
+    """One ee.* expression: the operation name, its arguments and the node it was called on."""
+
+    def __init__(self, op, parent=None, args=(), kwargs=None, called=False):
+        self._op = op
+        self._parent = parent
+        self._args = args
+        self._kwargs = kwargs or {}
+        self._called = called
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return Node(name, parent=self)
+
+    def __call__(self, *args, **kwargs):
+        return Node(self._op, parent=self._parent, args=args, kwargs=kwargs, called=True)
+
+    def graph(self):
+        return {
+            'op': self._op,
+            'on': self._parent.graph() if isinstance(self._parent, Node) else None,
+            'args': [_graph(arg) for arg in self._args],
+            'kwargs': {key: _graph(value) for key, value in self._kwargs.items()},
+        }
+
+    def serialize(self):
+        return json.dumps(self.graph(), default=str, separators=(',', ':'))
+
+    def getInfo(self):
+        return _round_trip('getInfo', self.serialize(), lambda: _resolve(self))
+
+    def getThumbURL(self, params=None):
+        request = json.dumps({'image': self.graph(), 'params': _graph(params)}, default=str)
+        return _round_trip('getThumbURL', request, lambda: f"https://fake-ee.invalid/thumbnails/{abs(hash(request))}")
+
+def _graph(value):
+    if isinstance(value, Node):
+        return value.graph()
+    if isinstance(value, dict):
+        return {str(key): _graph(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_graph(item) for item in value]
+    if callable(value):
+        return '<function>'
+    return value
+
+def _resolve(value):
+    """Placeholder result for an expression, following the shapes the detectors read."""
+    if isinstance(value, dict):
+        return {key: RESPONSES[key] if key in RESPONSES else _resolve(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_resolve(item) for item in value]
+    if not isinstance(value, Node):
+        return value
+    op, args = value._op, value._args
+    if op in ('Dictionary', 'List') and args and not isinstance(args[0], Node):
+        return _resolve(args[0])
+    if op in ('Dictionary', 'List', 'Number', 'String') and args:
+        return _resolve(args[0])
+    if op == 'If':
+        return _resolve(args[1])
+    if op in ('size', 'length'):
+        return SCENE_COUNT
+    if op == 'bandNames':
+        return list(BAND_NAMES)
+    if op == 'coordinates':
+        parent = value._parent
+        if isinstance(parent, Node) and parent._op == 'bounds':
+            west, south = POINT
+            return [[[west, south], [west + 0.01, south], [west + 0.01, south + 0.01], [west, south + 0.01], [west, south]]]
+        return list(POINT)
+    if op == 'map' and isinstance(value._parent, Node) and value._parent._op == 'List' and value._parent._args:
+        return [SCENE_COUNT for _ in value._parent._args[0]]
+    if op == 'aggregate_histogram':
+        return {}
+    return NUMBER
+
+def _compute_pixels(request):
+    import numpy as np
+    grid = request['grid']['dimensions']
+    fields = [('region', 'f4')] + [(f"scene{i}_{band}", 'f4') for i in range(SCENE_COUNT) for band in ('B3', 'B4', 'B8', 'B11', 'SCL', 'VV')]
+    payload = json.dumps(_graph(request), default=str)
+
+    def respond():
+        pixels = np.zeros((grid['height'], grid['width']), dtype=fields)
+        pixels['region'] = 1
+        return pixels
+    return _round_trip('computePixels', payload, respond)
+
+class _Data:
+    computePixels = staticmethod(_compute_pixels)
+
+data = _Data()
+
+def Initialize(*args, **kwargs):
+    pass
+
+def ServiceAccountCredentials(*args, **kwargs):
+    return None
+
+def __getattr__(name):
+    # ee.Image, ee.ImageCollection, ee.Filter, ee.Reducer, ee.Algorithms, ...
+    if name.startswith('__'):
+        raise AttributeError(name)
+    return Node(name)
+
+def install():
+    """Registers this module as `ee` so detectors imported afterwards use it."""
+    sys.modules['ee'] = sys.modules[__name__]
@@ -0,0 +1,185 @@
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+from pathlib import Path
+
+# Offline benchmark of the detectors' Earth Engine round trips. Each detector runs against
+# fake_ee, which injects latency per call and records call counts and payload sizes; results
+# are written as JSON so runs can be compared across versions:
+#   python benchmarks/run_benchmarks.py --latency-ms 200 --output bench.json
+#   python benchmarks/run_benchmarks.py --compare bench.json   (exit code 1 if a detector makes more calls)
+# Caches that would skip Earth Engine (results, watermarks) are turned off, so every run
+# measures the full request path. GEE_* request settings are honoured as in production; the
+# request rate limiter starts each run with a full bucket.
+# The earthengine-api isn't needed, but numpy is (see backend/requirements.txt): the detectors import
+# the local NumPy backend (common.raster) and the fire event clustering at module level.
+
+BENCHMARKS_DIR = Path(__file__).resolve().parent
+SERVICES_DIR = BENCHMARKS_DIR.parent
+DETECTOR_DIRS = ['deforestation', 'flooding', 'glacier', 'coastal_erosion', 'fire']
+REGION = {
+    "type": "Polygon",
+    "coordinates": [[[10.0, 45.0], [10.02, 45.0], [10.02, 45.015], [10.0, 45.015], [10.0, 45.0]]],
+}
+FIRE_COUNT = 40
+
+os.environ.setdefault('GEE_RESULT_CACHE', 'off')
+os.environ.setdefault('GEE_WATERMARKS', 'off')
+sys.path.insert(0, str(BENCHMARKS_DIR))
+sys.path.insert(0, str(SERVICES_DIR))
+for detector_dir in DETECTOR_DIRS:
+    sys.path.insert(0, str(SERVICES_DIR / detector_dir))
+
+try:
+    import numpy  # noqa: F401
+except ImportError:
+    sys.exit("run_benchmarks.py needs numpy: pip install -r backend/requirements.txt")
+
+import fake_ee
+fake_ee.install()
+
+from common.geometry import geojson_to_ee_geometry
+from common.ee_requests import reset_request_stats, reset_rate_limiter, request_stats
+import deforestation
+import flooding
+import glacier_melting
+import coastal_erosion
+import fire_protection
+
+def fire_responses():
+    """Evaluated fire summary values: FIRE_COUNT detections, as a sample and as columns."""
+    fires = [
+        {'latitude': 45.0 + i * 1e-4, 'longitude': 10.0 + i * 1e-4, 'brightness': 320.0 + i,
+         'confidence': 50 + i % 50, 'acq_date': '2026-01-01', 'acq_time': f"{i % 24:02d}00"}
+        for i in range(FIRE_COUNT)
+    ]
+    return {
+        'count': FIRE_COUNT,
+        'previous_count': FIRE_COUNT // 2,
+        'days': {'2026-01-01': FIRE_COUNT},
+        'sample': {'features': [
+            {'geometry': {'coordinates': [fire['longitude'], fire['latitude']]}, 'properties': fire}
+            for fire in fires[:fire_protection.FIRE_SAMPLE_SIZE]
+        ]},
+        'points': [[fire[name] for fire in fires] for name in fire_protection.FIRE_POINT_COLUMNS],
+        'confidence_histogram': [[bucket * 10, 4] for bucket in range(11)],
+        'brightness_max': 359.0,
+        'brightness_mean': 339.5,
+    }
+
+def scenarios():
+    """{name: (run(ee_geometry), fake_ee.RESPONSES)}"""
+    return {
+        'DEFORESTATION': (lambda region: deforestation.check_deforestation(
+            region, deforestation.DEFAULT_NDVI_DROP_THRESHOLD, deforestation.DEFAULT_POINT_BUFFER), {}),
+        'FLOODING': (lambda region: flooding.check_flooding(
+            region, flooding.DEFAULT_FLOOD_ALERT_THRESHOLD_PERCENT, flooding.DEFAULT_POINT_BUFFER), {}),
+        'GLACIER': (lambda region: glacier_melting.check_glacier_melting(
+            region, glacier_melting.DEFAULT_GLACIER_ALERT_THRESHOLD_PERCENT, glacier_melting.DEFAULT_POINT_BUFFER), {}),
+        'COASTAL_EROSION': (lambda region: coastal_erosion.check_coastal_erosion(
+            region, coastal_erosion.DEFAULT_SHORELINE_RETREAT_THRESHOLD, coastal_erosion.DEFAULT_POINT_BUFFER), {}),
+        'FIRE_PROTECTION': (lambda region: fire_protection.detect_active_fires(
+            region, fire_protection.DEFAULT_DAYS_BACK), fire_responses()),
+        'FIRE_PROTECTION_COLUMNAR': (lambda region: fire_protection.detect_active_fires(
+            region, fire_protection.DEFAULT_DAYS_BACK, columnar=True, cluster=True), fire_responses()),
+    }
+
+def run_scenario(run, responses, repeat):
+    """Runs one scenario repeat times; returns per-run medians and the call breakdown of the last run."""
+    ee_geometry, _ = geojson_to_ee_geometry(REGION, 1000)
+    fake_ee.RESPONSES = responses
+    wall_times = []
+    for _ in range(repeat):
+        fake_ee.reset_calls()
+        reset_request_stats()
+        reset_rate_limiter()  # a full bucket per run, so wall times don't depend on scenario order
+        started = time.perf_counter()
+        result = run(ee_geometry)
+        wall_times.append(time.perf_counter() - started)
+    calls = fake_ee.recorded_calls()
+    by_kind = {}
+    for call in calls:
+        kind = by_kind.setdefault(call['kind'], {'calls': 0, 'request_bytes': 0, 'response_bytes': 0})
+        kind['calls'] += 1
+        kind['request_bytes'] += call['request_bytes']
+        kind['response_bytes'] += call['response_bytes']
+    wall_times.sort()
+    return {
+        'status': result.get('status'),
+        'wall_seconds': wall_times[len(wall_times) // 2],
+        'ee_calls': len(calls),
+        'ee_seconds': sum(call['seconds'] for call in calls),
+        'request_bytes': sum(call['request_bytes'] for call in calls),
+        'response_bytes': sum(call['response_bytes'] for call in calls),
+        'by_kind': by_kind,
+        'request_stats': request_stats(),
+    }
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=SERVICES_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(report, baseline):
+    """Prints per-detector deltas against a previous report; returns True if any detector makes more calls."""
+    regressed = False
+    for name, current in report['detectors'].items():
+        previous = baseline.get('detectors', {}).get(name)
+        if previous is None:
+            print(f"{name}: new", file=sys.stderr)
+            continue
+        call_delta = current['ee_calls'] - previous['ee_calls']
+        regressed = regressed or call_delta > 0
+        print(
+            f"{name}: calls {previous['ee_calls']} -> {current['ee_calls']} ({call_delta:+d}), "
+            f"wall {previous['wall_seconds']:.3f}s -> {current['wall_seconds']:.3f}s, "
+            f"request bytes {previous['request_bytes']} -> {current['request_bytes']}",
+            file=sys.stderr
+        )
+    return regressed
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark detector Earth Engine round trips against a fake ee module.")
+    parser.add_argument('--latency-ms', type=float, default=200, help="latency injected per EE call")
+    parser.add_argument('--jitter-ms', type=float, default=0, help="extra random latency per EE call, up to this much")
+    parser.add_argument('--repeat', type=int, default=3, help="runs per detector; wall time is the median")
+    parser.add_argument('--detectors', nargs='*', help="subset of detectors to run (default: all)")
+    parser.add_argument('--output', help="write the JSON report here instead of stdout")
+    parser.add_argument('--compare', help="previous JSON report; exit 1 if any detector makes more EE calls")
+    args = parser.parse_args()
+
+    fake_ee.LATENCY_SECONDS = args.latency_ms / 1000
+    fake_ee.JITTER_SECONDS = args.jitter_ms / 1000
+    selected = scenarios()
+    if args.detectors:
+        selected = {name: selected[name] for name in args.detectors}
+
+    report = {
+        'revision': git_revision(),
+        'latency_ms': args.latency_ms,
+        'jitter_ms': args.jitter_ms,
+        'repeat': args.repeat,
+        'detectors': {},
+    }
+    for name, (run, responses) in selected.items():
+        report['detectors'][name] = run_scenario(run, responses, max(1, args.repeat))
+        summary = report['detectors'][name]
+        print(f"{name}: {summary['ee_calls']} EE calls, {summary['wall_seconds']:.3f}s ({summary['status']})", file=sys.stderr)
+
+    encoded = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(encoded + '\n')
+    else:
+        print(encoded)
+    if args.compare:
+        regressed = compare(report, json.loads(Path(args.compare).read_text()))
+        sys.exit(1 if regressed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,25 @@
 import sys
 import json
-import os
 import ee
-import datetime
 import time
 import traceback
+import numpy as np
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common.gee_init import initialize_gee
+from common.tracing import bind_trace_context
+from common.progress import bind_progress, emit_stats
+from common.scale import adaptive_scale, SCALE_PROPERTY
+from common.geometry import geojson_to_ee_geometry
+from common.result_cache import cache_key, analysis_window, cached_run
+from common.thumbnails import thumbnail_fields
+from common.ee_requests import run_concurrently, call_ee, evaluate
+from common.time_windows import resolve_anchor, window_ending_at, clamp_start, period_fields, SENTINEL2_START
+from common.preflight import window_availability, preflight_failure
+from common.raster import raster_grid, download_window, masked_index, median_composite, region_mean, region_centroid, raster_period_fields
+from common.sentinel2 import mask_s2_clouds
+
 DEFAULT_SHORELINE_RETREAT_THRESHOLD = 5.0  # meters
 
 RECENT_PERIOD_DAYS = 6
@@ -15,33 +28,7 @@ BASELINE_PERIOD_DAYS = 6
 S2_COLLECTION = 'COPERNICUS/S2_SR_HARMONIZED'
 REDUCTION_SCALE = 10
 DEFAULT_POINT_BUFFER = 1000
-gcp_project_id = 'project-ultron-457221'
-
-def initialize_gee(credentials_path_arg):
-    global gcp_project_id
-    try:
-        credentials_path = credentials_path_arg
-        print(f"DEBUG: Received credentials path via argument: {credentials_path}", file=sys.stderr)
-        if not credentials_path or not os.path.exists(credentials_path):
-            print(f"ERROR: Credentials file not found or path empty: {credentials_path}", file=sys.stderr)
-            return False
-        print(f"Attempting GEE init with key: {credentials_path}", file=sys.stderr)
-        credentials = ee.ServiceAccountCredentials(None, key_file=credentials_path)
-        ee.Initialize(credentials=credentials, project=gcp_project_id, opt_url='https://earthengine-highvolume.googleapis.com')
-        print(f"GEE Initialized OK for project: {gcp_project_id}.", file=sys.stderr)
-        return True
-    except ee.EEException as e:
-        print(f"ERROR: Failed GEE init: {e}", file=sys.stderr)
-        return False
-    except Exception as e:
-        print(f"ERROR: Unexpected GEE init error: {e}", file=sys.stderr)
-        print(traceback.format_exc(), file=sys.stderr)
-        return False
-
-def mask_s2_clouds(image):
-    scl = image.select('SCL')
-    mask = scl.neq(3).And(scl.neq(8)).And(scl.neq(9)).And(scl.neq(10)).And(scl.neq(11))
-    return image.updateMask(mask)
+RASTER_WINDOWS = ['baseline', 'recent']
 
 def calculate_ndwi(image):
     ndwi = image.normalizedDifference(['B3', 'B8']).rename('NDWI')
@@ -51,18 +38,17 @@ def get_median_ndwi_image(s2_collection, start, end, region_geometry):
     ndwi_collection = s2_collection.filterDate(start, end).map(mask_s2_clouds).map(calculate_ndwi)
     ndwi_only_collection = ndwi_collection.map(lambda img: img.select(['NDWI']))
     ndwi_median_img = ndwi_only_collection.median().clip(region_geometry)
-    print("DEBUG: Bands of median NDWI image:", ndwi_median_img.bandNames().getInfo(), file=sys.stderr)
     return ndwi_median_img
 
 def get_ndwi_image_url(image, region_geometry, vis_params, label):
     try:
-        url = image.getThumbURL({
+        url = call_ee(lambda: image.getThumbURL({
             'min': vis_params.get('min', -1),
             'max': vis_params.get('max', 1),
             'dimensions': vis_params.get('dimensions', 512),
             'palette': vis_params.get('palette', ['#0d0887', '#43ea80', '#f7fcb9']),
             'region': region_geometry
-        })
+        }), 'getThumbURL', image)
         return url
     except Exception as e:
         print(f"WARNING: Could not get {label} NDWI image URL: {e}", file=sys.stderr)
@@ -76,30 +62,95 @@ def get_shoreline_edge(image, region_geometry):
     shoreline = canny.mask(canny).clip(region_geometry)
     return shoreline
 
+def shoreline_shift_meters(baseline_centroid, recent_centroid):
+    """Haversine distance in meters between two [lon, lat] shoreline centroids."""
+    from math import radians, sin, cos, sqrt, atan2
+    lat1, lon1 = baseline_centroid[1], baseline_centroid[0]
+    lat2, lon2 = recent_centroid[1], recent_centroid[0]
+    R = 6371000
+    dlat = radians(lat2 - lat1)
+    dlon = radians(lon2 - lon1)
+    a = sin(dlat/2)**2 + cos(radians(lat1))*cos(radians(lat2))*sin(dlon/2)**2
+    c = 2 * atan2(sqrt(a), sqrt(1-a))
+    return R * c
+
+def summarize_ndwi_window(ndwi_img, region_geometry):
+    """
+    Server-side summary of one composite: band names, mean NDWI (and the scale it was reduced
+    at) and shoreline centroid. Mean and centroid are only computed when the NDWI band exists,
+    so empty composites don't error.
+    """
+    bands = ndwi_img.bandNames()
+    has_ndwi = ee.List(bands).contains('NDWI')
+    scale = adaptive_scale(region_geometry, REDUCTION_SCALE)
+    mean_stats = ee.Dictionary(ndwi_img.reduceRegion(
+        reducer=ee.Reducer.mean(),
+        geometry=region_geometry,
+        scale=scale,
+        maxPixels=1e9,
+        bestEffort=True
+    ))
+    shoreline = get_shoreline_edge(extract_shoreline(ndwi_img), region_geometry)
+    return ee.Dictionary({
+        'bands': bands,
+        'mean_ndwi': ee.Algorithms.If(has_ndwi, mean_stats.get('NDWI', None), None),
+        'shoreline_centroid': ee.Algorithms.If(has_ndwi, shoreline.geometry().centroid().coordinates(), None),
+        SCALE_PROPERTY: scale,
+    })
+
+def result_cache_key(geojson_geometry, buffer_radius, threshold):
+    return cache_key(
+        'COASTAL_EROSION', geojson_geometry, buffer_radius, {'threshold': threshold},
+        REDUCTION_SCALE, analysis_window(RECENT_PERIOD_DAYS, BASELINE_PERIOD_DAYS)
+    )
+
+def error_fields(threshold, buffer_radius_meters):
+    """The detector-specific fields of an error result (values unknown), e.g. for preflight_failure."""
+    return {
+        "baseline_shoreline": None,
+        "recent_shoreline": None,
+        "shoreline_retreat_meters": None,
+        "mean_ndwi_change": None,
+        "threshold": threshold,
+        "buffer_radius_meters": buffer_radius_meters,
+    }
+
+def preflight_windows(region_geometry):
+    """Availability of both NDWI windows after cloud masking (see common.preflight)."""
+    start_recent, end_recent = window_ending_at(resolve_anchor(), RECENT_PERIOD_DAYS)
+    start_baseline, end_baseline = window_ending_at(start_recent, BASELINE_PERIOD_DAYS)
+    start_baseline = clamp_start(start_baseline, SENTINEL2_START)
+    s2_collection = ee.ImageCollection(S2_COLLECTION).filterBounds(region_geometry)
+    return {
+        'baseline': window_availability(s2_collection, start_baseline, end_baseline, region_geometry, mask_s2_clouds),
+        'recent': window_availability(s2_collection, start_recent, end_recent, region_geometry, mask_s2_clouds),
+    }
+
+def monthly_stats(region_geometry):
+    """Per-month scene count, mean NDWI and shoreline centroid, as a server-side function of the month's start (see common.time_series)."""
+    s2_collection = ee.ImageCollection(S2_COLLECTION).filterBounds(region_geometry)
+
+    def month_stats(start):
+        end = start.advance(1, 'month')
+        summary = summarize_ndwi_window(get_median_ndwi_image(s2_collection, start, end, region_geometry), region_geometry)
+        return summary.remove(['bands']).set('scene_count', s2_collection.filterDate(start, end).size())
+    return month_stats
+
 def check_coastal_erosion(region_geometry, threshold, buffer_radius_meters):
     try:
-        from datetime import datetime, timezone
-
-        now = datetime.now(timezone.utc)
-        end_date_recent = ee.Date(now)
-        start_date_recent = end_date_recent.advance(-RECENT_PERIOD_DAYS, 'day')
-        end_date_baseline = start_date_recent
-        start_date_baseline = end_date_baseline.advance(-BASELINE_PERIOD_DAYS, 'day')
-
-        SENTINEL2_START = ee.Date('2015-06-23')
-        if start_date_baseline.millis().getInfo() < SENTINEL2_START.millis().getInfo():
+        start_recent, end_recent = window_ending_at(resolve_anchor(), RECENT_PERIOD_DAYS)
+        start_baseline, end_baseline = window_ending_at(start_recent, BASELINE_PERIOD_DAYS)
+        if start_baseline < SENTINEL2_START:
             print("Baseline period before Sentinel-2 data. Adjusting to first available date.", file=sys.stderr)
-            start_date_baseline = SENTINEL2_START
-
-        try:
-            start_date_baseline_str = start_date_baseline.format('YYYY-MM-dd').getInfo()
-            end_date_baseline_str = end_date_baseline.format('YYYY-MM-dd').getInfo()
-            start_date_recent_str = start_date_recent.format('YYYY-MM-dd').getInfo()
-            end_date_recent_str = end_date_recent.format('YYYY-MM-dd').getInfo()
-            print(f"Analysis Periods: Baseline {start_date_baseline_str} -> {end_date_baseline_str}", file=sys.stderr)
-            print(f"                  Recent   {start_date_recent_str} -> {end_date_recent_str}", file=sys.stderr)
-        except Exception as date_error:
-            print(f"WARNING: Unable to format date strings for logging: {date_error}", file=sys.stderr)
+            start_baseline = clamp_start(start_baseline, SENTINEL2_START)
+        response_dates = {
+            **period_fields('recent', start_recent, end_recent),
+            **period_fields('baseline', start_baseline, end_baseline),
+        }
+        print(f"Analysis Periods: Baseline {response_dates['baseline_period_start']} -> {response_dates['baseline_period_end']}", file=sys.stderr)
+        print(f"                  Recent   {response_dates['recent_period_start']} -> {response_dates['recent_period_end']}", file=sys.stderr)
+        start_date_recent, end_date_recent = ee.Date(start_recent), ee.Date(end_recent)
+        start_date_baseline, end_date_baseline = ee.Date(start_baseline), ee.Date(end_baseline)
 
         s2_collection = ee.ImageCollection(S2_COLLECTION).filterBounds(region_geometry)
 
@@ -112,11 +163,18 @@ def check_coastal_erosion(region_geometry, threshold, buffer_radius_meters):
             'palette': ['#0d0887', '#43ea80', '#f7fcb9'],
             'dimensions': 512
         }
-        start_image_url = get_ndwi_image_url(baseline_ndwi_img, region_geometry, vis_params, "before")
-        end_image_url = get_ndwi_image_url(recent_ndwi_img, region_geometry, vis_params, "after")
+        # Bands, mean NDWI and shoreline centroids for both windows in a single request;
+        # thumbnails are only rendered once both windows have data
+        window_summaries = ee.Dictionary({
+            'baseline': summarize_ndwi_window(baseline_ndwi_img, region_geometry),
+            'recent': summarize_ndwi_window(recent_ndwi_img, region_geometry),
+        })
+        summary = evaluate(window_summaries)
+        baseline_summary = summary['baseline']
+        recent_summary = summary['recent']
 
-        baseline_bands = baseline_ndwi_img.bandNames().getInfo()
-        recent_bands = recent_ndwi_img.bandNames().getInfo()
+        baseline_bands = baseline_summary.get('bands')
+        recent_bands = recent_summary.get('bands')
         print("DEBUG: Bands of baseline_ndwi_img:", baseline_bands, file=sys.stderr)
         print("DEBUG: Bands of recent_ndwi_img:", recent_bands, file=sys.stderr)
 
@@ -132,8 +190,8 @@ def check_coastal_erosion(region_geometry, threshold, buffer_radius_meters):
                 "shoreline_retreat_meters": None,
                 "threshold": threshold,
                 "buffer_radius_meters": buffer_radius_meters,
-                "start_image_url": start_image_url,
-                "end_image_url": end_image_url,
+                "start_image_url": None,
+                "end_image_url": None,
                 "mean_ndwi_change": None
             }
         if not recent_bands or 'NDWI' not in recent_bands:
@@ -148,72 +206,35 @@ def check_coastal_erosion(region_geometry, threshold, buffer_radius_meters):
                 "shoreline_retreat_meters": None,
                 "threshold": threshold,
                 "buffer_radius_meters": buffer_radius_meters,
-                "start_image_url": start_image_url,
-                "end_image_url": end_image_url,
+                "start_image_url": None,
+                "end_image_url": None,
                 "mean_ndwi_change": None
             }
 
-        # Calculate mean NDWI change in the region
-        try:
-            mean_ndwi_before = baseline_ndwi_img.reduceRegion(
-                reducer=ee.Reducer.mean(),
-                geometry=region_geometry,
-                scale=REDUCTION_SCALE,
-                maxPixels=1e9,
-                bestEffort=True
-            ).get('NDWI').getInfo()
-            mean_ndwi_after = recent_ndwi_img.reduceRegion(
-                reducer=ee.Reducer.mean(),
-                geometry=region_geometry,
-                scale=REDUCTION_SCALE,
-                maxPixels=1e9,
-                bestEffort=True
-            ).get('NDWI').getInfo()
-            mean_ndwi_change = (
-                mean_ndwi_after - mean_ndwi_before
-                if mean_ndwi_before is not None and mean_ndwi_after is not None
-                else None
-            )
-        except Exception as e:
-            print(f"WARNING: Failed to compute mean NDWI change: {e}", file=sys.stderr)
-            mean_ndwi_change = None
+        thumbnails = thumbnail_fields(get_ndwi_image_url, baseline_ndwi_img, recent_ndwi_img, region_geometry, vis_params)
 
-        baseline_water_mask = extract_shoreline(baseline_ndwi_img)
-        recent_water_mask = extract_shoreline(recent_ndwi_img)
-
-        baseline_shoreline = get_shoreline_edge(baseline_water_mask, region_geometry)
-        recent_shoreline = get_shoreline_edge(recent_water_mask, region_geometry)
+        # Calculate mean NDWI change in the region
+        mean_ndwi_before = baseline_summary.get('mean_ndwi')
+        mean_ndwi_after = recent_summary.get('mean_ndwi')
+        mean_ndwi_change = (
+            mean_ndwi_after - mean_ndwi_before
+            if mean_ndwi_before is not None and mean_ndwi_after is not None
+            else None
+        )
 
         try:
-            baseline_centroid = baseline_shoreline.geometry().centroid().coordinates().getInfo()
-            recent_centroid = recent_shoreline.geometry().centroid().coordinates().getInfo()
+            baseline_centroid = baseline_summary.get('shoreline_centroid')
+            recent_centroid = recent_summary.get('shoreline_centroid')
             print(f"Baseline shoreline centroid: {baseline_centroid}", file=sys.stderr)
             print(f"Recent shoreline centroid: {recent_centroid}", file=sys.stderr)
-            from math import radians, sin, cos, sqrt, atan2
-            lat1, lon1 = baseline_centroid[1], baseline_centroid[0]
-            lat2, lon2 = recent_centroid[1], recent_centroid[0]
-            R = 6371000
-            dlat = radians(lat2 - lat1)
-            dlon = radians(lon2 - lon1)
-            a = sin(dlat/2)**2 + cos(radians(lat1))*cos(radians(lat2))*sin(dlon/2)**2
-            c = 2 * atan2(sqrt(a), sqrt(1-a))
-            shoreline_retreat_meters = R * c
+            emit_stats(baseline_shoreline_centroid=baseline_centroid, recent_shoreline_centroid=recent_centroid, mean_ndwi_change=mean_ndwi_change)
+            shoreline_retreat_meters = shoreline_shift_meters(baseline_centroid, recent_centroid)
         except Exception as calc_error:
             print(f"ERROR: Failed to calculate shoreline shift: {calc_error}", file=sys.stderr)
             shoreline_retreat_meters = None
 
         alert_triggered = shoreline_retreat_meters is not None and abs(shoreline_retreat_meters) > threshold
 
-        try:
-            response_dates = {
-                "recent_period_start": start_date_recent.format('YYYY-MM-dd').getInfo(),
-                "recent_period_end": end_date_recent.format('YYYY-MM-dd').getInfo(),
-                "baseline_period_start": start_date_baseline.format('YYYY-MM-dd').getInfo(),
-                "baseline_period_end": end_date_baseline.format('YYYY-MM-dd').getInfo(),
-            }
-        except Exception:
-            response_dates = {}
-
         return {
             "status": "success" if shoreline_retreat_meters is not None else "error",
             "alert_triggered": alert_triggered,
@@ -221,9 +242,9 @@ def check_coastal_erosion(region_geometry, threshold, buffer_radius_meters):
             "threshold": threshold,
             **response_dates,
             "buffer_radius_meters": buffer_radius_meters,
-            "start_image_url": start_image_url,
-            "end_image_url": end_image_url,
-            "mean_ndwi_change": mean_ndwi_change
+            **thumbnails,
+            "mean_ndwi_change": mean_ndwi_change,
+            SCALE_PROPERTY: recent_summary.get(SCALE_PROPERTY)
         }
 
     except ee.EEException as gee_error:
@@ -256,6 +277,79 @@ def check_coastal_erosion(region_geometry, threshold, buffer_radius_meters):
             "mean_ndwi_change": None
         }
 
+def raster_cache_key(geojson_geometry, buffer_radius):
+    """Key for the downloaded windows; thresholds are left out so every threshold reuses them."""
+    return cache_key(
+        'COASTAL_EROSION', geojson_geometry, buffer_radius, {},
+        REDUCTION_SCALE, analysis_window(RECENT_PERIOD_DAYS, BASELINE_PERIOD_DAYS)
+    )
+
+def local_rasters(region_geometry):
+    """Raw green, NIR and SCL stacks of both windows on one grid, for check_coastal_erosion_local."""
+    start_recent, end_recent = window_ending_at(resolve_anchor(), RECENT_PERIOD_DAYS)
+    start_baseline, end_baseline = window_ending_at(start_recent, BASELINE_PERIOD_DAYS)
+    start_baseline = clamp_start(start_baseline, SENTINEL2_START)
+    s2_collection = ee.ImageCollection(S2_COLLECTION).filterBounds(region_geometry)
+    grid = raster_grid(region_geometry, REDUCTION_SCALE, s2_collection, [(start_baseline, end_baseline), (start_recent, end_recent)])
+    band_names = ['B3', 'B8', 'SCL']
+    return run_concurrently({
+        'baseline': lambda: download_window(s2_collection, start_baseline, end_baseline, band_names, region_geometry, grid),
+        'recent': lambda: download_window(s2_collection, start_recent, end_recent, band_names, region_geometry, grid),
+    })
+
+def summarize_ndwi_raster(raster):
+    """
+    Local summarize_ndwi_window: mean NDWI and shoreline centroid. On Earth Engine the centroid
+    is that of the clipped edge image's footprint, i.e. of the region, so it is taken the same way here.
+    """
+    ndwi = median_composite(masked_index(raster, 'B3', 'B8'))
+    region = raster['region'] & ~np.isnan(ndwi)
+    return {
+        'mean_ndwi': region_mean(ndwi, region),
+        'shoreline_centroid': region_centroid(raster) if region.any() else None,
+    }
+
+def check_coastal_erosion_local(rasters, threshold, buffer_radius_meters):
+    """
+    check_coastal_erosion on local rasters ({'baseline', 'recent'}, see common.raster) with NumPy.
+    Same result fields and shoreline centroid as the EE path; there are no thumbnails.
+    """
+    baseline_summary = summarize_ndwi_raster(rasters['baseline'])
+    recent_summary = summarize_ndwi_raster(rasters['recent'])
+    for label, window_summary in (('baseline', baseline_summary), ('recent', recent_summary)):
+        if window_summary['mean_ndwi'] is None:
+            return {
+                "status": "error",
+                "message": f"No NDWI band found in {label} composite. No cloud-free data available in this period/region.",
+                "alert_triggered": False,
+                "shoreline_retreat_meters": None,
+                "threshold": threshold,
+                "buffer_radius_meters": buffer_radius_meters,
+                "start_image_url": None,
+                "end_image_url": None,
+                "mean_ndwi_change": None
+            }
+    baseline_centroid = baseline_summary['shoreline_centroid']
+    recent_centroid = recent_summary['shoreline_centroid']
+    shoreline_retreat_meters = (
+        shoreline_shift_meters(baseline_centroid, recent_centroid)
+        if baseline_centroid is not None and recent_centroid is not None
+        else None
+    )
+    return {
+        "status": "success" if shoreline_retreat_meters is not None else "error",
+        "alert_triggered": shoreline_retreat_meters is not None and abs(shoreline_retreat_meters) > threshold,
+        "shoreline_retreat_meters": shoreline_retreat_meters,
+        "threshold": threshold,
+        **raster_period_fields('recent', rasters['recent']),
+        **raster_period_fields('baseline', rasters['baseline']),
+        "buffer_radius_meters": buffer_radius_meters,
+        "start_image_url": None,
+        "end_image_url": None,
+        "mean_ndwi_change": recent_summary['mean_ndwi'] - baseline_summary['mean_ndwi'],
+        "backend": "numpy"
+    }
+
 if __name__ == "__main__":
     if len(sys.argv) < 2:
         print("ERROR: Missing credentials file path argument.", file=sys.stderr)
@@ -280,34 +374,31 @@ if __name__ == "__main__":
         print(json.dumps({"status": "error", "message": f"Invalid Stdin Param: {e}", "region_id": region_id}))
         sys.exit(1)
 
-    if not initialize_gee(credentials_path_from_arg):
-        print(json.dumps({"status": "error", "message": "GEE initialization failed.", "region_id": region_id}))
-        sys.exit(1)
+    result_key = result_cache_key(geojson_geometry, buffer_radius, threshold)
+    bind_trace_context(detector='COASTAL_EROSION', region_id=region_id)
+    if input_params.get('stream'):
+        bind_progress(sys.stdout, region_id=region_id)
 
-    ee_geometry = None
-    effective_buffer = None
-    try:
-        geom_type = geojson_geometry.get('type')
-        coords = geojson_geometry.get('coordinates')
-        if geom_type == 'Polygon':
-            ee_geometry = ee.Geometry.Polygon(coords)
-        elif geom_type == 'MultiPolygon':
-            ee_geometry = ee.Geometry.MultiPolygon(coords)
-        elif geom_type == 'Point':
-            ee_geometry = ee.Geometry.Point(coords).buffer(buffer_radius)
-            effective_buffer = buffer_radius
-        else:
-            raise ValueError(f"Unsupported type: {geom_type}")
-    except Exception as e:
-        print(f"ERROR: GeoJSON convert fail: {e}", file=sys.stderr)
-        print(json.dumps({"status": "error", "message": f"GeoJSON Error: {e}", "region_id": region_id}))
-        sys.exit(1)
+    def run_analysis():
+        if not initialize_gee(credentials_path_from_arg):
+            return {"status": "error", "message": "GEE initialization failed."}
 
-    print(f"Starting GEE coastal erosion analysis for region: {region_id}...", file=sys.stderr)
-    start_time = time.time()
-    analysis_result = check_coastal_erosion(ee_geometry, threshold, effective_buffer)
-    end_time = time.time()
-    print(f"GEE analysis duration: {end_time - start_time:.2f} seconds.", file=sys.stderr)
+        try:
+            ee_geometry, effective_buffer = geojson_to_ee_geometry(geojson_geometry, buffer_radius, REDUCTION_SCALE)
+        except Exception as e:
+            print(f"ERROR: GeoJSON convert fail: {e}", file=sys.stderr)
+            return {"status": "error", "message": f"GeoJSON Error: {e}"}
+
+        print(f"Starting GEE coastal erosion analysis for region: {region_id}...", file=sys.stderr)
+        start_time = time.time()
+        analysis_result = preflight_failure('COASTAL_EROSION', preflight_windows(ee_geometry), error_fields(threshold, effective_buffer)) \
+            or check_coastal_erosion(ee_geometry, threshold, effective_buffer)
+        end_time = time.time()
+        print(f"GEE analysis duration: {end_time - start_time:.2f} seconds.", file=sys.stderr)
+        return analysis_result
+
+    # Cache hits skip GEE initialization as well as the analysis
+    analysis_result = cached_run(result_key, 'COASTAL_EROSION', run_analysis)
     analysis_result['region_id'] = region_id
     print(json.dumps(analysis_result))
     if analysis_result.get("status") == "success":
@@ -0,0 +1 @@
+# Shared helpers for the Google Earth Engine detector scripts.
@@ -0,0 +1,74 @@
+import ee
+from concurrent.futures import as_completed
+
+from common.ee_requests import evaluate
+from common.progress import emit_region_result
+from common.scale import adaptive_scale, SCALE_PROPERTY
+
+BATCH_REGION_ID_PROPERTY = 'region_id'
+
+def build_region_collection(regions):
+    """
+    Wraps [{'region_id': ..., 'geometry': ee.Geometry}, ...] into one ee.FeatureCollection
+    so a composite can be reduced over every region in a single reduceRegions call.
+    """
+    features = [
+        ee.Feature(region['geometry'], {BATCH_REGION_ID_PROPERTY: str(region['region_id'])})
+        for region in regions
+    ]
+    return ee.FeatureCollection(features)
+
+def with_band_placeholder(collection, band_names):
+    """
+    Adds a fully masked image carrying band_names to collection. Median composites of an
+    otherwise empty window then still have the expected bands (all masked) instead of none,
+    so one empty window can't fail the whole batch.
+    """
+    placeholder = ee.Image.constant([0] * len(band_names)).rename(band_names).toFloat().selfMask()
+    return collection.merge(ee.ImageCollection([placeholder]))
+
+def reduce_regions_table(image, region_collection, reducer, native_scale, output_properties):
+    """
+    Reduces image over every feature of region_collection and fetches only region_id and
+    output_properties in one request. Returns {region_id: {property: value}}; properties
+    with no valid pixels come back as None. Each region is reduced at its own adaptive scale
+    (common.scale), so its result doesn't depend on the other regions of the batch: regions
+    within the pixel budget share one reduceRegions at native_scale, larger ones get a
+    reduceRegion each at their coarser scale. The scale used comes back as reduction_scale_meters.
+    """
+    scaled = region_collection.map(
+        lambda feature: feature.set(SCALE_PROPERTY, adaptive_scale(feature.geometry(), native_scale))
+    )
+    at_native_scale = image.reduceRegions(
+        collection=scaled.filter(ee.Filter.lte(SCALE_PROPERTY, native_scale)), reducer=reducer, scale=native_scale
+    )
+    over_budget = scaled.filter(ee.Filter.gt(SCALE_PROPERTY, native_scale)).map(
+        lambda feature: feature.set(image.reduceRegion(
+            reducer=reducer, geometry=feature.geometry(), scale=feature.get(SCALE_PROPERTY), maxPixels=1e9
+        ))
+    )
+    selectors = [BATCH_REGION_ID_PROPERTY, SCALE_PROPERTY] + list(output_properties)
+    table = evaluate(at_native_scale.merge(over_budget).select(selectors, None, False))
+    results = {}
+    for feature in table.get('features', []):
+        properties = feature.get('properties', {})
+        results[str(properties.get(BATCH_REGION_ID_PROPERTY))] = {
+            name: properties.get(name) for name in [SCALE_PROPERTY] + list(output_properties)
+        }
+    return results
+
+def finish_region_results(results, thumbnail_requests):
+    """
+    Fills in the thumbnails submitted for results ({index: future}) and streams each region's
+    result as soon as it is final: regions without thumbnails first, the rest as their
+    thumbnails complete. Returns results.
+    """
+    for index, result in enumerate(results):
+        if index not in thumbnail_requests:
+            emit_region_result(result.get('region_id'), result)
+    indices = {request: index for index, request in thumbnail_requests.items()}
+    for request in as_completed(indices):
+        result = results[indices[request]]
+        result.update(request.result())
+        emit_region_result(result.get('region_id'), result)
+    return results
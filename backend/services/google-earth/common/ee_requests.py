@@ -0,0 +1,168 @@
+import os
+import sys
+import time
+import random
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, Future
+
+import ee
+
+from common.tracing import trace_span
+from common.progress import stage
+
+# Every Earth Engine round trip (getInfo, getThumbURL, ...) goes through call_ee(), which
+# applies a token bucket (requests/second), a cap on in-flight requests and jittered
+# exponential backoff on quota errors, and records a trace span (see common.tracing). Independent requests are dispatched on one shared,
+# bounded thread pool so a detector's latency is its slowest request, not the sum of them.
+#   GEE_MAX_CONCURRENT_REQUESTS      pool size (default: 4; 1 runs everything inline)
+#   GEE_MAX_INFLIGHT_REQUESTS        requests allowed in flight at once (default: 4)
+#   GEE_REQUESTS_PER_SECOND          token bucket rate (default: 10)
+#   GEE_REQUESTS_BURST               token bucket capacity (default: same as rate)
+#   GEE_MAX_RETRIES                  retries on "Too many requests"/quota errors (default: 5)
+#   GEE_BACKOFF_BASE_SECONDS         first backoff ceiling, doubled per retry (default: 1)
+#   GEE_BACKOFF_MAX_SECONDS          backoff ceiling (default: 32)
+
+MAX_CONCURRENT_REQUESTS = max(1, int(os.environ.get('GEE_MAX_CONCURRENT_REQUESTS', 4)))
+MAX_INFLIGHT_REQUESTS = max(1, int(os.environ.get('GEE_MAX_INFLIGHT_REQUESTS', 4)))
+REQUESTS_PER_SECOND = float(os.environ.get('GEE_REQUESTS_PER_SECOND', 10))
+REQUESTS_BURST = float(os.environ.get('GEE_REQUESTS_BURST', REQUESTS_PER_SECOND))
+MAX_RETRIES = int(os.environ.get('GEE_MAX_RETRIES', 5))
+BACKOFF_BASE_SECONDS = float(os.environ.get('GEE_BACKOFF_BASE_SECONDS', 1))
+BACKOFF_MAX_SECONDS = float(os.environ.get('GEE_BACKOFF_MAX_SECONDS', 32))
+
+QUOTA_ERROR_MARKERS = ('too many requests', '429', 'quota exceeded', 'rate limit', 'resource_exhausted')
+
+_executor = None
+_executor_lock = threading.Lock()
+_pool_thread = threading.local()
+
+_inflight = threading.BoundedSemaphore(MAX_INFLIGHT_REQUESTS)
+_bucket_lock = threading.Lock()
+_bucket_tokens = REQUESTS_BURST
+_bucket_updated = time.monotonic()
+
+_stats_lock = threading.Lock()
+_stats = {'requests': 0, 'throttled': 0, 'throttled_seconds': 0.0, 'retried': 0, 'quota_errors': 0, 'failed': 0}
+
+def _count(name, amount=1):
+    with _stats_lock:
+        _stats[name] += amount
+
+def request_stats():
+    """Snapshot of the request counters since start (or the last reset_request_stats())."""
+    with _stats_lock:
+        return dict(_stats)
+
+def reset_request_stats():
+    with _stats_lock:
+        for name in _stats:
+            _stats[name] = 0
+
+def reset_rate_limiter():
+    """Refills the token bucket, e.g. so one benchmark scenario doesn't pay for the previous one's requests."""
+    global _bucket_tokens, _bucket_updated
+    with _bucket_lock:
+        _bucket_tokens = REQUESTS_BURST
+        _bucket_updated = time.monotonic()
+
+def _take_token():
+    """Blocks until the token bucket allows one more request. Returns the seconds it slept (0 if none)."""
+    global _bucket_tokens, _bucket_updated
+    if REQUESTS_PER_SECOND <= 0:
+        return 0
+    waited = 0
+    while True:
+        with _bucket_lock:
+            now = time.monotonic()
+            _bucket_tokens = min(REQUESTS_BURST, _bucket_tokens + (now - _bucket_updated) * REQUESTS_PER_SECOND)
+            _bucket_updated = now
+            if _bucket_tokens >= 1:
+                _bucket_tokens -= 1
+                return waited
+            wait_seconds = (1 - _bucket_tokens) / REQUESTS_PER_SECOND
+        started = time.monotonic()
+        time.sleep(wait_seconds)
+        waited += time.monotonic() - started
+
+def is_quota_error(error):
+    message = str(error).lower()
+    return any(marker in message for marker in QUOTA_ERROR_MARKERS)
+
+def call_ee(request, operation='call', payload=None):
+    """
+    Runs one Earth Engine request (a zero-argument callable) under the rate limit and
+    in-flight cap, retrying quota errors with full-jitter exponential backoff.
+    Other errors, and quota errors after MAX_RETRIES, are raised unchanged.
+    operation and payload (the ee object sent) only label and size the trace span.
+    """
+    attempt = 0
+    with trace_span(operation, payload) as span, stage(operation):
+        while True:
+            waited = _take_token()
+            if waited > 0:
+                _count('throttled')
+                _count('throttled_seconds', waited)
+            _count('requests')
+            try:
+                with _inflight:
+                    span['response'] = request()
+                    span['retries'] = attempt
+                    return span['response']
+            except ee.EEException as e:
+                span['retries'] = attempt
+                if not is_quota_error(e):
+                    _count('failed')
+                    raise
+                _count('quota_errors')
+                if attempt >= MAX_RETRIES:
+                    _count('failed')
+                    raise
+                delay = random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+                attempt += 1
+                _count('retried')
+                print(f"WARNING: EE quota error, retry {attempt}/{MAX_RETRIES} in {delay:.1f}s: {e}", file=sys.stderr)
+                time.sleep(delay)
+
+def evaluate(ee_object):
+    """ee_object.getInfo() through call_ee()."""
+    return call_ee(ee_object.getInfo, 'getInfo', ee_object)
+
+def _mark_pool_thread():
+    _pool_thread.active = True
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=MAX_CONCURRENT_REQUESTS,
+                thread_name_prefix='ee-request',
+                initializer=_mark_pool_thread
+            )
+        return _executor
+
+def _run_inline(request):
+    future = Future()
+    try:
+        future.set_result(request())
+    except BaseException as e:
+        future.set_exception(e)
+    return future
+
+def submit_requests(requests):
+    """
+    Starts each zero-argument callable in requests ({name: callable}) and returns {name: Future}.
+    Calls made from inside a pool thread run inline, so nested use can't exhaust the pool.
+    Callables should reach Earth Engine through call_ee()/evaluate(). Pool threads run them in
+    a copy of the caller's context, so their trace spans keep its detector/region fields.
+    """
+    if MAX_CONCURRENT_REQUESTS == 1 or getattr(_pool_thread, 'active', False):
+        return {name: _run_inline(request) for name, request in requests.items()}
+    executor = _get_executor()
+    return {name: executor.submit(contextvars.copy_context().run, request) for name, request in requests.items()}
+
+def run_concurrently(requests):
+    """Runs requests concurrently and returns {name: result}; the first failure (in dict order) is re-raised."""
+    futures = submit_requests(requests)
+    return {name: future.result() for name, future in futures.items()}
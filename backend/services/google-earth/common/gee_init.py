@@ -0,0 +1,145 @@
+import sys
+import os
+import ee
+import json
+import time
+import hashlib
+import datetime
+import traceback
+from pathlib import Path
+
+from common.tracing import trace_span
+
+gcp_project_id = 'project-ultron-457221'
+HIGH_VOLUME_ENDPOINT = 'https://earthengine-highvolume.googleapis.com'
+
+# Session cache for short-lived jobs: the service account's access token and the algorithm
+# signatures ee.Initialize downloads (getAlgorithms) are kept in a local file. A later run with
+# the same key reuses the token until REFRESH_MARGIN before it expires (google-auth refreshes
+# it by itself after that) and the signatures for ALGORITHMS_TTL, so it starts without a token
+# exchange or a getAlgorithms round trip. The file holds a bearer token: it is written 0600.
+#   GEE_SESSION_CACHE=off                  disables the cache
+#   GEE_SESSION_CACHE_PATH                 JSON file (default: services/google-earth/.cache/ee_session.json)
+#   GEE_TOKEN_REFRESH_MARGIN_SECONDS       don't reuse tokens closer than this to expiry (default: 300)
+#   GEE_ALGORITHMS_TTL_SECONDS             reuse the algorithm signatures this long (default: 1 day)
+
+DEFAULT_SESSION_CACHE_PATH = Path(__file__).resolve().parent.parent / '.cache' / 'ee_session.json'
+SESSION_CACHE_ENABLED = os.environ.get('GEE_SESSION_CACHE', 'on').lower() not in ('off', '0', 'false')
+SESSION_CACHE_PATH = Path(os.environ.get('GEE_SESSION_CACHE_PATH', DEFAULT_SESSION_CACHE_PATH))
+REFRESH_MARGIN = datetime.timedelta(seconds=int(os.environ.get('GEE_TOKEN_REFRESH_MARGIN_SECONDS', 300)))
+ALGORITHMS_TTL_SECONDS = int(os.environ.get('GEE_ALGORITHMS_TTL_SECONDS', 24 * 3600))
+
+_initialized_key = None
+
+def _utcnow():
+    # google-auth compares expiry as a naive UTC datetime
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+def _key_fingerprint(credentials_path):
+    with open(credentials_path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def initialized_key_fingerprint():
+    """sha256 of the service account key the process initialized with, or None."""
+    return _initialized_key
+
+def _load_session(fingerprint):
+    """The cached session for this key and client version, or {}."""
+    if not SESSION_CACHE_ENABLED:
+        return {}
+    try:
+        session = json.loads(SESSION_CACHE_PATH.read_text())
+    except (OSError, ValueError):
+        return {}
+    if session.get('key') != fingerprint or session.get('ee_version') != getattr(ee, '__version__', None):
+        return {}
+    return session
+
+def _store_session(session):
+    if not SESSION_CACHE_ENABLED:
+        return
+    try:
+        SESSION_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        partial_path = SESSION_CACHE_PATH.with_suffix('.partial')
+        fd = os.open(partial_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(session, f)
+        os.replace(partial_path, SESSION_CACHE_PATH)
+    except OSError as e:
+        print(f"WARNING: Could not save GEE session cache: {e}", file=sys.stderr)
+
+def _reuse_token(credentials, session):
+    """Puts a cached token on credentials if it is valid for more than REFRESH_MARGIN. Returns True if it did."""
+    try:
+        expiry = datetime.datetime.fromisoformat(session['expiry'])
+    except (KeyError, TypeError, ValueError):
+        return False
+    if not session.get('token') or expiry - _utcnow() <= REFRESH_MARGIN:
+        return False
+    credentials.token = session['token']
+    credentials.expiry = expiry
+    return True
+
+def _initialize_with_session(credentials, session):
+    """
+    ee.Initialize with getAlgorithms answered from session when fresh. Returns the signatures
+    fetched during this call (to be cached), or None when the cached ones were used.
+    """
+    fetch_algorithms = ee.data.getAlgorithms
+    cached = session.get('algorithms')
+    fresh = cached and time.time() - session.get('algorithms_fetched_at', 0) < ALGORITHMS_TTL_SECONDS
+    fetched = {}
+
+    def get_algorithms():
+        if fresh:
+            return cached
+        fetched['algorithms'] = fetch_algorithms()
+        return fetched['algorithms']
+
+    ee.data.getAlgorithms = get_algorithms
+    try:
+        ee.Initialize(credentials=credentials, project=gcp_project_id, opt_url=HIGH_VOLUME_ENDPOINT)
+    finally:
+        ee.data.getAlgorithms = fetch_algorithms
+    return fetched.get('algorithms')
+
+def initialize_gee(credentials_path_arg):
+    global gcp_project_id, _initialized_key
+    try:
+        credentials_path = credentials_path_arg
+        print(f"DEBUG: Received credentials path via argument: {credentials_path}", file=sys.stderr)
+        if not credentials_path or not os.path.exists(credentials_path):
+            print(f"ERROR: Credentials file not found or path empty: {credentials_path}", file=sys.stderr)
+            return False
+        print(f"Attempting GEE init with key: {credentials_path}", file=sys.stderr)
+        credentials = ee.ServiceAccountCredentials(None, key_file=credentials_path)
+        fingerprint = _key_fingerprint(credentials_path)
+        session = _load_session(fingerprint)
+        token_reused = _reuse_token(credentials, session)
+        with trace_span('initialize') as span:
+            span['token_reused'] = token_reused
+            algorithms = _initialize_with_session(credentials, session)
+            span['algorithms_reused'] = algorithms is None
+        if SESSION_CACHE_ENABLED and (not token_reused or algorithms is not None):
+            if not credentials.valid:
+                # The exchange the first request would do anyway, done now so its token can be cached
+                import google.auth.transport.requests
+                credentials.refresh(google.auth.transport.requests.Request())
+            _store_session({
+                'key': fingerprint,
+                'ee_version': getattr(ee, '__version__', None),
+                'token': credentials.token,
+                'expiry': credentials.expiry.isoformat() if credentials.expiry else None,
+                'algorithms': algorithms if algorithms is not None else session.get('algorithms'),
+                'algorithms_fetched_at': time.time() if algorithms is not None else session.get('algorithms_fetched_at', 0),
+            })
+        _initialized_key = fingerprint
+        print(f"GEE Initialized OK for project: {gcp_project_id} (cached token: {token_reused}, cached algorithms: {algorithms is None}).", file=sys.stderr)
+        return True
+    except ee.EEException as e:
+        print(f"ERROR: Failed GEE init: {e}", file=sys.stderr)
+        return False
+    except Exception as e:
+        print(f"ERROR: Unexpected GEE init error: {e}", file=sys.stderr)
+        print(traceback.format_exc(), file=sys.stderr)
+        return False
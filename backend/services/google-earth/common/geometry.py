@@ -0,0 +1,180 @@
+import ee
+import sys
+import json
+import math
+import hashlib
+
+# Geometry stage shared by every detector. User-drawn polygons are validated and repaired
+# (closed rings, no duplicate/invalid vertices, degenerate holes dropped), then simplified with
+# Douglas-Peucker to a tolerance tied to the detector's reduction scale before they are sent
+# to Earth Engine. All of it is plain client-side Python.
+
+# Coordinates are rounded before hashing; 1e-6 degrees is ~0.1m, far below any reduction scale.
+HASH_COORD_PRECISION = 6
+# Vertices closer than this fraction of a pixel to the simplified outline are dropped.
+SIMPLIFY_SCALE_FRACTION = 0.5
+METERS_PER_DEGREE = 111320.0
+
+def _clean_ring(ring):
+    """Validates one linear ring and returns it closed, without repeated vertices. Raises ValueError."""
+    if not isinstance(ring, (list, tuple)):
+        raise ValueError("Polygon ring must be a list of positions.")
+    cleaned = []
+    for position in ring:
+        if not isinstance(position, (list, tuple)) or len(position) < 2:
+            raise ValueError(f"Invalid position in ring: {position}")
+        lon, lat = float(position[0]), float(position[1])
+        if math.isnan(lon) or math.isnan(lat) or not (-180 <= lon <= 180) or not (-90 <= lat <= 90):
+            raise ValueError(f"Position out of range: {position}")
+        if cleaned and cleaned[-1] == [lon, lat]:
+            continue
+        cleaned.append([lon, lat])
+    if len(cleaned) > 1 and cleaned[0] == cleaned[-1]:
+        cleaned.pop()
+    if len({tuple(position) for position in cleaned}) < 3:
+        raise ValueError("Polygon ring needs at least 3 distinct positions.")
+    return cleaned + [cleaned[0]]
+
+def _clean_polygon(rings):
+    if not isinstance(rings, (list, tuple)) or not rings:
+        raise ValueError("Polygon must have at least one ring.")
+    shell = _clean_ring(rings[0])
+    holes = []
+    for hole in rings[1:]:
+        try:
+            holes.append(_clean_ring(hole))
+        except ValueError:
+            continue  # degenerate holes are dropped rather than failing the region
+    return [shell] + holes
+
+def _perpendicular_distance(point, start, end):
+    if start == end:
+        return math.hypot(point[0] - start[0], point[1] - start[1])
+    dx, dy = end[0] - start[0], end[1] - start[1]
+    return abs(dy * point[0] - dx * point[1] + end[0] * start[1] - end[1] * start[0]) / math.hypot(dx, dy)
+
+def _douglas_peucker(points, tolerance):
+    """Iterative Douglas-Peucker over an open polyline of planar points; returns kept indices."""
+    keep = {0, len(points) - 1}
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        max_distance, index = 0.0, None
+        for i in range(first + 1, last):
+            distance = _perpendicular_distance(points[i], points[first], points[last])
+            if distance > max_distance:
+                max_distance, index = distance, i
+        if index is not None and max_distance > tolerance:
+            keep.add(index)
+            stack.append((first, index))
+            stack.append((index, last))
+    return sorted(keep)
+
+def _simplify_ring(ring, tolerance_meters):
+    """Simplifies a closed ring in a local equirectangular projection; keeps the ring if it would collapse."""
+    if len(ring) <= 5 or tolerance_meters <= 0:
+        return ring
+    mean_lat = sum(lat for _, lat in ring) / len(ring)
+    x_scale = METERS_PER_DEGREE * max(math.cos(math.radians(mean_lat)), 1e-6)
+    planar = [(lon * x_scale, lat * METERS_PER_DEGREE) for lon, lat in ring]
+    # Split the closed ring at the vertex farthest from its start so both halves are open polylines.
+    split = max(range(len(planar)), key=lambda i: math.hypot(planar[i][0] - planar[0][0], planar[i][1] - planar[0][1]))
+    first_half = _douglas_peucker(planar[:split + 1], tolerance_meters)
+    second_half = [split + i for i in _douglas_peucker(planar[split:], tolerance_meters)]
+    kept = first_half + second_half[1:]
+    if len(kept) < 4:
+        return ring
+    return [ring[i] for i in kept]
+
+def _polygons_of(geojson_geometry):
+    geom_type = geojson_geometry.get('type')
+    coords = geojson_geometry.get('coordinates')
+    if geom_type == 'Polygon':
+        return [coords]
+    if geom_type == 'MultiPolygon':
+        if not isinstance(coords, (list, tuple)) or not coords:
+            raise ValueError("MultiPolygon must have at least one polygon.")
+        return list(coords)
+    raise ValueError(f"Unsupported geometry type: {geom_type}")
+
+def prepare_geojson(geojson_geometry, reduction_scale=None):
+    """
+    Validates and repairs a GeoJSON Polygon/MultiPolygon/Point and, when reduction_scale (meters)
+    is given, simplifies polygon rings to SIMPLIFY_SCALE_FRACTION of it. Returns a new GeoJSON dict.
+    Raises ValueError for geometries that can't be repaired.
+    """
+    if not isinstance(geojson_geometry, dict):
+        raise ValueError("Geometry must be a GeoJSON object.")
+    geom_type = geojson_geometry.get('type')
+    coords = geojson_geometry.get('coordinates')
+    if not geom_type or not coords:
+        raise ValueError("Invalid GeoJSON structure: Missing 'type' or 'coordinates'.")
+    if geom_type == 'Point':
+        if not isinstance(coords, list) or len(coords) != 2:
+            raise ValueError("Invalid Point coordinates.")
+        return {'type': 'Point', 'coordinates': [float(coords[0]), float(coords[1])]}
+
+    tolerance_meters = (reduction_scale or 0) * SIMPLIFY_SCALE_FRACTION
+    polygons = [
+        [_simplify_ring(ring, tolerance_meters) for ring in _clean_polygon(rings)]
+        for rings in _polygons_of(geojson_geometry)
+    ]
+    if geom_type == 'Polygon':
+        return {'type': 'Polygon', 'coordinates': polygons[0]}
+    return {'type': 'MultiPolygon', 'coordinates': polygons}
+
+def vertex_count(geojson_geometry):
+    if geojson_geometry.get('type') == 'Point':
+        return 1
+    return sum(len(ring) for rings in _polygons_of(geojson_geometry) for ring in rings)
+
+def geojson_to_ee_geometry(geojson_geometry, buffer_radius, reduction_scale=None):
+    """
+    Converts a GeoJSON geometry dict into an ee.Geometry after prepare_geojson().
+    Returns (ee_geometry, effective_buffer); effective_buffer is only set for buffered Points.
+    """
+    prepared = prepare_geojson(geojson_geometry, reduction_scale)
+    geom_type = prepared['type']
+    if geom_type != 'Point':
+        before, after = vertex_count(geojson_geometry), vertex_count(prepared)
+        if after < before:
+            print(f"Geometry simplified at {reduction_scale}m scale: {before} -> {after} vertices.", file=sys.stderr)
+    coords = prepared['coordinates']
+    if geom_type == 'Polygon':
+        return ee.Geometry.Polygon(coords), None
+    if geom_type == 'MultiPolygon':
+        return ee.Geometry.MultiPolygon(coords), None
+    return ee.Geometry.Point(coords).buffer(buffer_radius), buffer_radius
+
+def _canonical_ring(ring, clockwise):
+    """Rounded ring, rotated to start at its smallest vertex and wound in a fixed direction."""
+    positions = [[round(lon, HASH_COORD_PRECISION), round(lat, HASH_COORD_PRECISION)] for lon, lat in ring[:-1]]
+    signed_area = sum(a[0] * b[1] - b[0] * a[1] for a, b in zip(positions, positions[1:] + positions[:1]))
+    if (signed_area < 0) != clockwise:
+        positions.reverse()
+    start = positions.index(min(positions))
+    positions = positions[start:] + positions[:start]
+    return positions + [positions[0]]
+
+def geometry_hash(geojson_geometry, buffer_radius=None):
+    """
+    Stable sha256 of a GeoJSON geometry. Rings are repaired, rounded, rotated and re-wound
+    (shell counter-clockwise, holes clockwise) and holes/polygons sorted, so the same region
+    drawn from a different starting vertex or direction hashes the same. Points include their
+    buffer radius since that defines the analysed area. Computed client-side, no GEE call.
+    """
+    prepared = prepare_geojson(geojson_geometry)
+    if prepared['type'] == 'Point':
+        canonical = {
+            'type': 'Point',
+            'coordinates': [round(c, HASH_COORD_PRECISION) for c in prepared['coordinates']],
+            'buffer': buffer_radius,
+        }
+    else:
+        polygons = sorted(
+            [_canonical_ring(rings[0], clockwise=False)] + sorted(_canonical_ring(hole, clockwise=True) for hole in rings[1:])
+            for rings in _polygons_of(prepared)
+        )
+        canonical = {'type': 'MultiPolygon', 'coordinates': polygons}
+    encoded = json.dumps(canonical, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
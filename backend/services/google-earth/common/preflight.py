@@ -0,0 +1,101 @@
+import os
+import sys
+import ee
+
+from common.ee_requests import evaluate
+from common.batch import with_band_placeholder
+
+# Data-availability preflight. Each detector describes its analysis windows with
+# window_availability(); preflight_report() fetches scene counts and cloud-free coverage for
+# every window of every detector in one request, so jobs without usable imagery can stop
+# before any composite, thumbnail or reduction is requested.
+#   GEE_PREFLIGHT=off                skips the check (detectors then fail late, as before)
+#   GEE_PREFLIGHT_MIN_COVERAGE       share of the region (0-1) that must have a cloud-free pixel (default: 0, any)
+
+PREFLIGHT_ENABLED = os.environ.get('GEE_PREFLIGHT', 'on').lower() not in ('off', '0', 'false')
+MIN_COVERAGE = float(os.environ.get('GEE_PREFLIGHT_MIN_COVERAGE', 0))
+PREFLIGHT_SCALE = 200  # coverage only needs to be approximate
+
+def window_availability(collection, start, end, region_geometry, mask_fn=None):
+    """
+    ee.Dictionary {scene_count, coverage} for one window. coverage is the share of the region
+    with at least one valid (e.g. cloud-masked) pixel; it is only computed when there are scenes.
+    """
+    scenes = collection.filterDate(ee.Date(start), ee.Date(end))
+    scene_count = scenes.size()
+    masked = scenes.map(mask_fn) if mask_fn else scenes
+    # 1 where any scene has a valid pixel; the placeholder keeps the band when the window is empty
+    valid_pixels = masked.map(lambda image: image.select([0]).mask().gt(0).selfMask().rename('valid').toFloat())
+    valid = with_band_placeholder(valid_pixels, ['valid']).max().unmask(0)
+    coverage = valid.reduceRegion(
+        reducer=ee.Reducer.mean(),
+        geometry=region_geometry,
+        scale=PREFLIGHT_SCALE,
+        maxPixels=1e9,
+        bestEffort=True
+    ).get('valid')
+    return ee.Dictionary({
+        'scene_count': scene_count,
+        'coverage': ee.Algorithms.If(scene_count.gt(0), coverage, 0),
+    })
+
+def preflight_report(windows_by_detector):
+    """
+    {detector: {window: availability ee.Dictionary}} -> {detector: {window: {scene_count, coverage}}},
+    evaluated in a single request.
+    """
+    return evaluate(ee.Dictionary({
+        detector: ee.Dictionary(windows) for detector, windows in windows_by_detector.items()
+    }))
+
+def missing_windows(detector_report):
+    """Window names in one detector's report without scenes or below MIN_COVERAGE."""
+    return [
+        window for window, availability in detector_report.items()
+        if not availability.get('scene_count') or (availability.get('coverage') or 0) <= MIN_COVERAGE
+    ]
+
+def _failure_result(detector, report, error_fields):
+    """The error result for one detector's report, or None when every window is usable."""
+    missing = missing_windows(report)
+    if not missing:
+        return None
+    message = f"No cloud-free data available for the {', '.join(missing)} period. Skipped before analysis."
+    print(f"Preflight: {detector} {message} {report}", file=sys.stderr)
+    return {
+        "status": "error",
+        "message": message,
+        "alert_triggered": False,
+        **(error_fields or {}),
+        "preflight": report,
+        "start_image_url": None,
+        "end_image_url": None,
+    }
+
+def preflight_failure(detector, windows, error_fields=None):
+    """
+    Runs the preflight for one detector. Returns an error result when a window has no usable
+    imagery, or None when the detector should run (also when the preflight is off or fails).
+    error_fields (the detector's error_fields()) give the result the detector's own error shape.
+    """
+    return preflight_failures({detector: windows}, {detector: error_fields}).get(detector)
+
+def preflight_failures(windows_by_detector, error_fields_by_detector=None):
+    """
+    preflight_failure() for several detectors in one request: {detector: error result} for
+    those that should not run. Empty when the preflight is off or fails.
+    """
+    windows_by_detector = {detector: windows for detector, windows in windows_by_detector.items() if windows}
+    if not PREFLIGHT_ENABLED or not windows_by_detector:
+        return {}
+    try:
+        report = preflight_report(windows_by_detector)
+    except ee.EEException as e:
+        print(f"WARNING: Preflight failed for {list(windows_by_detector)}, running the detectors anyway: {e}", file=sys.stderr)
+        return {}
+    failures = {}
+    for detector in windows_by_detector:
+        failure = _failure_result(detector, report[detector], (error_fields_by_detector or {}).get(detector))
+        if failure is not None:
+            failures[detector] = failure
+    return failures
@@ -0,0 +1,73 @@
+import sys
+import json
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# Streaming progress. When a job asks for it ("stream": true), NDJSON events are written to
+# stdout while the job runs, before its final result line:
+#   {"event": "stage", "stage": "getInfo", "state": "started"}                  (each EE round trip)
+#   {"event": "stage", "stage": "getInfo", "state": "finished", "elapsed_ms": 812.4, "error": ...}
+#   {"event": "stats", ...}                       intermediate values as soon as they are known
+#   {"event": "region_result", "region_id": ..., "result": {...}}    multi-region jobs, per region
+# The worker adds job_id to every event. The final result line never has an "event" key, so
+# consumers that only read the last line keep working. Without streaming nothing is emitted.
+
+_emitter = contextvars.ContextVar('gee_progress_emitter', default=None)
+_write_lock = threading.Lock()
+
+def write_json_line(output_stream, payload):
+    """Writes payload as one JSON line; safe to call from request pool threads."""
+    line = json.dumps(payload, default=str)
+    with _write_lock:
+        output_stream.write(line + "\n")
+        output_stream.flush()
+
+def stream_writer(output_stream, **fields):
+    """An emitter writing events (plus fields, e.g. job_id) as JSON lines to output_stream."""
+    return lambda event: write_json_line(output_stream, {**event, **fields})
+
+def bind_progress(output_stream=sys.stdout, **fields):
+    """Streams events of this context to output_stream; for one-shot scripts."""
+    _emitter.set(stream_writer(output_stream, **fields))
+
+@contextmanager
+def progress_to(emit):
+    """Sends events raised inside the block to emit (None turns streaming off)."""
+    token = _emitter.set(emit)
+    try:
+        yield
+    finally:
+        _emitter.reset(token)
+
+def emit_event(event, **fields):
+    emit = _emitter.get()
+    if emit is not None:
+        emit({'event': event, **fields})
+
+def emit_stats(**stats):
+    emit_event('stats', **stats)
+
+def emit_region_result(region_id, result):
+    emit_event('region_result', region_id=region_id, result=result)
+
+@contextmanager
+def stage(name):
+    """Emits stage started/finished events around the block; a no-op without streaming."""
+    if _emitter.get() is None:
+        yield
+        return
+    emit_event('stage', stage=name, state='started')
+    started = time.perf_counter()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        fields = {'elapsed_ms': round((time.perf_counter() - started) * 1000, 3)}
+        if error:
+            fields['error'] = error
+        emit_event('stage', stage=name, state='finished', **fields)
@@ -0,0 +1,319 @@
+import os
+import sys
+import json
+import math
+import time
+import shutil
+import warnings
+from pathlib import Path
+
+import ee
+import numpy as np
+
+from common.ee_requests import call_ee, evaluate
+from common.geometry import METERS_PER_DEGREE
+from common.sentinel2 import SCL_MASK_VALUES
+from common.time_windows import resolve_anchor, period_fields, DATE_FORMAT
+
+# Local NumPy backend for the index and change-detection math. A window is downloaded once as
+# raw band stacks (one layer per scene, on a lon/lat grid at the detector's scale) together
+# with the region mask, or read from local files; masking, index, compositing, thresholding
+# and area sums then run as vectorised NumPy on our own cores. Downloaded windows are kept on
+# disk, so re-running a detector with another threshold costs no Earth Engine request.
+# Stored downloads are dropped after GEE_RASTER_TTL_SECONDS (their windows end on the day they
+# were fetched, so later runs use new keys anyway) and least recently used first beyond
+# GEE_RASTER_MAX_BYTES; both are checked whenever a download is saved.
+#   GEE_RASTER_DIR                   where downloaded windows are kept (default: services/google-earth/.cache/rasters)
+#   GEE_RASTER_TTL_SECONDS           lifetime of a stored download (default: 2 days)
+#   GEE_RASTER_MAX_BYTES             size bound of the store (default: 2 GiB)
+#
+# A raster is {'bands': {name: (scenes, rows, cols) float array, NaN = no data},
+# 'region': (rows, cols) bool, 'grid': [west, north, x_degrees, y_degrees], 'start', 'end'}.
+# On disk a window is <name>.npz (band_<name>, region, grid, period), a GeoTIFF in EPSG:4326
+# whose band descriptions are "<scene>_<band>" (as Image.toBands() names them), or a
+# structured .npy array with the same field names next to a <name>.json holding the grid.
+
+DEFAULT_RASTER_DIR = Path(__file__).resolve().parent.parent / '.cache' / 'rasters'
+RASTER_DIR = Path(os.environ.get('GEE_RASTER_DIR', DEFAULT_RASTER_DIR))
+RASTER_TTL_SECONDS = int(os.environ.get('GEE_RASTER_TTL_SECONDS', 2 * 24 * 3600))
+RASTER_MAX_BYTES = int(os.environ.get('GEE_RASTER_MAX_BYTES', 2 * 1024 ** 3))
+MAX_DOWNLOAD_BYTES = 48 * 1024 * 1024  # computePixels response limit
+MAX_SCENES = 32  # per window; later scenes are dropped
+NODATA = -9999
+REGION_BAND = 'region'
+RASTER_SUFFIXES = ('.npz', '.npy', '.tif', '.tiff')
+
+def _window_scenes(collection, start, end):
+    return collection.filterDate(ee.Date(start), ee.Date(end)).limit(MAX_SCENES)
+
+def raster_grid(region_geometry, scale, collection=None, periods=()):
+    """
+    Lon/lat grid covering the region's bounds with pixels of roughly scale meters (one request).
+    With a collection, the scene count of each (start, end) in periods comes back in the same
+    request, so download_window needn't ask for it.
+    """
+    request = {'ring': region_geometry.bounds().coordinates()}
+    if collection is not None and periods:
+        request['scene_counts'] = ee.List([_window_scenes(collection, start, end).size() for start, end in periods])
+    summary = evaluate(ee.Dictionary(request))
+    ring = summary['ring'][0]
+    longitudes, latitudes = [p[0] for p in ring], [p[1] for p in ring]
+    west, east, south, north = min(longitudes), max(longitudes), min(latitudes), max(latitudes)
+    y_degrees = scale / METERS_PER_DEGREE
+    x_degrees = y_degrees / max(math.cos(math.radians((south + north) / 2)), 1e-6)
+    return {
+        'grid': [west, north, x_degrees, y_degrees],
+        'width': max(1, math.ceil((east - west) / x_degrees)),
+        'height': max(1, math.ceil((north - south) / y_degrees)),
+        'scene_counts': dict(zip(periods, summary.get('scene_counts', []))),
+    }
+
+def _split_band_name(name):
+    """'<scene>_<band>' -> (scene, band); names without a scene prefix are a single composite."""
+    scene, _, band = name.rpartition('_')
+    return (scene, band) if scene else ('', name)
+
+def _stacks_from_fields(names, layer):
+    """{band: (scenes, rows, cols)} from '<scene>_<band>' layers, keeping scene order."""
+    layers = {}
+    for name in names:
+        if name == REGION_BAND:
+            continue
+        _, band = _split_band_name(name)
+        values = np.asarray(layer(name), dtype=np.float64)
+        layers.setdefault(band, []).append(np.where(values == NODATA, np.nan, values))
+    return {band: np.stack(stack) for band, stack in layers.items()}
+
+def _empty_stacks(band_names, shape):
+    return {band: np.empty((0, *shape)) for band in band_names}
+
+def download_window(collection, start, end, band_names, region_geometry, grid, scene_count=None):
+    """
+    Raw band_names of every scene in [start, end) (up to MAX_SCENES) plus the region mask,
+    in one computePixels request on grid (from raster_grid). The scene count is taken from
+    scene_count or the grid, and only requested when neither has it. Returns a raster.
+    """
+    width, height = grid['width'], grid['height']
+    scenes = _window_scenes(collection, start, end)
+    stack = scenes.select(band_names).toBands().toFloat().unmask(NODATA)
+    region = ee.Image.constant(1).clip(region_geometry).unmask(0).toFloat().rename(REGION_BAND)
+    if scene_count is None:
+        scene_count = grid.get('scene_counts', {}).get((start, end))
+    if scene_count is None:
+        scene_count = evaluate(scenes.size())
+    scene_count = min(scene_count, MAX_SCENES)
+    estimated_bytes = width * height * 4 * (scene_count * len(band_names) + 1)
+    if estimated_bytes > MAX_DOWNLOAD_BYTES:
+        raise ValueError(
+            f"Window {start:%Y-%m-%d}..{end:%Y-%m-%d} needs ~{estimated_bytes // 2**20} MB of pixels "
+            f"({scene_count} scenes, {width}x{height}); use the Earth Engine backend for this region."
+        )
+    west, north, x_degrees, y_degrees = grid['grid']
+    expression = region.addBands(stack) if scene_count else region
+    pixels = call_ee(lambda: ee.data.computePixels({
+        'expression': expression,
+        'fileFormat': 'NUMPY_NDARRAY',
+        'grid': {
+            'dimensions': {'width': width, 'height': height},
+            'affineTransform': {
+                'scaleX': x_degrees, 'shearX': 0, 'translateX': west,
+                'shearY': 0, 'scaleY': -y_degrees, 'translateY': north,
+            },
+            'crsCode': 'EPSG:4326',
+        },
+    }), 'computePixels', expression)
+    bands = _stacks_from_fields(pixels.dtype.names, lambda name: pixels[name])
+    return {
+        'bands': {**_empty_stacks(band_names, (height, width)), **bands},
+        'region': np.asarray(pixels[REGION_BAND]) > 0,
+        'grid': list(grid['grid']),
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+    }
+
+def save_raster(path, raster):
+    np.savez_compressed(
+        path,
+        region=raster['region'],
+        grid=np.asarray(raster['grid'], dtype=np.float64),
+        period=np.array([raster.get('start') or '', raster.get('end') or '']),
+        **{f"band_{band}": stack for band, stack in raster['bands'].items()}
+    )
+
+def _load_npz(path):
+    with np.load(path) as stored:
+        start, end = (str(value) or None for value in stored['period']) if 'period' in stored.files else (None, None)
+        return {
+            'bands': {name[len('band_'):]: stored[name] for name in stored.files if name.startswith('band_')},
+            'region': stored['region'].astype(bool),
+            'grid': stored['grid'].tolist(),
+            'start': start,
+            'end': end,
+        }
+
+def _load_npy(path):
+    pixels = np.load(path)
+    if pixels.dtype.names is None:
+        raise ValueError(f"{path.name}: expected a structured array with '<scene>_<band>' fields.")
+    meta = json.loads(path.with_suffix('.json').read_text())
+    bands = _stacks_from_fields(pixels.dtype.names, lambda name: pixels[name])
+    region = pixels[REGION_BAND] > 0 if REGION_BAND in pixels.dtype.names else np.ones(pixels.shape, dtype=bool)
+    return {'bands': bands, 'region': region, 'grid': meta['grid'], 'start': meta.get('start'), 'end': meta.get('end')}
+
+def _load_geotiff(path):
+    try:
+        import rasterio
+    except ImportError:
+        raise RuntimeError("Reading GeoTIFF windows needs the rasterio package (pip install rasterio).")
+    with rasterio.open(path) as src:
+        if src.crs is None or not src.crs.is_geographic:
+            raise ValueError(f"{path.name}: GeoTIFF windows must be in geographic (lon/lat) coordinates.")
+        names = [description or f"b{i + 1}" for i, description in enumerate(src.descriptions)]
+        data = src.read(masked=True).astype(np.float64).filled(np.nan)
+        transform = src.transform
+        tags = src.tags()
+    layers = dict(zip(names, data))
+    region = layers[REGION_BAND] > 0 if REGION_BAND in layers else np.ones(data.shape[1:], dtype=bool)
+    return {
+        'bands': _stacks_from_fields(names, layers.get),
+        'region': region,
+        'grid': [transform.c, transform.f, transform.a, -transform.e],
+        'start': tags.get('start'),
+        'end': tags.get('end'),
+    }
+
+def load_raster(path):
+    path = Path(path)
+    if path.suffix == '.npz':
+        return _load_npz(path)
+    if path.suffix == '.npy':
+        return _load_npy(path)
+    if path.suffix in ('.tif', '.tiff'):
+        return _load_geotiff(path)
+    raise ValueError(f"Unsupported raster file: {path.name} (expected one of {RASTER_SUFFIXES})")
+
+def load_windows(directory, window_names):
+    """{window: raster} from <directory>/<window>.<npz|npy|tif|tiff>. Raises FileNotFoundError if one is missing."""
+    directory = Path(directory)
+    windows = {}
+    for window in window_names:
+        paths = [directory / f"{window}{suffix}" for suffix in RASTER_SUFFIXES if (directory / f"{window}{suffix}").exists()]
+        if not paths:
+            raise FileNotFoundError(f"No raster for window '{window}' in {directory}")
+        windows[window] = load_raster(paths[0])
+    return windows
+
+def _directory_size(directory):
+    return sum(path.stat().st_size for path in directory.iterdir() if path.is_file())
+
+def prune_raster_cache():
+    """Removes stored downloads older than RASTER_TTL_SECONDS, then the least recently used beyond RASTER_MAX_BYTES."""
+    try:
+        entries = []
+        for directory in RASTER_DIR.iterdir():
+            if directory.is_dir():
+                entries.append((directory.stat().st_mtime, _directory_size(directory), directory))
+    except OSError:
+        return
+    now = time.time()
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for used_at, size, directory in sorted(entries, key=lambda entry: entry[0]):
+        if now - used_at <= RASTER_TTL_SECONDS and total <= RASTER_MAX_BYTES:
+            break
+        shutil.rmtree(directory, ignore_errors=True)
+        total -= size
+        removed += 1
+    if removed:
+        print(f"Removed {removed} stored raster downloads.", file=sys.stderr)
+
+def cached_windows(key, window_names, fetch):
+    """
+    The windows stored under RASTER_DIR/key, or fetch() ({window: raster}) saved there first.
+    key should leave out thresholds so every threshold reuses the same download.
+    """
+    directory = RASTER_DIR / key if key else None
+    if directory is not None:
+        try:
+            windows = load_windows(directory, window_names)
+            os.utime(directory)  # least recently used goes first when pruning
+            print(f"Using local rasters {key[:12]} for {', '.join(window_names)}.", file=sys.stderr)
+            return windows
+        except (OSError, KeyError, ValueError):
+            pass
+    windows = fetch()
+    if directory is not None:
+        try:
+            directory.mkdir(parents=True, exist_ok=True)
+            for window, raster in windows.items():
+                partial_path = directory / f"{window}.partial"
+                with open(partial_path, 'wb') as f:
+                    save_raster(f, raster)
+                os.replace(partial_path, directory / f"{window}.npz")
+        except OSError as e:
+            print(f"WARNING: Could not save local rasters: {e}", file=sys.stderr)
+        prune_raster_cache()
+    return windows
+
+def scene_count(raster):
+    return max((len(stack) for stack in raster['bands'].values()), default=0)
+
+def raster_period_fields(prefix, raster, date_format=DATE_FORMAT):
+    """period_fields for a raster's window; empty when the raster doesn't record its dates."""
+    if not raster.get('start') or not raster.get('end'):
+        return {}
+    return period_fields(prefix, resolve_anchor(raster['start']), resolve_anchor(raster['end']), date_format)
+
+def scl_clear(scl, mask_values=SCL_MASK_VALUES):
+    """True where the scene classification is not one of mask_values (as mask_s2_clouds)."""
+    return ~np.isin(scl, mask_values) & ~np.isnan(scl)
+
+def normalized_difference(first, second):
+    """(first - second) / (first + second); NaN where either is missing or the sum is zero."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        total = first + second
+        return np.where(total != 0, (first - second) / total, np.nan)
+
+def masked_index(raster, first_band, second_band, mask_values=SCL_MASK_VALUES):
+    """Per-scene normalized difference of a Sentinel-2 raster with SCL cloud classes masked out."""
+    bands = raster['bands']
+    index = normalized_difference(bands[first_band], bands[second_band])
+    return np.where(scl_clear(bands['SCL'], mask_values), index, np.nan)
+
+def median_composite(stack):
+    """Per-pixel median over scenes, ignoring NaN; NaN where no scene has data."""
+    if len(stack) == 0:
+        return np.full(stack.shape[1:], np.nan)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        return np.nanmedian(stack, axis=0)
+
+def pixel_centers(raster):
+    """(longitudes, latitudes) of the pixel centres, as (cols,) and (rows,) arrays."""
+    west, north, x_degrees, y_degrees = raster['grid']
+    rows, cols = raster['region'].shape
+    return west + (np.arange(cols) + 0.5) * x_degrees, north - (np.arange(rows) + 0.5) * y_degrees
+
+def pixel_area_km2(raster):
+    """Area of every pixel in km², from the latitude of its row."""
+    _, latitudes = pixel_centers(raster)
+    _, _, x_degrees, y_degrees = raster['grid']
+    row_area = (x_degrees * METERS_PER_DEGREE * np.cos(np.radians(latitudes))) * (y_degrees * METERS_PER_DEGREE) / 1e6
+    return np.broadcast_to(row_area[:, None], raster['region'].shape)
+
+def region_mean(image, region):
+    """Mean of the non-NaN pixels inside region, or None if there are none."""
+    values = image[region & ~np.isnan(image)]
+    return float(values.mean()) if values.size else None
+
+def region_sum(image, region):
+    """Sum of the non-NaN pixels inside region."""
+    return float(np.nansum(np.where(region, image, 0)))
+
+def region_centroid(raster):
+    """[lon, lat] centroid of the region's pixels, or None when the region is empty."""
+    rows, cols = np.nonzero(raster['region'])
+    if not len(rows):
+        return None
+    longitudes, latitudes = pixel_centers(raster)
+    return [float(longitudes[cols].mean()), float(latitudes[rows].mean())]
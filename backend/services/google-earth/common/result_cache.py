@@ -0,0 +1,122 @@
+import os
+import sys
+import json
+import time
+import sqlite3
+import hashlib
+from contextlib import closing
+from pathlib import Path
+
+from common.geometry import geometry_hash
+from common.thumbnails import thumbnail_mode
+from common.scale import current_pixel_budget
+from common.time_windows import resolve_anchor, DATE_FORMAT
+
+# Disk-backed cache of detector results. Entries are keyed by the region's geometry hash,
+# detector, thresholds, reduction scale and analysis window, so re-running a check for the
+# same inputs on the same day returns without touching Earth Engine. Only successful
+# results are stored. Thumbnail URLs are cached too, so keep the TTL below their lifetime.
+#   GEE_RESULT_CACHE=off             disables the cache
+#   GEE_RESULT_CACHE_PATH            SQLite file (default: services/google-earth/.cache/results.sqlite3)
+#   GEE_RESULT_CACHE_TTL_SECONDS     entry lifetime (default: 6h)
+#   GEE_RESULT_CACHE_MAX_ENTRIES     LRU bound (default: 5000)
+
+DEFAULT_CACHE_PATH = Path(__file__).resolve().parent.parent / '.cache' / 'results.sqlite3'
+CACHE_ENABLED = os.environ.get('GEE_RESULT_CACHE', 'on').lower() not in ('off', '0', 'false')
+CACHE_PATH = Path(os.environ.get('GEE_RESULT_CACHE_PATH', DEFAULT_CACHE_PATH))
+CACHE_TTL_SECONDS = int(os.environ.get('GEE_RESULT_CACHE_TTL_SECONDS', 6 * 3600))
+CACHE_MAX_ENTRIES = int(os.environ.get('GEE_RESULT_CACHE_MAX_ENTRIES', 5000))
+
+def _connect():
+    CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(CACHE_PATH), timeout=10)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS results ("
+        " key TEXT PRIMARY KEY,"
+        " detector TEXT NOT NULL,"
+        " result TEXT NOT NULL,"
+        " created_at REAL NOT NULL,"
+        " last_access REAL NOT NULL)"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS results_last_access ON results (last_access)")
+    return conn
+
+def analysis_window(*durations, anchor=None):
+    """Cache window descriptor: the anchor day plus the detector's window lengths."""
+    return {'anchor_day': resolve_anchor(anchor).strftime(DATE_FORMAT), 'durations': list(durations)}
+
+def cache_key(detector, geojson_geometry, buffer_radius, params, scale, window):
+    """
+    sha256 over geometry hash, detector name, thresholds, reduction scale, pixel budget and window.
+    Returns None for geometries that can't be hashed; such runs are simply not cached.
+    """
+    try:
+        region_hash = geometry_hash(geojson_geometry, buffer_radius)
+    except (AttributeError, TypeError, ValueError):
+        return None
+    payload = {
+        'detector': detector,
+        'geometry': region_hash,
+        'params': params,
+        'scale': scale,
+        # The budget can coarsen the scale actually used (common.scale)
+        'pixel_budget': current_pixel_budget(),
+        'window': window,
+        # Eager and lazy results differ (URLs vs recipes), so they are cached separately.
+        'thumbnails': thumbnail_mode(),
+    }
+    encoded = json.dumps(payload, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+def get_cached_result(key):
+    """Returns the cached result dict for key, or None if missing/expired. Refreshes LRU position."""
+    if not CACHE_ENABLED or key is None:
+        return None
+    try:
+        now = time.time()
+        with closing(_connect()) as conn, conn:
+            row = conn.execute("SELECT result, created_at FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > CACHE_TTL_SECONDS:
+                conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                return None
+            conn.execute("UPDATE results SET last_access = ? WHERE key = ?", (now, key))
+        return json.loads(row[0])
+    except (sqlite3.Error, OSError, ValueError) as e:
+        print(f"WARNING: Result cache read failed: {e}", file=sys.stderr)
+        return None
+
+def store_result(key, detector, result):
+    """Stores a successful result, then drops expired entries and evicts least recently used ones."""
+    if not CACHE_ENABLED or key is None or result.get('status') != 'success':
+        return
+    try:
+        now = time.time()
+        with closing(_connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO results (key, detector, result, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, detector, json.dumps(result), now, now)
+            )
+            conn.execute("DELETE FROM results WHERE created_at < ?", (now - CACHE_TTL_SECONDS,))
+            conn.execute(
+                "DELETE FROM results WHERE key IN ("
+                " SELECT key FROM results ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (CACHE_MAX_ENTRIES,)
+            )
+    except (sqlite3.Error, OSError, TypeError, ValueError) as e:
+        print(f"WARNING: Result cache write failed: {e}", file=sys.stderr)
+
+def cached_run(key, detector, run):
+    """
+    Returns the cached result for key, or calls run() and caches what it returns.
+    Cache hits carry "cached": True.
+    """
+    cached = get_cached_result(key)
+    if cached is not None:
+        print(f"Result cache hit for {detector} ({key[:12]}), skipping GEE.", file=sys.stderr)
+        cached['cached'] = True
+        return cached
+    result = run()
+    store_result(key, detector, result)
+    return result
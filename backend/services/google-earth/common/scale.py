@@ -0,0 +1,37 @@
+import os
+import contextvars
+from contextlib import contextmanager
+
+import ee
+
+# Reduction scale from a pixel budget. Regions are reduced at the detector's native scale
+# unless they would cover more than the budget's pixels there; larger regions are reduced at
+# the (whole-metre) scale where they cover about the budget, so their reductions take a
+# predictable time instead of timing out or being coarsened by bestEffort without a trace.
+# The scale is computed server-side from the region's area, inside the same request as the
+# statistics, and results report it as reduction_scale_meters.
+#   GEE_PIXEL_BUDGET                 pixels per region and reduction (default: 1e7); jobs can pass pixel_budget
+
+DEFAULT_PIXEL_BUDGET = float(os.environ.get('GEE_PIXEL_BUDGET', 1e7))
+SCALE_PROPERTY = 'reduction_scale_meters'
+
+_budget = contextvars.ContextVar('gee_pixel_budget', default=None)
+
+@contextmanager
+def pixel_budget(budget):
+    """Reductions built inside the block use budget (None keeps the default)."""
+    token = _budget.set(None if budget is None else float(budget))
+    try:
+        yield
+    finally:
+        _budget.reset(token)
+
+def current_pixel_budget():
+    return _budget.get() or DEFAULT_PIXEL_BUDGET
+
+def _scale_for_area(area, native_scale):
+    return ee.Number(area).divide(current_pixel_budget()).sqrt().ceil().max(native_scale)
+
+def adaptive_scale(region_geometry, native_scale):
+    """ee.Number: native_scale, or the coarser scale at which region_geometry covers the pixel budget."""
+    return _scale_for_area(region_geometry.area(maxError=native_scale), native_scale)
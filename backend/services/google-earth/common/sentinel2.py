@@ -0,0 +1,12 @@
+# Sentinel-2 surface reflectance cloud masking, shared by the deforestation, coastal erosion
+# and glacier detectors, the fused Sentinel-2 pass and the local NumPy backend (common.raster).
+
+S2_COLLECTION = 'COPERNICUS/S2_SR_HARMONIZED'
+CLOUD_MASK_BAND = 'SCL'
+# Scene classes dropped before compositing: cloud shadow, medium/high cloud probability, cirrus, snow
+SCL_MASK_VALUES = [3, 8, 9, 10, 11]
+
+def mask_s2_clouds(image):
+    scl = image.select(CLOUD_MASK_BAND)
+    mask = scl.remap(SCL_MASK_VALUES, [0]*len(SCL_MASK_VALUES), defaultValue=1)
+    return image.updateMask(mask)
@@ -0,0 +1,105 @@
+import os
+import sys
+import hmac
+import json
+import zlib
+import base64
+import hashlib
+import ee
+
+from common.ee_requests import run_concurrently, submit_requests, call_ee
+from common.gee_init import initialized_key_fingerprint
+
+# Thumbnails are either rendered during the check ("eager", getThumbURL per image) or returned
+# as a recipe ("lazy"): the serialized image/region expression graph plus vis params, compressed
+# into one string. A recipe costs no Earth Engine call to build; render_thumbnail_recipe()
+# turns it into a URL only when someone asks for the image.
+# Rendering runs the recipe's graph with the service account, so recipes are signed
+# ("<payload>.<HMAC-SHA256>") and only signed ones are decoded. The key is derived from the
+# service account key file unless GEE_THUMBNAIL_SECRET is set (it must be when recipes are
+# built and rendered with different keys).
+#   GEE_THUMBNAIL_MODE=eager|lazy    (default: eager)
+#   GEE_THUMBNAIL_SECRET             recipe signing key (default: derived from the service account key)
+
+THUMBNAIL_MODE_EAGER = 'eager'
+THUMBNAIL_MODE_LAZY = 'lazy'
+RECIPE_VERSION = 1
+VIS_PARAM_KEYS = ('min', 'max', 'dimensions', 'palette')
+
+def thumbnail_mode():
+    mode = os.environ.get('GEE_THUMBNAIL_MODE', THUMBNAIL_MODE_EAGER).lower()
+    return THUMBNAIL_MODE_LAZY if mode == THUMBNAIL_MODE_LAZY else THUMBNAIL_MODE_EAGER
+
+def _recipe_secret():
+    secret = os.environ.get('GEE_THUMBNAIL_SECRET')
+    if secret:
+        return secret.encode('utf-8')
+    fingerprint = initialized_key_fingerprint()
+    if fingerprint is None:
+        raise ValueError("No thumbnail recipe key: set GEE_THUMBNAIL_SECRET or initialize GEE first.")
+    return hashlib.sha256(f"thumbnail-recipe:{fingerprint}".encode('utf-8')).digest()
+
+def _recipe_signature(body):
+    digest = hmac.new(_recipe_secret(), body.encode('ascii'), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).decode('ascii').rstrip('=')
+
+def thumbnail_recipe(image, region_geometry, vis_params):
+    """Serializes image + region + vis params into a compact, signed URL-safe string (client-side only)."""
+    payload = {
+        'v': RECIPE_VERSION,
+        'image': image.serialize(),
+        'region': region_geometry.serialize(),
+        'vis': {key: vis_params[key] for key in VIS_PARAM_KEYS if key in vis_params},
+    }
+    encoded = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    body = base64.urlsafe_b64encode(zlib.compress(encoded, 9)).decode('ascii')
+    return f"{body}.{_recipe_signature(body)}"
+
+def render_thumbnail_recipe(recipe):
+    """
+    Rebuilds the image from a recipe and returns its getThumbURL. Raises ValueError on bad
+    recipes; the signature is checked before anything in the recipe is decoded.
+    """
+    try:
+        body, signature = recipe.rsplit('.', 1)
+    except (ValueError, AttributeError):
+        raise ValueError("Invalid thumbnail recipe: not signed")
+    if not hmac.compare_digest(signature.encode('utf-8'), _recipe_signature(body).encode('ascii')):
+        raise ValueError("Invalid thumbnail recipe: bad signature")
+    try:
+        payload = json.loads(zlib.decompress(base64.urlsafe_b64decode(body.encode('ascii'))))
+    except (zlib.error, ValueError, TypeError, AttributeError) as e:
+        raise ValueError(f"Invalid thumbnail recipe: {e}")
+    if payload.get('v') != RECIPE_VERSION:
+        raise ValueError(f"Unsupported thumbnail recipe version: {payload.get('v')}")
+    image = ee.Image(ee.deserializer.fromJSON(payload['image']))
+    region = ee.Geometry(ee.deserializer.fromJSON(payload['region']))
+    return call_ee(lambda: image.getThumbURL({**payload['vis'], 'region': region}), 'getThumbURL', image)
+
+def thumbnail_fields(get_url, before_image, after_image, region_geometry, vis_params):
+    """
+    Response fields for a before/after pair. Eager mode calls get_url (the detector's
+    get_*_image_url) for both images concurrently; lazy mode leaves the URLs empty and adds
+    start_image_recipe / end_image_recipe instead.
+    """
+    if thumbnail_mode() == THUMBNAIL_MODE_EAGER:
+        return run_concurrently({
+            "start_image_url": lambda: get_url(before_image, region_geometry, vis_params, "before"),
+            "end_image_url": lambda: get_url(after_image, region_geometry, vis_params, "after"),
+        })
+    try:
+        return {
+            "start_image_url": None,
+            "end_image_url": None,
+            "start_image_recipe": thumbnail_recipe(before_image, region_geometry, vis_params),
+            "end_image_recipe": thumbnail_recipe(after_image, region_geometry, vis_params),
+        }
+    except Exception as e:
+        print(f"WARNING: Could not serialize thumbnail recipes: {e}", file=sys.stderr)
+        return {"start_image_url": None, "end_image_url": None}
+
+def submit_thumbnail_fields(get_url, before_image, after_image, region_geometry, vis_params):
+    """thumbnail_fields() started on the shared request pool; returns a Future of the fields."""
+    return submit_requests({
+        'thumbnails': lambda: thumbnail_fields(get_url, before_image, after_image, region_geometry, vis_params)
+    })['thumbnails']
@@ -0,0 +1,138 @@
+import os
+import sys
+import json
+import time
+import sqlite3
+import datetime
+from contextlib import closing
+from pathlib import Path
+
+import ee
+
+from common.ee_requests import evaluate
+from common.geometry import geometry_hash
+from common.scale import current_pixel_budget
+from common.time_windows import resolve_anchor
+
+# Monthly statistics for trend charts. A detector describes one month as a server-side
+# function of the month's start ee.Date (monthly_stats(region) -> month_stats(start)), which
+# is mapped over ee.List.sequence for every month still needed and fetched in one getInfo.
+# Months that are over can't change any more, so they are kept without expiry: later runs
+# only compute the current month. Imagery of a month's last days can arrive a few days late,
+# so a month is stored once SETTLE_DAYS have passed after its end.
+#   GEE_TIME_SERIES_CACHE=off           disables the store (every month is recomputed)
+#   GEE_TIME_SERIES_PATH                SQLite file (default: services/google-earth/.cache/time_series.sqlite3)
+#   GEE_TIME_SERIES_SETTLE_DAYS         days after a month's end before it is stored (default: 5)
+
+DEFAULT_TIME_SERIES_PATH = Path(__file__).resolve().parent.parent / '.cache' / 'time_series.sqlite3'
+TIME_SERIES_CACHE_ENABLED = os.environ.get('GEE_TIME_SERIES_CACHE', 'on').lower() not in ('off', '0', 'false')
+TIME_SERIES_PATH = Path(os.environ.get('GEE_TIME_SERIES_PATH', DEFAULT_TIME_SERIES_PATH))
+SETTLE_DAYS = int(os.environ.get('GEE_TIME_SERIES_SETTLE_DAYS', 5))
+DEFAULT_MONTHS = 12
+MAX_MONTHS = 120
+MONTH_FORMAT = '%Y-%m'
+
+def month_start(moment):
+    return moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+def shift_months(month, months):
+    index = month.year * 12 + month.month - 1 + months
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+def series_months(anchor, count):
+    """The count month starts ending with the anchor's month, oldest first."""
+    last = month_start(resolve_anchor(anchor))
+    return [shift_months(last, offset) for offset in range(1 - count, 1)]
+
+def month_is_final(month):
+    # Against the real clock, not an anchor bound for the job
+    return shift_months(month, 1) + datetime.timedelta(days=SETTLE_DAYS) <= datetime.datetime.now(datetime.timezone.utc)
+
+def series_key(detector, geojson_geometry, buffer_radius, scale):
+    """Store key for a region's months; None for geometries that can't be hashed."""
+    try:
+        return f"{detector}:{scale}:{current_pixel_budget():g}:{geometry_hash(geojson_geometry, buffer_radius)}"
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+def _connect():
+    TIME_SERIES_PATH.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(TIME_SERIES_PATH), timeout=10)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS months ("
+        " key TEXT NOT NULL,"
+        " month TEXT NOT NULL,"
+        " detector TEXT NOT NULL,"
+        " stats TEXT NOT NULL,"
+        " created_at REAL NOT NULL,"
+        " PRIMARY KEY (key, month))"
+    )
+    return conn
+
+def load_months(key, labels):
+    """Stored stats for the given 'YYYY-MM' labels: {label: stats}."""
+    if not TIME_SERIES_CACHE_ENABLED or key is None or not labels:
+        return {}
+    try:
+        with closing(_connect()) as conn:
+            rows = conn.execute(
+                f"SELECT month, stats FROM months WHERE key = ? AND month IN ({','.join('?' * len(labels))})",
+                (key, *labels)
+            ).fetchall()
+        return {month: json.loads(stats) for month, stats in rows}
+    except (sqlite3.Error, OSError, ValueError) as e:
+        print(f"WARNING: Time series read failed: {e}", file=sys.stderr)
+        return {}
+
+def store_months(key, detector, stats_by_label):
+    if not TIME_SERIES_CACHE_ENABLED or key is None or not stats_by_label:
+        return
+    try:
+        now = time.time()
+        with closing(_connect()) as conn, conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO months (key, month, detector, stats, created_at) VALUES (?, ?, ?, ?, ?)",
+                [(key, label, detector, json.dumps(stats), now) for label, stats in stats_by_label.items()]
+            )
+    except (sqlite3.Error, OSError, TypeError, ValueError) as e:
+        print(f"WARNING: Time series write failed: {e}", file=sys.stderr)
+
+def month_sequence(first_month, count, month_stats):
+    """ee.List of month_stats(start) for count consecutive months from first_month, in one expression."""
+    first = ee.Date(first_month)
+    return ee.List.sequence(0, count - 1).map(
+        lambda offset: month_stats(first.advance(offset, 'month'))
+    )
+
+def check_time_series(detector, month_stats, key, months=DEFAULT_MONTHS, anchor=None):
+    """
+    Per-month stats for the months up to the anchor's month. Stored months are reused; the
+    span from the oldest missing month to the newest is computed in one request, and the
+    months in it that are final are stored. Returns {status, months: [{month, ...stats}], ...}.
+    """
+    months = max(1, min(int(months), MAX_MONTHS))
+    month_list = series_months(anchor, months)
+    labels = [month.strftime(MONTH_FORMAT) for month in month_list]
+    stored = load_months(key, [label for month, label in zip(month_list, labels) if month_is_final(month)])
+    missing = [month for month, label in zip(month_list, labels) if label not in stored]
+
+    computed = {}
+    if missing:
+        count = month_list.index(missing[-1]) - month_list.index(missing[0]) + 1
+        values = evaluate(month_sequence(missing[0], count, month_stats))
+        computed = {
+            shift_months(missing[0], offset).strftime(MONTH_FORMAT): value
+            for offset, value in enumerate(values)
+        }
+        store_months(key, detector, {
+            month.strftime(MONTH_FORMAT): computed[month.strftime(MONTH_FORMAT)]
+            for month in missing if month_is_final(month)
+        })
+    print(f"{detector} time series: {len(stored)} stored months, {len(computed)} computed.", file=sys.stderr)
+    return {
+        "status": "success",
+        "mode": "time_series",
+        "months": [{"month": label, **(stored.get(label) or computed.get(label) or {})} for label in labels],
+        "stored_months": len(stored),
+        "computed_months": len(computed),
+    }
@@ -0,0 +1,67 @@
+import datetime
+import contextvars
+from contextlib import contextmanager
+
+# Analysis windows are computed here in plain Python so building, logging and
+# returning them costs no Earth Engine round trips. Detectors wrap the
+# datetimes in ee.Date() only when filtering collections. Windows end at the anchor: now,
+# or a past date bound with anchored_at() (worker jobs with "anchor", backfills).
+
+DATE_FORMAT = '%Y-%m-%d'
+ISO_FORMAT = '%Y-%m-%dT%H:%M:%S'
+SENTINEL2_START = datetime.datetime(2015, 6, 23, tzinfo=datetime.timezone.utc)
+
+_bound_anchor = contextvars.ContextVar('analysis_anchor', default=None)
+
+def resolve_anchor(anchor=None):
+    """
+    Returns the window anchor as an aware UTC datetime. Accepts a datetime, an ISO date string
+    or None: the anchor bound with anchored_at(), otherwise now.
+    """
+    if anchor is None:
+        anchor = _bound_anchor.get()
+    if anchor is None:
+        return datetime.datetime.now(datetime.timezone.utc)
+    if isinstance(anchor, str):
+        anchor = datetime.datetime.fromisoformat(anchor.replace('Z', '+00:00'))
+    if anchor.tzinfo is None:
+        return anchor.replace(tzinfo=datetime.timezone.utc)
+    return anchor.astimezone(datetime.timezone.utc)
+
+@contextmanager
+def anchored_at(anchor):
+    """Windows built inside the block (including on request pool threads) end at anchor; None keeps now."""
+    token = _bound_anchor.set(None if anchor is None else resolve_anchor(anchor))
+    try:
+        yield
+    finally:
+        _bound_anchor.reset(token)
+
+def bound_anchor():
+    """The anchor set by an enclosing anchored_at(), or None when windows end now."""
+    return _bound_anchor.get()
+
+def shift_days(moment, days):
+    return moment + datetime.timedelta(days=days)
+
+def shift_years(moment, years):
+    # Same calendar day N years away; Feb 29 falls back to Feb 28 in non-leap years.
+    try:
+        return moment.replace(year=moment.year + years)
+    except ValueError:
+        return moment.replace(year=moment.year + years, day=28)
+
+def window_ending_at(end, duration_days):
+    """Returns (start, end) for a window of duration_days that ends at end."""
+    return shift_days(end, -duration_days), end
+
+def clamp_start(start, earliest):
+    """Moves start forward to earliest if it falls before it (e.g. before a collection begins)."""
+    return earliest if start < earliest else start
+
+def period_fields(prefix, start, end, date_format=DATE_FORMAT):
+    """Response fields like recent_period_start / recent_period_end for a window."""
+    return {
+        f"{prefix}_period_start": start.strftime(date_format),
+        f"{prefix}_period_end": end.strftime(date_format),
+    }
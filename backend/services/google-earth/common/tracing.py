@@ -0,0 +1,101 @@
+import os
+import sys
+import json
+import time
+import uuid
+import threading
+import contextvars
+from contextlib import contextmanager
+from pathlib import Path
+
+# Structured spans for Earth Engine work. call_ee() records one span per round trip (getInfo,
+# getThumbURL, computePixels), gee_init one for ee.Initialize, and the worker one per job. Each
+# span carries the operation, detector, region_id, job_id, duration, request/response bytes,
+# retry count and error, written as one JSON line, so per-job time can be aggregated across
+# thousands of jobs (e.g. with jq or pandas.read_json(lines=True)).
+#   GEE_TRACE=off|stderr|file        where spans go (default: off)
+#   GEE_TRACE_PATH                   JSON lines file for GEE_TRACE=file (default: services/google-earth/.cache/traces.jsonl)
+
+DEFAULT_TRACE_PATH = Path(__file__).resolve().parent.parent / '.cache' / 'traces.jsonl'
+TRACE_MODE = os.environ.get('GEE_TRACE', 'off').lower()
+TRACE_PATH = Path(os.environ.get('GEE_TRACE_PATH', DEFAULT_TRACE_PATH))
+TRACE_ENABLED = TRACE_MODE in ('stderr', 'file')
+
+_context = contextvars.ContextVar('gee_trace_context', default={})
+_write_lock = threading.Lock()
+
+def bind_trace_context(**fields):
+    """Adds fields (detector, region_id, ...) to every later span of this context; for one-shot scripts."""
+    _context.set({**_context.get(), **fields})
+
+@contextmanager
+def trace_context(**fields):
+    """Adds fields to the spans recorded inside the block, including those on request pool threads."""
+    token = _context.set({**_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+def payload_size(value):
+    """Approximate size in bytes of a request (serialized ee object) or a response; None if unknown."""
+    if value is None:
+        return None
+    try:
+        if hasattr(value, 'serialize'):
+            return len(value.serialize())
+        if hasattr(value, 'nbytes'):
+            return int(value.nbytes)
+        if isinstance(value, (str, bytes)):
+            return len(value)
+        return len(json.dumps(value, default=str, separators=(',', ':')))
+    except Exception:
+        return None
+
+def _emit(record):
+    line = json.dumps(record, default=str, separators=(',', ':'))
+    with _write_lock:
+        if TRACE_MODE == 'stderr':
+            print(f"TRACE {line}", file=sys.stderr)
+            return
+        try:
+            TRACE_PATH.parent.mkdir(parents=True, exist_ok=True)
+            with open(TRACE_PATH, 'a') as f:
+                f.write(line + "\n")
+        except OSError as e:
+            print(f"WARNING: Could not write trace span: {e}", file=sys.stderr)
+
+@contextmanager
+def trace_span(operation, request=None):
+    """
+    Records one span around the block. Yields a dict the block can fill: 'response' (sized on
+    exit, not stored), 'retries', 'status'. Errors are recorded and re-raised. A no-op unless
+    GEE_TRACE is on.
+    """
+    span = {}
+    if not TRACE_ENABLED:
+        yield span
+        return
+    started_at = time.time()
+    started = time.perf_counter()
+    error = None
+    try:
+        yield span
+    except BaseException as e:
+        error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        record = {
+            'span_id': uuid.uuid4().hex[:16],
+            'operation': operation,
+            **_context.get(),
+            'start': round(started_at, 6),
+            'duration_ms': round((time.perf_counter() - started) * 1000, 3),
+            'request_bytes': payload_size(request),
+            'response_bytes': payload_size(span.pop('response', None)),
+            'thread': threading.current_thread().name,
+            **span,
+        }
+        if error:
+            record['error'] = error
+        _emit(record)
@@ -0,0 +1,53 @@
+import os
+import sys
+import json
+import time
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+
+# Per-region state for incremental detectors: the newest record already seen (the watermark)
+# plus whatever running totals the detector keeps, stored as JSON next to the result cache.
+# Keys are chosen by the detector (typically a geometry hash).
+#   GEE_WATERMARKS=off               disables incremental state (every run is a full scan)
+#   GEE_WATERMARKS_PATH              SQLite file (default: services/google-earth/.cache/watermarks.sqlite3)
+
+DEFAULT_WATERMARKS_PATH = Path(__file__).resolve().parent.parent / '.cache' / 'watermarks.sqlite3'
+WATERMARKS_ENABLED = os.environ.get('GEE_WATERMARKS', 'on').lower() not in ('off', '0', 'false')
+WATERMARKS_PATH = Path(os.environ.get('GEE_WATERMARKS_PATH', DEFAULT_WATERMARKS_PATH))
+
+def _connect():
+    WATERMARKS_PATH.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(WATERMARKS_PATH), timeout=10)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS watermarks ("
+        " key TEXT PRIMARY KEY,"
+        " detector TEXT NOT NULL,"
+        " state TEXT NOT NULL,"
+        " updated_at REAL NOT NULL)"
+    )
+    return conn
+
+def get_watermark(key):
+    """Returns the stored state dict for key, or None if there is none (or watermarks are off)."""
+    if not WATERMARKS_ENABLED or key is None:
+        return None
+    try:
+        with closing(_connect()) as conn:
+            row = conn.execute("SELECT state FROM watermarks WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+    except (sqlite3.Error, OSError, ValueError) as e:
+        print(f"WARNING: Watermark read failed: {e}", file=sys.stderr)
+        return None
+
+def store_watermark(key, detector, state):
+    if not WATERMARKS_ENABLED or key is None:
+        return
+    try:
+        with closing(_connect()) as conn, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO watermarks (key, detector, state, updated_at) VALUES (?, ?, ?, ?)",
+                (key, detector, json.dumps(state), time.time())
+            )
+    except (sqlite3.Error, OSError, TypeError, ValueError) as e:
+        print(f"WARNING: Watermark write failed: {e}", file=sys.stderr)
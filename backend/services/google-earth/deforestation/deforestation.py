@@ -1,12 +1,25 @@
 import sys
 import json
-import os
 import ee
-import datetime
 import time
 import traceback
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common.gee_init import initialize_gee
+from common.tracing import bind_trace_context
+from common.progress import bind_progress, emit_stats
+from common.scale import adaptive_scale, SCALE_PROPERTY
+from common.geometry import geojson_to_ee_geometry
+from common.result_cache import cache_key, analysis_window, cached_run
+from common.thumbnails import thumbnail_fields, submit_thumbnail_fields
+from common.ee_requests import run_concurrently, call_ee, evaluate
+from common.batch import build_region_collection, with_band_placeholder, reduce_regions_table, finish_region_results
+from common.time_windows import resolve_anchor, window_ending_at, period_fields, ISO_FORMAT
+from common.preflight import window_availability, preflight_failure
+from common.sentinel2 import CLOUD_MASK_BAND, SCL_MASK_VALUES, mask_s2_clouds
+from common.raster import raster_grid, download_window, masked_index, median_composite, region_mean, raster_period_fields
+
 DEFAULT_NDVI_DROP_THRESHOLD = -0.1
 RECENT_PERIOD_DAYS = 6
 PREVIOUS_PERIOD_DAYS = 6
@@ -14,40 +27,9 @@ PREVIOUS_PERIOD_DAYS = 6
 SATELLITE_COLLECTION = 'COPERNICUS/S2_SR_HARMONIZED'
 NIR_BAND = 'B8'
 RED_BAND = 'B4'
-CLOUD_MASK_BAND = 'SCL'
-SCL_MASK_VALUES = [3, 8, 9, 10, 11]
+RASTER_WINDOWS = ['previous', 'recent']
 REDUCTION_SCALE = 30
 DEFAULT_POINT_BUFFER = 1000
-gcp_project_id = 'project-ultron-457221'
-
-def initialize_gee(credentials_path_arg):
-    global gcp_project_id
-    try:
-        credentials_path = credentials_path_arg
-        print(f"DEBUG: Received credentials path via argument: {credentials_path}", file=sys.stderr)
-        if not credentials_path:
-            return False
-        if not os.path.exists(credentials_path):
-            print(f"ERROR: Credentials file not found: {credentials_path}", file=sys.stderr)
-            return False
-        print(f"Attempting GEE init with key: {credentials_path}", file=sys.stderr)
-        credentials = ee.ServiceAccountCredentials(None, key_file=credentials_path)
-        ee.Initialize(credentials=credentials, project=gcp_project_id, opt_url='https://earthengine-highvolume.googleapis.com')
-        print(f"GEE Initialized OK for project: {gcp_project_id}.", file=sys.stderr)
-        return True
-    except ee.EEException as e:
-        print(f"ERROR: Failed GEE init: {e}", file=sys.stderr)
-        return False
-    except Exception as e:
-        print(f"ERROR: Unexpected GEE init error: {e}", file=sys.stderr)
-        print(traceback.format_exc(), file=sys.stderr)
-        return False
-    
-
-def mask_s2_clouds(image):
-    scl = image.select(CLOUD_MASK_BAND)
-    mask = scl.remap(SCL_MASK_VALUES, [0]*len(SCL_MASK_VALUES), defaultValue=1)
-    return image.updateMask(mask)
 
 def calculate_ndvi(image):
     ndvi = image.normalizedDifference([NIR_BAND, RED_BAND]).rename('NDVI')
@@ -56,39 +38,80 @@ def calculate_ndvi(image):
 def get_image_thumbnail_url(image, region_geometry, vis_params, filename_prefix):
     """Return a URL to a thumbnail PNG image for the given image and region."""
     try:
-        url = image.getThumbURL({
+        url = call_ee(lambda: image.getThumbURL({
             'min': vis_params.get('min', -1),
             'max': vis_params.get('max', 1),
             'dimensions': vis_params.get('dimensions', 512),
             'palette': vis_params.get('palette', ['#d7191c', '#ffffbf', '#1a9641']),
             'region': region_geometry
-        })
+        }), 'getThumbURL', image)
         return url
     except Exception as e:
         print(f"WARNING: Could not get thumbnail URL for {filename_prefix}: {e}", file=sys.stderr)
         return None
 
+def result_cache_key(geojson_geometry, buffer_radius, threshold):
+    return cache_key(
+        'DEFORESTATION', geojson_geometry, buffer_radius, {'threshold': threshold},
+        REDUCTION_SCALE, analysis_window(RECENT_PERIOD_DAYS, PREVIOUS_PERIOD_DAYS)
+    )
+
+def error_fields(threshold, buffer_radius_meters):
+    """The detector-specific fields of an error result (values unknown), e.g. for preflight_failure."""
+    return {
+        "mean_ndvi_change": None,
+        "threshold": threshold,
+        "buffer_radius_meters": buffer_radius_meters,
+    }
+
+def preflight_windows(region_geometry):
+    """Availability of both NDVI windows after cloud masking (see common.preflight)."""
+    start_recent, end_recent = window_ending_at(resolve_anchor(), RECENT_PERIOD_DAYS)
+    start_previous, end_previous = window_ending_at(start_recent, PREVIOUS_PERIOD_DAYS)
+    s2_collection = ee.ImageCollection(SATELLITE_COLLECTION).filterBounds(region_geometry)
+    return {
+        'previous': window_availability(s2_collection, start_previous, end_previous, region_geometry, mask_s2_clouds),
+        'recent': window_availability(s2_collection, start_recent, end_recent, region_geometry, mask_s2_clouds),
+    }
+
+def monthly_stats(region_geometry):
+    """Per-month scene count and mean NDVI, as a server-side function of the month's start (see common.time_series)."""
+    s2_collection = ee.ImageCollection(SATELLITE_COLLECTION).filterBounds(region_geometry)
+    scale = adaptive_scale(region_geometry, REDUCTION_SCALE)
+
+    def month_stats(start):
+        month_collection = s2_collection.filterDate(start, start.advance(1, 'month'))
+        ndvi_collection = month_collection.map(mask_s2_clouds).map(calculate_ndvi).select('NDVI')
+        ndvi_stats = with_band_placeholder(ndvi_collection, ['NDVI']).median().reduceRegion(
+            reducer=ee.Reducer.mean(),
+            geometry=region_geometry,
+            scale=scale,
+            maxPixels=1e9,
+            bestEffort=True
+        )
+        return ee.Dictionary({
+            'scene_count': month_collection.size(),
+            'mean_ndvi': ee.Dictionary(ndvi_stats).get('NDVI', None),
+            SCALE_PROPERTY: scale,
+        })
+    return month_stats
+
 def check_deforestation(region_geometry, threshold, buffer_radius_meters):
     """
     Performs GEE analysis to detect significant NDVI drop within a specified region.
     """
     try:
         # Define Time Periods
-        end_date_recent = ee.Date(datetime.datetime.utcnow())
-        start_date_recent = end_date_recent.advance(-RECENT_PERIOD_DAYS, 'day')
-        end_date_previous = start_date_recent
-        start_date_previous = end_date_previous.advance(-PREVIOUS_PERIOD_DAYS, 'day')
-        
-        # Logging
-        try:
-            start_date_previous_str = start_date_previous.format().getInfo()
-            end_date_previous_str = end_date_previous.format().getInfo()
-            start_date_recent_str = start_date_recent.format().getInfo()
-            end_date_recent_str = end_date_recent.format().getInfo()
-            print(f"Analysis Periods: {start_date_previous_str}->{end_date_previous_str} vs {start_date_recent_str}->{end_date_recent_str}", file=sys.stderr)
-        except Exception as date_error:
-            print(f"WARNING: Unable to format date strings for logging: {date_error}", file=sys.stderr)
-        
+        start_recent, end_recent = window_ending_at(resolve_anchor(), RECENT_PERIOD_DAYS)
+        start_previous, end_previous = window_ending_at(start_recent, PREVIOUS_PERIOD_DAYS)
+        response_dates = {
+            **period_fields('recent', start_recent, end_recent, ISO_FORMAT),
+            **period_fields('previous', start_previous, end_previous, ISO_FORMAT),
+        }
+        print(f"Analysis Periods: {response_dates['previous_period_start']}->{response_dates['previous_period_end']} vs {response_dates['recent_period_start']}->{response_dates['recent_period_end']}", file=sys.stderr)
+        start_date_recent, end_date_recent = ee.Date(start_recent), ee.Date(end_recent)
+        start_date_previous, end_date_previous = ee.Date(start_previous), ee.Date(end_previous)
+
         # Load/Filter Collection
         s2_collection = ee.ImageCollection(SATELLITE_COLLECTION).filterBounds(region_geometry)
 
@@ -98,23 +121,25 @@ def check_deforestation(region_geometry, threshold, buffer_radius_meters):
 
         # Calculate Difference & Reduce Region
         ndvi_difference = recent_ndvi_composite.subtract(previous_ndvi_composite)
+        scale = adaptive_scale(region_geometry, REDUCTION_SCALE)
         change_stats = ndvi_difference.reduceRegion(
             reducer=ee.Reducer.mean(),
             geometry=region_geometry,
-            scale=REDUCTION_SCALE,
+            scale=scale,
             maxPixels=1e9,
             bestEffort=True
         )
-        
-        # Safely get the mean change value with proper error handling
-        mean_ndvi_change = None
+
+        # Fetch the change value and the scale it was reduced at in a single request
+        analysis_summary = ee.Dictionary({
+            'mean_ndvi_change': ee.Dictionary(change_stats).get('NDVI', None),
+            SCALE_PROPERTY: scale,
+        })
         try:
-            ndvi_change_ee = change_stats.get('NDVI')
-            if ndvi_change_ee is None:
-                raise ValueError("NDVI value is None in the result dictionary")
-            mean_ndvi_change = ndvi_change_ee.getInfo()
+            summary = evaluate(analysis_summary)
+            mean_ndvi_change = summary.get('mean_ndvi_change')
             if mean_ndvi_change is None:
-                raise ValueError("getInfo() returned None for NDVI value")
+                raise ValueError("NDVI value is None in the result dictionary")
         except Exception as ndvi_error:
             print(f"WARNING: Failed to retrieve NDVI change value: {ndvi_error}", file=sys.stderr)
             return {
@@ -126,39 +151,20 @@ def check_deforestation(region_geometry, threshold, buffer_radius_meters):
                 "buffer_radius_meters": buffer_radius_meters
             }
 
-        print(f"Mean NDVI Change: {mean_ndvi_change}", file=sys.stderr)
-        alert_triggered = mean_ndvi_change < threshold
-
-        # Get visualization URLs
+        # Thumbnails are only rendered once there is an NDVI change to show
         ndvi_vis_params = {
             'min': -0.2,
             'max': 0.8,
             'palette': ['#d7191c', '#ffffbf', '#1a9641'],
             'dimensions': 512
         }
-        start_image_url = get_image_thumbnail_url(
-            previous_ndvi_composite, region_geometry, ndvi_vis_params, "before"
-        )
-        end_image_url = get_image_thumbnail_url(
-            recent_ndvi_composite, region_geometry, ndvi_vis_params, "after"
+        thumbnails = thumbnail_fields(
+            get_image_thumbnail_url, previous_ndvi_composite, recent_ndvi_composite, region_geometry, ndvi_vis_params
         )
 
-        # Safely get date strings for response
-        try:
-            response_dates = {
-                "recent_period_start": start_date_recent.format().getInfo(),
-                "recent_period_end": end_date_recent.format().getInfo(),
-                "previous_period_start": start_date_previous.format().getInfo(),
-                "previous_period_end": end_date_previous.format().getInfo(),
-            }
-        except Exception as date_format_error:
-            print(f"WARNING: Unable to format dates for response: {date_format_error}", file=sys.stderr)
-            response_dates = {
-                "recent_period_start": f"Today-{RECENT_PERIOD_DAYS}",
-                "recent_period_end": "Today",
-                "previous_period_start": f"Today-{RECENT_PERIOD_DAYS+PREVIOUS_PERIOD_DAYS}",
-                "previous_period_end": f"Today-{RECENT_PERIOD_DAYS}",
-            }
+        print(f"Mean NDVI Change: {mean_ndvi_change}", file=sys.stderr)
+        emit_stats(mean_ndvi_change=mean_ndvi_change)
+        alert_triggered = mean_ndvi_change < threshold
 
         # Return Success
         return {
@@ -166,10 +172,10 @@ def check_deforestation(region_geometry, threshold, buffer_radius_meters):
             "alert_triggered": alert_triggered,
             "mean_ndvi_change": mean_ndvi_change,
             "threshold": threshold,
-            "start_image_url": start_image_url,
-            "end_image_url": end_image_url,
+            **thumbnails,
             **response_dates,
-            "buffer_radius_meters": buffer_radius_meters
+            "buffer_radius_meters": buffer_radius_meters,
+            SCALE_PROPERTY: summary.get(SCALE_PROPERTY)
         }
 
     except ee.EEException as gee_error:
@@ -194,6 +200,145 @@ def check_deforestation(region_geometry, threshold, buffer_radius_meters):
             "buffer_radius_meters": buffer_radius_meters
         }
 
+def check_deforestation_batch(regions, threshold):
+    """
+    Batch variant of check_deforestation for many regions sharing one time window.
+    regions: [{'region_id', 'geometry' (ee.Geometry), optional 'threshold', optional 'buffer_radius_meters'}].
+    Composites are built once over the union footprint and reduced with a single reduceRegions call.
+    Thumbnails are only generated for regions that trigger an alert.
+    """
+    try:
+        start_recent, end_recent = window_ending_at(resolve_anchor(), RECENT_PERIOD_DAYS)
+        start_previous, end_previous = window_ending_at(start_recent, PREVIOUS_PERIOD_DAYS)
+        response_dates = {
+            **period_fields('recent', start_recent, end_recent, ISO_FORMAT),
+            **period_fields('previous', start_previous, end_previous, ISO_FORMAT),
+        }
+        print(f"Batch of {len(regions)} regions, Analysis Periods: {response_dates['previous_period_start']}->{response_dates['previous_period_end']} vs {response_dates['recent_period_start']}->{response_dates['recent_period_end']}", file=sys.stderr)
+
+        region_collection = build_region_collection(regions)
+        s2_collection = ee.ImageCollection(SATELLITE_COLLECTION).filterBounds(region_collection)
+        previous_ndvi_composite = with_band_placeholder(
+            s2_collection.filterDate(ee.Date(start_previous), ee.Date(end_previous)).map(mask_s2_clouds).map(calculate_ndvi).select('NDVI'), ['NDVI']
+        ).median()
+        recent_ndvi_composite = with_band_placeholder(
+            s2_collection.filterDate(ee.Date(start_recent), ee.Date(end_recent)).map(mask_s2_clouds).map(calculate_ndvi).select('NDVI'), ['NDVI']
+        ).median()
+        ndvi_difference = recent_ndvi_composite.subtract(previous_ndvi_composite).rename('NDVI')
+        change_table = reduce_regions_table(
+            ndvi_difference, region_collection, ee.Reducer.mean().setOutputs(['NDVI']),
+            REDUCTION_SCALE, ['NDVI']
+        )
+    except ee.EEException as gee_error:
+        print(f"ERROR: GEE batch computation failed: {gee_error}", file=sys.stderr)
+        return [{
+            "status": "error",
+            "message": f"GEE Computation Error: {str(gee_error)}",
+            "alert_triggered": False,
+            "mean_ndvi_change": None,
+            "threshold": region.get('threshold', threshold),
+            "buffer_radius_meters": region.get('buffer_radius_meters'),
+            "region_id": str(region['region_id'])
+        } for region in regions]
+
+    ndvi_vis_params = {
+        'min': -0.2,
+        'max': 0.8,
+        'palette': ['#d7191c', '#ffffbf', '#1a9641'],
+        'dimensions': 512
+    }
+    results = []
+    thumbnail_requests = {}
+    for region in regions:
+        region_id = str(region['region_id'])
+        region_threshold = region.get('threshold', threshold)
+        buffer_radius_meters = region.get('buffer_radius_meters')
+        region_stats = change_table.get(region_id, {})
+        mean_ndvi_change = region_stats.get('NDVI')
+        if mean_ndvi_change is None:
+            results.append({
+                "status": "error",
+                "message": f"Could not calculate mean NDVI change. No valid pixels found in the region for the specified time periods after cloud masking. Try adjusting dates, buffer size ({buffer_radius_meters}m), or check region coordinates.",
+                "mean_ndvi_change": None,
+                "alert_triggered": False,
+                "threshold": region_threshold,
+                "buffer_radius_meters": buffer_radius_meters,
+                "region_id": region_id
+            })
+            continue
+
+        alert_triggered = mean_ndvi_change < region_threshold
+        thumbnails = {"start_image_url": None, "end_image_url": None}
+        if alert_triggered:
+            region_geometry = region['geometry']
+            # Rendered concurrently across alerting regions and filled in below
+            thumbnail_requests[len(results)] = submit_thumbnail_fields(
+                get_image_thumbnail_url, previous_ndvi_composite.clip(region_geometry),
+                recent_ndvi_composite.clip(region_geometry), region_geometry, ndvi_vis_params
+            )
+        results.append({
+            "status": "success",
+            "alert_triggered": alert_triggered,
+            "mean_ndvi_change": mean_ndvi_change,
+            "threshold": region_threshold,
+            **thumbnails,
+            **response_dates,
+            "buffer_radius_meters": buffer_radius_meters,
+            SCALE_PROPERTY: region_stats.get(SCALE_PROPERTY),
+            "region_id": region_id
+        })
+    return finish_region_results(results, thumbnail_requests)
+
+def raster_cache_key(geojson_geometry, buffer_radius):
+    """Key for the downloaded windows; thresholds are left out so every threshold reuses them."""
+    return cache_key(
+        'DEFORESTATION', geojson_geometry, buffer_radius, {},
+        REDUCTION_SCALE, analysis_window(RECENT_PERIOD_DAYS, PREVIOUS_PERIOD_DAYS)
+    )
+
+def local_rasters(region_geometry):
+    """Raw NIR, red and SCL stacks of both windows on one grid, for check_deforestation_local."""
+    start_recent, end_recent = window_ending_at(resolve_anchor(), RECENT_PERIOD_DAYS)
+    start_previous, end_previous = window_ending_at(start_recent, PREVIOUS_PERIOD_DAYS)
+    s2_collection = ee.ImageCollection(SATELLITE_COLLECTION).filterBounds(region_geometry)
+    grid = raster_grid(region_geometry, REDUCTION_SCALE, s2_collection, [(start_previous, end_previous), (start_recent, end_recent)])
+    band_names = [NIR_BAND, RED_BAND, CLOUD_MASK_BAND]
+    return run_concurrently({
+        'previous': lambda: download_window(s2_collection, start_previous, end_previous, band_names, region_geometry, grid),
+        'recent': lambda: download_window(s2_collection, start_recent, end_recent, band_names, region_geometry, grid),
+    })
+
+def check_deforestation_local(rasters, threshold, buffer_radius_meters):
+    """
+    check_deforestation on local rasters ({'previous', 'recent'}, see common.raster) with NumPy.
+    Same result fields; there are no thumbnails.
+    """
+    previous_ndvi = median_composite(masked_index(rasters['previous'], NIR_BAND, RED_BAND, SCL_MASK_VALUES))
+    recent_ndvi = median_composite(masked_index(rasters['recent'], NIR_BAND, RED_BAND, SCL_MASK_VALUES))
+    mean_ndvi_change = region_mean(recent_ndvi - previous_ndvi, rasters['recent']['region'])
+    if mean_ndvi_change is None:
+        return {
+            "status": "error",
+            "message": f"Could not calculate mean NDVI change. No valid pixels found in the region for the specified time periods after cloud masking. Try adjusting dates, buffer size ({buffer_radius_meters}m), or check region coordinates.",
+            "mean_ndvi_change": None,
+            "alert_triggered": False,
+            "threshold": threshold,
+            "buffer_radius_meters": buffer_radius_meters
+        }
+    print(f"Mean NDVI Change (local): {mean_ndvi_change}", file=sys.stderr)
+    return {
+        "status": "success",
+        "alert_triggered": mean_ndvi_change < threshold,
+        "mean_ndvi_change": mean_ndvi_change,
+        "threshold": threshold,
+        "start_image_url": None,
+        "end_image_url": None,
+        **raster_period_fields('recent', rasters['recent'], ISO_FORMAT),
+        **raster_period_fields('previous', rasters['previous'], ISO_FORMAT),
+        "buffer_radius_meters": buffer_radius_meters,
+        "backend": "numpy"
+    }
+
 # --- Main Execution Block ---
 if __name__ == "__main__":
     if len(sys.argv) < 2:
@@ -216,34 +361,31 @@ if __name__ == "__main__":
         print(json.dumps({"status": "error", "message": f"Invalid Stdin Param: {e}", "region_id": region_id}))
         sys.exit(1)
         
-    if not initialize_gee(credentials_path_from_arg):
-        print(json.dumps({"status": "error", "message": "GEE initialization failed.", "region_id": region_id}))
-        sys.exit(1)
+    result_key = result_cache_key(geojson_geometry, buffer_radius, threshold)
+    bind_trace_context(detector='DEFORESTATION', region_id=region_id)
+    if input_params.get('stream'):
+        bind_progress(sys.stdout, region_id=region_id)
+
+    def run_analysis():
+        if not initialize_gee(credentials_path_from_arg):
+            return {"status": "error", "message": "GEE initialization failed."}
         
-    ee_geometry = None
-    effective_buffer = None
-    try:
-        geom_type = geojson_geometry.get('type')
-        coords = geojson_geometry.get('coordinates')
-        if geom_type == 'Polygon':
-            ee_geometry = ee.Geometry.Polygon(coords)
-        elif geom_type == 'MultiPolygon':
-            ee_geometry = ee.Geometry.MultiPolygon(coords)
-        elif geom_type == 'Point':
-            ee_geometry = ee.Geometry.Point(coords).buffer(buffer_radius)
-            effective_buffer = buffer_radius
-        else:
-            raise ValueError(f"Unsupported type: {geom_type}")
-    except Exception as e:
-        print(f"ERROR: GeoJSON convert fail: {e}", file=sys.stderr)
-        print(json.dumps({"status": "error", "message": f"GeoJSON Error: {e}", "region_id": region_id}))
-        sys.exit(1)
+        try:
+            ee_geometry, effective_buffer = geojson_to_ee_geometry(geojson_geometry, buffer_radius, REDUCTION_SCALE)
+        except Exception as e:
+            print(f"ERROR: GeoJSON convert fail: {e}", file=sys.stderr)
+            return {"status": "error", "message": f"GeoJSON Error: {e}"}
         
-    print(f"Starting GEE analysis for region: {region_id}...", file=sys.stderr)
-    start_time = time.time()
-    analysis_result = check_deforestation(ee_geometry, threshold, effective_buffer)
-    end_time = time.time()
-    print(f"GEE analysis duration: {end_time - start_time:.2f} seconds.", file=sys.stderr)
+        print(f"Starting GEE analysis for region: {region_id}...", file=sys.stderr)
+        start_time = time.time()
+        analysis_result = preflight_failure('DEFORESTATION', preflight_windows(ee_geometry), error_fields(threshold, effective_buffer)) \
+            or check_deforestation(ee_geometry, threshold, effective_buffer)
+        end_time = time.time()
+        print(f"GEE analysis duration: {end_time - start_time:.2f} seconds.", file=sys.stderr)
+        return analysis_result
+
+    # Cache hits skip GEE initialization as well as the analysis
+    analysis_result = cached_run(result_key, 'DEFORESTATION', run_analysis)
     analysis_result['region_id'] = region_id
     print(json.dumps(analysis_result))
     if analysis_result.get("status") == "success":
@@ -0,0 +1,23 @@
+import ee
+
+# MODIS detections are ordered by acquisition time: acq_date ('YYYY-MM-DD') plus acq_time (HHMM
+# UTC). acq_time comes back as '0130' or as the number 130 depending on the source, so every
+# watermark, sort key and comparison goes through the canonical 'YYYY-MM-DDTHHMM' key below.
+
+ACQ_KEY_FORMAT = '%Y-%m-%dT%H%M'  # strftime() of a datetime in the acq_key() shape
+
+def canonical_acq_time(acq_time):
+    """acq_time as a zero-padded 'HHMM' string: '0130', '130', 130 and 130.0 all give '0130'."""
+    return f"{int(float(acq_time)):04d}"
+
+def acq_key(acq_date, acq_time):
+    """Canonical 'YYYY-MM-DDTHHMM' key of one detection; keys sort in acquisition order."""
+    return f"{acq_date}T{canonical_acq_time(acq_time)}"
+
+def with_acq_key(feature):
+    """Sets the feature's 'acq_key' property server-side, in the same form as acq_key()."""
+    acq_time = feature.get('acq_time')
+    minutes = ee.Number(ee.Algorithms.If(
+        ee.Algorithms.ObjectType(acq_time).equals('String'), ee.Number.parse(acq_time), acq_time
+    ))
+    return feature.set('acq_key', ee.String(feature.get('acq_date')).cat('T').cat(minutes.toInt().format('%04d')))
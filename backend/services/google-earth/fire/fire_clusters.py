@@ -0,0 +1,178 @@
+import numpy as np
+
+from common.geometry import METERS_PER_DEGREE
+from fire_acquisition import acq_key
+
+# Groups fire detections into events by grid hashing: every detection is binned into a cell of
+# roughly CLUSTER_CELL_METERS on a fixed global grid, and occupied cells touching each other
+# (8-neighbourhood) form one event. Because connectivity only depends on cells, an event stored
+# with its cell set can be extended by later detections without re-clustering its old points.
+
+CLUSTER_CELL_METERS = 1500  # a bit over one MODIS pixel, so adjacent fire pixels always connect
+EVENT_EXPIRY_DAYS = 3  # events without new detections for this long are closed and not extended
+NEIGHBOUR_OFFSETS = ((0, 1), (1, -1), (1, 0), (1, 1))  # half of the 8-neighbourhood; links are symmetric
+
+def grid_cells(latitudes, longitudes):
+    """(row, col) arrays on the global grid. Column width follows each row's latitude."""
+    cell_degrees = CLUSTER_CELL_METERS / METERS_PER_DEGREE
+    rows = np.floor(latitudes / cell_degrees).astype(np.int64)
+    row_latitudes = (rows + 0.5) * cell_degrees
+    column_degrees = cell_degrees / np.maximum(np.cos(np.radians(row_latitudes)), 1e-6)
+    cols = np.floor(longitudes / column_degrees).astype(np.int64)
+    return rows, cols
+
+def _connected_cells(cells):
+    """Component label per cell (array of unique (row, col) rows), via union-find over neighbouring cells."""
+    index = {(int(r), int(c)): i for i, (r, c) in enumerate(cells)}
+    parent = np.arange(len(cells))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for (r, c), i in index.items():
+        for dr, dc in NEIGHBOUR_OFFSETS:
+            j = index.get((r + dr, c + dc))
+            if j is not None:
+                root_i, root_j = find(i), find(j)
+                if root_i != root_j:
+                    parent[max(root_i, root_j)] = min(root_i, root_j)
+    return np.array([find(i) for i in range(len(cells))], dtype=np.int64)
+
+def _acq_keys(fire_points):
+    return np.array([acq_key(date, time) for date, time in zip(fire_points['acq_date'], fire_points['acq_time'])])
+
+def _new_event(event_id):
+    return {
+        'event_id': event_id,
+        'pixel_count': 0,
+        'latitude_sum': 0.0,
+        'longitude_sum': 0.0,
+        'bbox': None,
+        'first_acq': None,
+        'last_acq': None,
+        'max_brightness': None,
+        'cells': [],
+    }
+
+def _merge_events(events):
+    """Folds events bridged by new detections into the oldest of them."""
+    events = sorted(events, key=lambda event: event['first_acq'])
+    merged = dict(events[0])
+    for event in events[1:]:
+        merged['pixel_count'] += event['pixel_count']
+        merged['latitude_sum'] += event['latitude_sum']
+        merged['longitude_sum'] += event['longitude_sum']
+        merged['bbox'] = [
+            min(merged['bbox'][0], event['bbox'][0]), min(merged['bbox'][1], event['bbox'][1]),
+            max(merged['bbox'][2], event['bbox'][2]), max(merged['bbox'][3], event['bbox'][3]),
+        ]
+        merged['last_acq'] = max(merged['last_acq'], event['last_acq'])
+        if event['max_brightness'] is not None:
+            merged['max_brightness'] = max(merged['max_brightness'] or event['max_brightness'], event['max_brightness'])
+    return merged
+
+def cluster_fire_events(fire_points, previous_events=None, expire_before=None):
+    """
+    Clusters columnar fire points (latitude, longitude, brightness, acq_date, acq_time lists)
+    into events, extending previous_events (as returned by an earlier call) where new points
+    touch them. Events whose last acquisition is before expire_before ("YYYY-MM-DD") are dropped.
+    Returns the list of open events, each with its cells, so it can be stored and passed back.
+    """
+    previous_events = [
+        event for event in (previous_events or [])
+        if expire_before is None or event['last_acq'] >= expire_before
+    ]
+    latitudes = np.asarray(fire_points['latitude'], dtype=np.float64)
+    longitudes = np.asarray(fire_points['longitude'], dtype=np.float64)
+    if len(latitudes) == 0:
+        return previous_events
+    brightness = np.asarray([np.nan if b is None else b for b in fire_points['brightness']], dtype=np.float64)
+    acq_keys = _acq_keys(fire_points)
+    rows, cols = grid_cells(latitudes, longitudes)
+
+    # Cells of old events take part in the labelling so new points can attach to them.
+    old_cells = np.array([cell for event in previous_events for cell in event['cells']], dtype=np.int64).reshape(-1, 2)
+    old_owner = np.array([i for i, event in enumerate(previous_events) for _ in event['cells']], dtype=np.int64)
+    all_cells = np.concatenate([np.stack([rows, cols], axis=1), old_cells])
+    cells, cell_of = np.unique(all_cells, axis=0, return_inverse=True)
+    cell_of = cell_of.reshape(-1)
+    component_of_cell = _connected_cells(cells)
+    point_component = component_of_cell[cell_of[:len(latitudes)]]
+    old_component = component_of_cell[cell_of[len(latitudes):]]
+
+    owners_of = {}
+    for component, owner in zip(old_component.tolist(), old_owner.tolist()):
+        owners_of.setdefault(component, set()).add(owner)
+
+    # Per-component stats in one pass: sort points by (component, acquisition) and reduce each run.
+    order = np.lexsort((acq_keys, point_component))
+    components, starts = np.unique(point_component[order], return_index=True)
+    ends = np.append(starts[1:], len(order)) - 1
+    counts = ends - starts + 1
+    sorted_lat, sorted_lon = latitudes[order], longitudes[order]
+    sorted_brightness = brightness[order]
+    stats = {
+        'latitude_sum': np.add.reduceat(sorted_lat, starts),
+        'longitude_sum': np.add.reduceat(sorted_lon, starts),
+        'min_lat': np.minimum.reduceat(sorted_lat, starts),
+        'max_lat': np.maximum.reduceat(sorted_lat, starts),
+        'min_lon': np.minimum.reduceat(sorted_lon, starts),
+        'max_lon': np.maximum.reduceat(sorted_lon, starts),
+        'max_brightness': np.fmax.reduceat(sorted_brightness, starts),
+    }
+    first_keys, last_keys = acq_keys[order][starts], acq_keys[order][ends]
+
+    # A component's cells are the event's cells, including those of any old events it absorbs.
+    cell_order = np.argsort(component_of_cell, kind='stable')
+    cell_components, cell_starts = np.unique(component_of_cell[cell_order], return_index=True)
+    cells_of = dict(zip(cell_components.tolist(), np.split(cells[cell_order], cell_starts[1:])))
+
+    events = []
+    touched = set()
+    for k, component in enumerate(components.tolist()):
+        owners = sorted(owners_of.get(component, ()))
+        touched.update(owners)
+        component_cells = cells_of[component]
+        max_brightness = stats['max_brightness'][k]
+        new_part = _new_event(f"{first_keys[k]}:{component_cells[0][0]}:{component_cells[0][1]}")
+        new_part.update({
+            'pixel_count': int(counts[k]),
+            'latitude_sum': float(stats['latitude_sum'][k]),
+            'longitude_sum': float(stats['longitude_sum'][k]),
+            'bbox': [
+                float(stats['min_lon'][k]), float(stats['min_lat'][k]),
+                float(stats['max_lon'][k]), float(stats['max_lat'][k]),
+            ],
+            'first_acq': str(first_keys[k]),
+            'last_acq': str(last_keys[k]),
+            'max_brightness': None if np.isnan(max_brightness) else float(max_brightness),
+        })
+        event = _merge_events([previous_events[i] for i in owners] + [new_part])
+        event['cells'] = component_cells.tolist()
+        event['new_pixel_count'] = int(counts[k])
+        events.append(event)
+
+    for i, event in enumerate(previous_events):
+        if i not in touched:
+            events.append(dict(event, new_pixel_count=0))
+    return events
+
+def event_summary(event):
+    """
+    Public view of an event: centroid, extent, pixel count and time span (no cells/sums).
+    centroid ([lon, lat]) and bbox ([min_lon, min_lat, max_lon, max_lat]) are in GeoJSON order.
+    """
+    count = event['pixel_count']
+    return {
+        'event_id': event['event_id'],
+        'centroid': [event['longitude_sum'] / count, event['latitude_sum'] / count],
+        'bbox': event['bbox'],
+        'pixel_count': count,
+        'new_pixel_count': event.get('new_pixel_count', 0),
+        'first_acq': event['first_acq'],
+        'last_acq': event['last_acq'],
+        'max_brightness': event['max_brightness'],
+    }
@@ -13,13 +13,19 @@ const __dirname = path.dirname(__filename);
  * @param {string} regionId - Identifier for the region
  * @param {string} credentialsPath - Path to GCP credentials file
  * @param {number} [daysBack] - Optional: how many days back should the fire detection look
+ * @param {boolean} [incremental] - Optional: only fetch detections newer than the region's stored watermark
+ * @param {boolean} [columnar] - Optional: return aggregates and every detection as column arrays (fire_points)
+ * @param {boolean} [cluster] - Optional: group detections into fire events (fire_events); implies columnar
  * @returns {Promise<Object>} - Analysis results
  */
 function runFireProtectionCheck(
   regionGeoJson,
   regionId,
   credentialsPath,
-  daysBack
+  daysBack,
+  incremental,
+  columnar,
+  cluster
 ) {
   return new Promise((resolve, reject) => {
     const pythonExecutable = "python";
@@ -49,6 +55,15 @@ function runFireProtectionCheck(
     if (daysBack !== undefined && daysBack !== null) {
       inputData.days_back = daysBack;
     }
+    if (incremental) {
+      inputData.incremental = true;
+    }
+    if (columnar) {
+      inputData.columnar = true;
+    }
+    if (cluster) {
+      inputData.cluster = true;
+    }
 
     const inputJsonString = JSON.stringify(inputData);
 
@@ -1,61 +1,222 @@
 import sys
 import json
-import os
 import ee
-import datetime
 import time
 import traceback
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common.gee_init import initialize_gee
+from common.tracing import bind_trace_context
+from common.progress import bind_progress, emit_stats
+from common.geometry import geojson_to_ee_geometry, geometry_hash
+from common.thumbnails import thumbnail_fields
+from common.ee_requests import submit_requests, call_ee, evaluate
+from common.time_windows import resolve_anchor, shift_days, DATE_FORMAT
+from common.watermarks import get_watermark, store_watermark
+from fire_clusters import cluster_fire_events, event_summary, EVENT_EXPIRY_DAYS
+from fire_acquisition import acq_key, canonical_acq_time, with_acq_key
 
 DEFAULT_DAYS_BACK = 5  # How many days back to check for fires
+DEFAULT_POINT_BUFFER = 10000  # 10km buffer for points
+GEOMETRY_SCALE = 1000  # MODIS fire pixels are ~1km; region outlines are simplified to this
 MODIS_FIRE_COLLECTION = 'MODIS/006/MCD14DL'
-gcp_project_id = 'project-ultron-457221'
+FIRE_SAMPLE_SIZE = 20
+# Columnar mode returns every detection (up to FIRE_MAX_POINTS) as parallel arrays of these properties.
+FIRE_POINT_COLUMNS = ['latitude', 'longitude', 'brightness', 'confidence', 'acq_date', 'acq_time']
+FIRE_MAX_POINTS = 50000
+CONFIDENCE_BUCKET_WIDTH = 10
 
-def initialize_gee(credentials_path_arg):
-    global gcp_project_id
+def fire_watermark_key(geojson_geometry, region_id):
+    """Incremental state is per region and per subscription, so two subscriptions on one area each get alerted."""
     try:
-        credentials_path = credentials_path_arg
-        print(f"DEBUG: Received credentials path via argument: {credentials_path}", file=sys.stderr)
-        if not credentials_path or not os.path.exists(credentials_path):
-            print(f"ERROR: Credentials file not found or path empty: {credentials_path}", file=sys.stderr)
-            return False
-        credentials = ee.ServiceAccountCredentials(None, key_file=credentials_path)
-        ee.Initialize(credentials=credentials, project=gcp_project_id, opt_url='https://earthengine-highvolume.googleapis.com')
-        print(f"GEE Initialized OK for project: {gcp_project_id}.", file=sys.stderr)
-        return True
-    except ee.EEException as e:
-        print(f"ERROR: Failed GEE init: {e}", file=sys.stderr)
-        return False
-    except Exception as e:
-        print(f"ERROR: Unexpected GEE init error: {e}", file=sys.stderr)
-        print(traceback.format_exc(), file=sys.stderr)
-        return False
+        return f"FIRE_PROTECTION:{region_id}:{geometry_hash(geojson_geometry, DEFAULT_POINT_BUFFER)}"
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+def newer_than(keyed_fires, watermark):
+    """Detections (tagged by with_acq_key) acquired after the watermark's acq_date/acq_time."""
+    return keyed_fires.filter(ee.Filter.gt('acq_key', acq_key(watermark['acq_date'], watermark['acq_time'])))
+
+def fire_aggregates(fire_collection):
+    """Server-side brightness stats and confidence histogram (buckets of CONFIDENCE_BUCKET_WIDTH, 0-100)."""
+    bucket_count = 100 // CONFIDENCE_BUCKET_WIDTH + 1
+    return {
+        'brightness_max': fire_collection.aggregate_max('brightness'),
+        'brightness_mean': fire_collection.aggregate_mean('brightness'),
+        'confidence_histogram': fire_collection.reduceColumns(
+            ee.Reducer.fixedHistogram(0, bucket_count * CONFIDENCE_BUCKET_WIDTH, bucket_count), ['confidence']
+        ).get('histogram'),
+    }
+
+def fire_point_columns(fire_collection, max_points=FIRE_MAX_POINTS):
+    """One list per FIRE_POINT_COLUMNS entry, rows in collection order; only those properties leave the server."""
+    def to_row(feature):
+        coordinates = feature.geometry().coordinates()
+        return ee.Feature(None, {
+            'latitude': coordinates.get(1),
+            'longitude': coordinates.get(0),
+            'brightness': feature.get('brightness'),
+            'confidence': feature.get('confidence'),
+            'acq_date': feature.get('acq_date'),
+            'acq_time': feature.get('acq_time'),
+        })
+    rows = fire_collection.limit(max_points).map(to_row)
+    return rows.reduceColumns(ee.Reducer.toList().repeat(len(FIRE_POINT_COLUMNS)), FIRE_POINT_COLUMNS).get('list')
+
+def columns_to_fires(columns, limit):
+    count = len(columns['latitude'])
+    return [{name: columns[name][i] for name in FIRE_POINT_COLUMNS} for i in range(min(count, limit))]
 
 def get_fire_image_url(image, region_geometry, vis_params, label):
     try:
-        url = image.getThumbURL({
+        url = call_ee(lambda: image.getThumbURL({
             'min': vis_params.get('min', 0),
             'max': vis_params.get('max', 1),
             'dimensions': vis_params.get('dimensions', 512),
             'palette': vis_params.get('palette', ['black', 'red', 'yellow']),
             'region': region_geometry
-        })
+        }), 'getThumbURL', image)
         return url
     except Exception as e:
         print(f"WARNING: Could not get {label} fire image URL: {e}", file=sys.stderr)
         return None
 
-def detect_active_fires(region_geometry, days_back):
+def load_fire_state(watermark_key, days_back):
+    """Incremental state for watermark_key, or None when there is none or it was built for another window."""
+    state = get_watermark(watermark_key) if watermark_key else None
+    if state and state.get('days_back') != days_back:
+        return None  # running counts only cover the window they were built for
+    return state
+
+def fire_result(fire_summary, state, watermark_key, days_back, now, columnar, cluster):
+    """
+    Result fields (without thumbnails) from an evaluated fire summary ({count, days, sample} or,
+    when columnar, {count, days, points, brightness/confidence aggregates}). Advances the
+    watermark, running day counts and fire events in state and stores them under watermark_key.
+    """
+    window_start_day = shift_days(now, -days_back).strftime(DATE_FORMAT)
+    new_fire_count = fire_summary.get('count') or 0
+    fire_count = new_fire_count
+    watermark = state.get('watermark') if state else None
+
+    fires_list = []
+    columnar_fields = {}
+    if columnar:
+        point_lists = fire_summary.get('points') or [[] for _ in FIRE_POINT_COLUMNS]
+        fire_points = dict(zip(FIRE_POINT_COLUMNS, point_lists))
+        histogram = fire_summary.get('confidence_histogram') or []
+        columnar_fields = {
+            "fire_points": fire_points,
+            "fire_points_truncated": new_fire_count > FIRE_MAX_POINTS,
+            "brightness_max": fire_summary.get('brightness_max'),
+            "brightness_mean": fire_summary.get('brightness_mean'),
+            "confidence_histogram": {
+                "bucket_min": [bucket[0] for bucket in histogram],
+                "count": [bucket[1] for bucket in histogram],
+            },
+            "daily_counts": fire_summary.get('days') or {},
+        }
+        fires_list = columns_to_fires(fire_points, FIRE_SAMPLE_SIZE)
+    elif new_fire_count > 0:
+        sample = fire_summary.get('sample') or {}
+        for feat in sample.get('features', []):
+            fire_info = {
+                "acq_date": feat['properties'].get('acq_date'),
+                "acq_time": feat['properties'].get('acq_time'),
+                "brightness": feat['properties'].get('brightness'),
+                "confidence": feat['properties'].get('confidence'),
+                "latitude": feat['geometry']['coordinates'][1],
+                "longitude": feat['geometry']['coordinates'][0]
+            }
+            fires_list.append(fire_info)
+    if fires_list:
+        # reduceColumns doesn't promise to keep the sort order, so take the max of what came back
+        newest = max(
+            zip(columnar_fields["fire_points"]["acq_date"], columnar_fields["fire_points"]["acq_time"]) if columnar
+            else ((fire["acq_date"], fire["acq_time"]) for fire in fires_list),
+            key=lambda acquisition: acq_key(*acquisition)
+        )
+        watermark = {"acq_date": str(newest[0]), "acq_time": canonical_acq_time(newest[1])}
+
+    events = None
+    if cluster:
+        events = cluster_fire_events(
+            columnar_fields["fire_points"],
+            state.get('events') if state else None,
+            expire_before=shift_days(now, -EVENT_EXPIRY_DAYS).strftime(DATE_FORMAT)
+        )
+        columnar_fields["fire_events"] = [event_summary(event) for event in events]
+
+    if watermark_key:
+        day_counts = dict(state.get('day_counts', {})) if state else {}
+        for day, count in (fire_summary.get('days') or {}).items():
+            day_counts[day] = day_counts.get(day, 0) + int(count)
+        day_counts = {day: count for day, count in day_counts.items() if day >= window_start_day}
+        fire_count = sum(day_counts.values())
+        store_watermark(watermark_key, 'FIRE_PROTECTION', {
+            'days_back': days_back,
+            'watermark': watermark,
+            'day_counts': day_counts,
+            'events': events,
+        })
+    print(f"Detected {fire_count} active fire pixels in region (last {days_back} days), {new_fire_count} new", file=sys.stderr)
+
+    return {
+        "status": "success",
+        "active_fire_count": fire_count,
+        "new_fire_count": new_fire_count,
+        "fires": fires_list,
+        "days_back": days_back,
+        "incremental": bool(state),
+        "watermark": watermark,
+        **columnar_fields,
+    }
+
+def detect_active_fires(region_geometry, days_back, watermark_key=None, columnar=False, cluster=False):
+    """
+    Counts MODIS fire detections in the last days_back days. With a watermark_key the run is
+    incremental: only detections newer than the stored acq_date/acq_time watermark are queried,
+    per-day counts are kept locally to report the window total, and "fires" lists only new ones.
+    With columnar=True the same single request also returns brightness/confidence aggregates
+    and every detection as "fire_points" arrays instead of a GeoJSON sample.
+    cluster=True (implies columnar) groups the detections into "fire_events"; incremental runs
+    extend the events stored with the watermark instead of re-clustering the whole window.
+    """
+    columnar = columnar or cluster
     try:
-        now = datetime.datetime.now(datetime.timezone.utc)
+        now = resolve_anchor()
         end_date = ee.Date(now)
-        start_date = end_date.advance(-days_back, 'day')
+        start_date = ee.Date(shift_days(now, -days_back))
+
+        pre_start_date = ee.Date(shift_days(now, -days_back*2))
 
-        fire_collection = ee.FeatureCollection(MODIS_FIRE_COLLECTION) \
-            .filterDate(start_date, end_date) \
+        # One query covers the previous period (days_back*2 to days_back ago) and the current one
+        both_periods = ee.FeatureCollection(MODIS_FIRE_COLLECTION) \
+            .filterDate(pre_start_date, end_date) \
             .filterBounds(region_geometry)
+        fire_collection = both_periods.filterDate(start_date, end_date)
 
-        fire_count = fire_collection.size().getInfo()
-        print(f"Detected {fire_count} active fire pixels in region (last {days_back} days)", file=sys.stderr)
+        state = load_fire_state(watermark_key, days_back)
+        new_fires = fire_collection.map(with_acq_key)
+        if state and state.get('watermark'):
+            new_fires = newer_than(new_fires, state['watermark'])
+
+        # Newest first, so the first detection returned is the next watermark
+        newest_first = new_fires.sort('acq_key', False)
+        # Count, per-day counts and the newest fire points in a single request, fetched while the thumbnails render
+        summary = {
+            'count': new_fires.size(),
+            'days': new_fires.aggregate_histogram('acq_date'),
+            'previous_count': both_periods.filterDate(pre_start_date, start_date).size(),
+        }
+        if columnar:
+            summary.update(fire_aggregates(new_fires))
+            summary['points'] = fire_point_columns(newest_first)
+        else:
+            summary['sample'] = newest_first.limit(FIRE_SAMPLE_SIZE)
+        fire_summary = ee.Dictionary(summary)
+        summary_request = submit_requests({'summary': lambda: evaluate(fire_summary)})['summary']
 
         # --- Add fire mask images for before & after comparison ---
         vis_params = {
@@ -65,39 +226,23 @@ def detect_active_fires(region_geometry, days_back):
             "dimensions": 512
         }
 
-        # Before: fires from previous period (days_back*2 to days_back ago)
-        pre_start_date = end_date.advance(-days_back*2, 'day')
-        pre_end_date = end_date.advance(-days_back, 'day')
-        fire_img_before = ee.Image(fire_collection.filterDate(pre_start_date, pre_end_date)
-                                   .reduceToImage(['confidence'], ee.Reducer.first()).gt(0)).clip(region_geometry)
-        fire_img_after = ee.Image(fire_collection.reduceToImage(['confidence'], ee.Reducer.first()).gt(0)).clip(region_geometry)
-
-        before_image_url = get_fire_image_url(fire_img_before, region_geometry, vis_params, "before")
-        after_image_url = get_fire_image_url(fire_img_after, region_geometry, vis_params, "after")
-
-        fires_list = []
-        if fire_count > 0:
-            # For illustration, get up to 20 fire points' info
-            sample = fire_collection.limit(20).getInfo()
-            for feat in sample['features']:
-                fire_info = {
-                    "acq_date": feat['properties'].get('acq_date'),
-                    "acq_time": feat['properties'].get('acq_time'),
-                    "brightness": feat['properties'].get('brightness'),
-                    "confidence": feat['properties'].get('confidence'),
-                    "latitude": feat['geometry']['coordinates'][1],
-                    "longitude": feat['geometry']['coordinates'][0]
-                }
-                fires_list.append(fire_info)
+        # One two-band mask (before, after) from the combined query; each detection is tagged with its period
+        start_millis = start_date.millis()
+        def tag_period(feature):
+            is_after = ee.Number(feature.get('system:time_start')).gte(start_millis)
+            return feature.set({'before': is_after.Not(), 'after': is_after})
+        fire_mask = ee.Image(both_periods.map(tag_period)
+                             .reduceToImage(['before', 'after'], ee.Reducer.max().forEach(['before', 'after']))
+                             .gt(0)).clip(region_geometry)
 
-        return {
-            "status": "success",
-            "active_fire_count": fire_count,
-            "fires": fires_list,
-            "days_back": days_back,
-            "start_image_url": before_image_url,
-            "end_image_url": after_image_url
-        }
+        thumbnails = thumbnail_fields(
+            get_fire_image_url, fire_mask.select('before'), fire_mask.select('after'), region_geometry, vis_params
+        )
+        evaluated_summary = summary_request.result()
+        emit_stats(new_fire_count=evaluated_summary.get('count') or 0, previous_period_fire_count=evaluated_summary.get('previous_count') or 0)
+        result = fire_result(evaluated_summary, state, watermark_key, days_back, now, columnar, cluster)
+        result["previous_period_fire_count"] = evaluated_summary.get('previous_count') or 0
+        return {**result, **thumbnails}
     except ee.EEException as gee_error:
         error_str = str(gee_error)
         print(f"ERROR: GEE computation failed: {error_str}", file=sys.stderr)
@@ -123,34 +268,34 @@ if __name__ == "__main__":
     input_data_str = sys.stdin.read()
     days_back = DEFAULT_DAYS_BACK
     region_id = "unknown_region"
+    incremental = False
+    columnar = False
+    cluster = False
 
     try:
         input_params = json.loads(input_data_str)
         geojson_geometry = input_params['geometry']
         days_back = int(input_params.get('days_back', DEFAULT_DAYS_BACK))
         region_id = str(input_params.get('region_id', region_id))
-        print(f"Received job: region='{region_id}', days_back={days_back}", file=sys.stderr)
+        incremental = bool(input_params.get('incremental', False))
+        columnar = bool(input_params.get('columnar', False))
+        cluster = bool(input_params.get('cluster', False))
+        print(f"Received job: region='{region_id}', days_back={days_back}, incremental={incremental}, columnar={columnar}, cluster={cluster}", file=sys.stderr)
     except Exception as e:
         print(f"ERROR: Invalid stdin params: {e}", file=sys.stderr)
         print(json.dumps({"status": "error", "message": f"Invalid Stdin Param: {e}", "region_id": region_id}))
         sys.exit(1)
 
+    bind_trace_context(detector='FIRE_PROTECTION', region_id=region_id)
+    if input_params.get('stream'):
+        bind_progress(sys.stdout, region_id=region_id)
     if not initialize_gee(credentials_path_from_arg):
         print(json.dumps({"status": "error", "message": "GEE initialization failed.", "region_id": region_id}))
         sys.exit(1)
 
     ee_geometry = None
     try:
-        geom_type = geojson_geometry.get('type')
-        coords = geojson_geometry.get('coordinates')
-        if geom_type == 'Polygon':
-            ee_geometry = ee.Geometry.Polygon(coords)
-        elif geom_type == 'MultiPolygon':
-            ee_geometry = ee.Geometry.MultiPolygon(coords)
-        elif geom_type == 'Point':
-            ee_geometry = ee.Geometry.Point(coords).buffer(10000)  # 10km buffer for points
-        else:
-            raise ValueError(f"Unsupported type: {geom_type}")
+        ee_geometry, _ = geojson_to_ee_geometry(geojson_geometry, DEFAULT_POINT_BUFFER, GEOMETRY_SCALE)
     except Exception as e:
         print(f"ERROR: GeoJSON convert fail: {e}", file=sys.stderr)
         print(json.dumps({"status": "error", "message": f"GeoJSON Error: {e}", "region_id": region_id}))
@@ -158,7 +303,8 @@ if __name__ == "__main__":
 
     print(f"Starting GEE fire detection analysis for region: {region_id}...", file=sys.stderr)
     start_time = time.time()
-    analysis_result = detect_active_fires(ee_geometry, days_back)
+    watermark_key = fire_watermark_key(geojson_geometry, region_id) if incremental else None
+    analysis_result = detect_active_fires(ee_geometry, days_back, watermark_key, columnar, cluster)
     end_time = time.time()
     print(f"GEE analysis duration: {end_time - start_time:.2f} seconds.", file=sys.stderr)
     analysis_result['region_id'] = region_id
@@ -0,0 +1,237 @@
+import os
+import sys
+import time
+import traceback
+from pathlib import Path
+
+import ee
+import numpy as np
+
+from common.ee_requests import evaluate, run_concurrently
+from common.progress import emit_region_result
+from common.geometry import prepare_geojson, METERS_PER_DEGREE
+from common.time_windows import resolve_anchor, shift_days, bound_anchor
+from fire_protection import (
+    MODIS_FIRE_COLLECTION, FIRE_POINT_COLUMNS, CONFIDENCE_BUCKET_WIDTH, DEFAULT_POINT_BUFFER, GEOMETRY_SCALE,
+    fire_point_columns, fire_result, load_fire_state, fire_watermark_key
+)
+from fire_acquisition import ACQ_KEY_FORMAT, acq_key, canonical_acq_time
+
+# Batch fire checks from one global snapshot: the MODIS detections of the window and of the
+# previous period of the same length are downloaded once as column arrays, saved as a compressed
+# .npz, and assigned to every region locally through a grid index and point-in-polygon tests.
+# The download is paged by day (one getInfo per day, run concurrently) so no response gets near
+# Earth Engine's payload limits; a cron run makes those requests instead of one filterBounds
+# query per subscription.
+#   GEE_FIRE_SNAPSHOT_DIR             where snapshots are kept (default: services/google-earth/.cache/fire_snapshots)
+#   GEE_FIRE_SNAPSHOT_TTL_SECONDS     reuse a snapshot for this long before downloading again (default: 3600)
+
+DEFAULT_SNAPSHOT_DIR = Path(__file__).resolve().parent.parent / '.cache' / 'fire_snapshots'
+SNAPSHOT_DIR = Path(os.environ.get('GEE_FIRE_SNAPSHOT_DIR', DEFAULT_SNAPSHOT_DIR))
+SNAPSHOT_TTL_SECONDS = int(os.environ.get('GEE_FIRE_SNAPSHOT_TTL_SECONDS', 3600))
+SNAPSHOT_PAGE_DAYS = 1
+SNAPSHOT_PAGE_MAX_POINTS = 100000  # detections per page; about 6 MB of columns
+INDEX_CELL_DEGREES = 0.5
+INDEX_COLUMNS = int(360 / INDEX_CELL_DEGREES) + 1
+FLOAT_COLUMNS = ('latitude', 'longitude', 'brightness', 'confidence')
+# Fields fire_result only adds in columnar mode
+COLUMNAR_FIELDS = ('fire_points', 'fire_points_truncated', 'brightness_max', 'brightness_mean', 'confidence_histogram', 'daily_counts')
+
+def _snapshot_path(window_days):
+    anchor = bound_anchor()
+    if anchor is not None:
+        # Past windows (backfills) are kept apart from the live one and from each other
+        return SNAPSHOT_DIR / f"modis_{window_days}d_{anchor.strftime('%Y%m%dT%H%M')}.npz"
+    return SNAPSHOT_DIR / f"modis_{window_days}d.npz"
+
+def _as_float_array(values):
+    return np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+
+def _snapshot_page(start, end):
+    fires = ee.FeatureCollection(MODIS_FIRE_COLLECTION).filterDate(ee.Date(start), ee.Date(end))
+    page = ee.Dictionary({
+        'count': fires.size(),
+        'points': fire_point_columns(fires, SNAPSHOT_PAGE_MAX_POINTS),
+    })
+    return lambda: evaluate(page)
+
+def download_fire_snapshot(window_days, now):
+    """Every detection in the window_days before now, as arrays keyed by FIRE_POINT_COLUMNS plus acq_key."""
+    pages = {}
+    start = shift_days(now, -window_days)
+    while start < now:
+        end = min(shift_days(start, SNAPSHOT_PAGE_DAYS), now)
+        pages[start.isoformat()] = _snapshot_page(start, end)
+        start = end
+    summaries = run_concurrently(pages).values()
+
+    columns = {name: [] for name in FIRE_POINT_COLUMNS}
+    truncated_pages = 0
+    for summary in summaries:
+        for name, values in zip(FIRE_POINT_COLUMNS, summary.get('points') or [[] for _ in FIRE_POINT_COLUMNS]):
+            columns[name].extend(values)
+        truncated_pages += (summary.get('count') or 0) > SNAPSHOT_PAGE_MAX_POINTS
+    snapshot = {name: _as_float_array(columns[name]) for name in FLOAT_COLUMNS}
+    snapshot['acq_date'] = np.array([str(value) for value in columns['acq_date']], dtype=str)
+    snapshot['acq_time'] = np.array([canonical_acq_time(value) for value in columns['acq_time']], dtype=str)
+    snapshot['acq_key'] = np.char.add(np.char.add(snapshot['acq_date'], 'T'), snapshot['acq_time'])
+    snapshot['fetched_at'] = np.array(time.time())
+    snapshot['truncated'] = np.array(truncated_pages > 0)
+    if truncated_pages:
+        print(f"WARNING: Fire snapshot truncated: {truncated_pages} pages had more than {SNAPSHOT_PAGE_MAX_POINTS} detections.", file=sys.stderr)
+    return snapshot
+
+def load_fire_snapshot(window_days, now):
+    """The stored snapshot for window_days if it is younger than SNAPSHOT_TTL_SECONDS, otherwise a fresh download."""
+    path = _snapshot_path(window_days)
+    try:
+        with np.load(path) as stored:
+            if time.time() - float(stored['fetched_at']) < SNAPSHOT_TTL_SECONDS:
+                print(f"Using fire snapshot {path.name} ({len(stored['acq_key'])} detections).", file=sys.stderr)
+                return {name: stored[name] for name in stored.files}
+    except (OSError, KeyError, ValueError):
+        pass
+    snapshot = download_fire_snapshot(window_days, now)
+    try:
+        SNAPSHOT_DIR.mkdir(parents=True, exist_ok=True)
+        partial_path = path.with_suffix('.partial')
+        with open(partial_path, 'wb') as f:
+            np.savez_compressed(f, **snapshot)
+        os.replace(partial_path, path)
+    except OSError as e:
+        print(f"WARNING: Could not save fire snapshot: {e}", file=sys.stderr)
+    print(f"Downloaded fire snapshot for {window_days} days ({len(snapshot['acq_key'])} detections).", file=sys.stderr)
+    return snapshot
+
+def build_grid_index(latitudes, longitudes):
+    """Point indices sorted by INDEX_CELL_DEGREES cell, with the matching sorted cell ids."""
+    rows = np.floor((latitudes + 90) / INDEX_CELL_DEGREES).astype(np.int64)
+    cols = np.floor((longitudes + 180) / INDEX_CELL_DEGREES).astype(np.int64)
+    cell_ids = rows * INDEX_COLUMNS + cols
+    order = np.argsort(cell_ids, kind='stable')
+    return order, cell_ids[order]
+
+def candidates_in_bbox(index, min_lon, min_lat, max_lon, max_lat):
+    """Indices of points in grid cells overlapping the bbox (a superset of the points inside it)."""
+    order, sorted_ids = index
+    first_row = int(np.floor((max(min_lat, -90) + 90) / INDEX_CELL_DEGREES))
+    last_row = int(np.floor((min(max_lat, 90) + 90) / INDEX_CELL_DEGREES))
+    first_col = int(np.floor((max(min_lon, -180) + 180) / INDEX_CELL_DEGREES))
+    last_col = int(np.floor((min(max_lon, 180) + 180) / INDEX_CELL_DEGREES))
+    rows = np.arange(first_row, last_row + 1, dtype=np.int64)
+    if not len(rows) or first_col > last_col:
+        return np.empty(0, dtype=np.int64)
+    starts = np.searchsorted(sorted_ids, rows * INDEX_COLUMNS + first_col, side='left')
+    ends = np.searchsorted(sorted_ids, rows * INDEX_COLUMNS + last_col, side='right')
+    return np.concatenate([order[start:end] for start, end in zip(starts, ends)])
+
+def points_in_ring(longitudes, latitudes, ring):
+    """Even-odd ray casting, vectorised over points; loops over the ring's edges."""
+    inside = np.zeros(len(longitudes), dtype=bool)
+    for (ax, ay), (bx, by) in zip(ring[:-1], ring[1:]):
+        crosses = (ay > latitudes) != (by > latitudes)
+        if not crosses.any():
+            continue
+        x_cross = ax + (latitudes[crosses] - ay) * (bx - ax) / (by - ay)
+        inside[crosses] ^= longitudes[crosses] < x_cross
+    return inside
+
+def region_point_indices(geojson_geometry, latitudes, longitudes, index):
+    """Indices of snapshot points inside the region (Points are buffered by DEFAULT_POINT_BUFFER)."""
+    prepared = prepare_geojson(geojson_geometry, GEOMETRY_SCALE)
+    if prepared['type'] == 'Point':
+        lon, lat = prepared['coordinates']
+        lat_radius = DEFAULT_POINT_BUFFER / METERS_PER_DEGREE
+        lon_radius = lat_radius / max(np.cos(np.radians(lat)), 1e-6)
+        candidates = candidates_in_bbox(index, lon - lon_radius, lat - lat_radius, lon + lon_radius, lat + lat_radius)
+        dx = (longitudes[candidates] - lon) / lon_radius
+        dy = (latitudes[candidates] - lat) / lat_radius
+        return candidates[dx * dx + dy * dy <= 1]
+
+    polygons = [prepared['coordinates']] if prepared['type'] == 'Polygon' else prepared['coordinates']
+    matches = []
+    for rings in polygons:
+        shell = np.asarray(rings[0], dtype=np.float64)
+        candidates = candidates_in_bbox(index, *shell.min(axis=0), *shell.max(axis=0))
+        inside = points_in_ring(longitudes[candidates], latitudes[candidates], shell)
+        for hole in rings[1:]:
+            inside &= ~points_in_ring(longitudes[candidates], latitudes[candidates], np.asarray(hole, dtype=np.float64))
+        matches.append(candidates[inside])
+    return np.unique(np.concatenate(matches)) if matches else np.empty(0, dtype=np.int64)
+
+def _json_list(values):
+    return [None if isinstance(value, float) and value != value else value for value in values.tolist()]
+
+def local_fire_summary(snapshot, indices):
+    """The same summary detect_active_fires gets from Earth Engine in columnar mode, computed from the snapshot."""
+    brightness = snapshot['brightness'][indices]
+    confidence = snapshot['confidence'][indices]
+    days, day_counts = np.unique(snapshot['acq_date'][indices], return_counts=True)
+    bucket_count = 100 // CONFIDENCE_BUCKET_WIDTH + 1
+    bucket_edges = np.arange(bucket_count + 1) * CONFIDENCE_BUCKET_WIDTH
+    histogram, _ = np.histogram(confidence[~np.isnan(confidence)], bins=bucket_edges)
+    has_brightness = len(indices) and not np.isnan(brightness).all()
+    return {
+        'count': int(len(indices)),
+        'days': {str(day): int(count) for day, count in zip(days, day_counts)},
+        'points': [_json_list(snapshot[name][indices]) for name in FIRE_POINT_COLUMNS],
+        'brightness_max': float(np.nanmax(brightness)) if has_brightness else None,
+        'brightness_mean': float(np.nanmean(brightness)) if has_brightness else None,
+        'confidence_histogram': [[int(edge), int(count)] for edge, count in zip(bucket_edges[:-1], histogram)],
+    }
+
+def check_fire_snapshot_batch(regions):
+    """
+    Fire check for many regions from one snapshot. Each region is {region_id, days_back,
+    params: {geometry, incremental, columnar, cluster}}; results have the detect_active_fires
+    fields, without thumbnails. Returns one result per region, in order.
+    """
+    if not regions:
+        return []
+    now = resolve_anchor()
+    # Twice the longest window: previous_period_fire_count needs the period before it too
+    snapshot = load_fire_snapshot(2 * max(region['days_back'] for region in regions), now)
+    latitudes, longitudes, acq_keys = snapshot['latitude'], snapshot['longitude'], snapshot['acq_key']
+    index = build_grid_index(latitudes, longitudes)
+
+    results = []
+    for region in regions:
+        region_id, params, days_back = region['region_id'], region['params'], region['days_back']
+        try:
+            indices = region_point_indices(params['geometry'], latitudes, longitudes, index)
+            start_key = shift_days(now, -days_back).strftime(ACQ_KEY_FORMAT)
+            previous_start_key = shift_days(now, -2 * days_back).strftime(ACQ_KEY_FORMAT)
+            region_keys = acq_keys[indices]
+            previous_count = int(np.count_nonzero((region_keys >= previous_start_key) & (region_keys < start_key)))
+            indices = indices[region_keys >= start_key]
+            # Past windows never move the live watermark. Neither does a truncated snapshot: a full
+            # page keeps an arbitrary subset of its day, and the watermark would skip the rest.
+            incremental = params.get('incremental') and bound_anchor() is None and not snapshot['truncated']
+            watermark_key = fire_watermark_key(params['geometry'], region_id) if incremental else None
+            state = load_fire_state(watermark_key, days_back)
+            if state and state.get('watermark'):
+                watermark = state['watermark']
+                indices = indices[acq_keys[indices] > acq_key(watermark['acq_date'], watermark['acq_time'])]
+            indices = indices[np.argsort(acq_keys[indices], kind='stable')[::-1]]  # newest first
+
+            cluster = bool(params.get('cluster'))
+            result = fire_result(local_fire_summary(snapshot, indices), state, watermark_key, days_back, now, True, cluster)
+            if not (params.get('columnar') or cluster):
+                # The points were needed for the watermark; the result keeps the non-columnar fields
+                for field in COLUMNAR_FIELDS:
+                    result.pop(field, None)
+            result["previous_period_fire_count"] = previous_count
+            result.update({
+                "start_image_url": None,
+                "end_image_url": None,
+                "snapshot": True,
+                "snapshot_truncated": bool(snapshot['truncated']),
+                "region_id": region_id,
+            })
+        except Exception as e:
+            print(f"ERROR: Fire snapshot check failed for region {region_id}: {e}", file=sys.stderr)
+            print(traceback.format_exc(), file=sys.stderr)
+            result = {"status": "error", "message": f"Python Script Error: {e}", "region_id": region_id}
+        emit_region_result(region_id, result)
+        results.append(result)
+    return results
@@ -1,12 +1,25 @@
 import sys
 import json
-import os
 import ee
-import datetime
 import time
 import traceback
+import numpy as np
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common.gee_init import initialize_gee
+from common.tracing import bind_trace_context
+from common.progress import bind_progress, emit_stats
+from common.scale import adaptive_scale, SCALE_PROPERTY
+from common.geometry import geojson_to_ee_geometry
+from common.result_cache import cache_key, analysis_window, cached_run
+from common.thumbnails import thumbnail_fields, submit_thumbnail_fields
+from common.ee_requests import run_concurrently, call_ee, evaluate
+from common.batch import build_region_collection, with_band_placeholder, reduce_regions_table, finish_region_results
+from common.time_windows import resolve_anchor, shift_years, window_ending_at, period_fields
+from common.preflight import window_availability, preflight_failure
+from common.raster import raster_grid, download_window, median_composite, pixel_area_km2, region_sum, raster_period_fields
+
 # --- Configuration Constants ---
 DEFAULT_FLOOD_ALERT_THRESHOLD_PERCENT = 5.0  # Alert if > 5% of area is newly flooded
 
@@ -20,56 +33,97 @@ S1_INSTRUMENT_MODE = 'IW'
 WATER_THRESHOLD_DB = -16
 REDUCTION_SCALE_S1 = 30
 DEFAULT_POINT_BUFFER = 1000
-gcp_project_id = 'project-ultron-457221'
-
-def initialize_gee(credentials_path_arg):
-    global gcp_project_id
-    try:
-        credentials_path = credentials_path_arg
-        print(f"DEBUG: Received credentials path via argument: {credentials_path}", file=sys.stderr)
-        if not credentials_path or not os.path.exists(credentials_path):
-             print(f"ERROR: Credentials file not found or path empty: {credentials_path}", file=sys.stderr)
-             return False
-        print(f"Attempting GEE init with key: {credentials_path}", file=sys.stderr)
-        credentials = ee.ServiceAccountCredentials(None, key_file=credentials_path)
-        ee.Initialize(credentials=credentials, project=gcp_project_id, opt_url='https://earthengine-highvolume.googleapis.com')
-        print(f"GEE Initialized OK for project: {gcp_project_id}.", file=sys.stderr)
-        return True
-    except ee.EEException as e: print(f"ERROR: Failed GEE init: {e}", file=sys.stderr); return False
-    except Exception as e: print(f"ERROR: Unexpected GEE init error: {e}", file=sys.stderr); print(traceback.format_exc(), file=sys.stderr); return False
+RASTER_WINDOWS = ['baseline', 'recent']
 
 def apply_water_threshold(image):
     water = image.select(S1_POLARIZATION).lt(WATER_THRESHOLD_DB).rename('water')
     return water.copyProperties(image, ['system:time_start'])
 
+def s1_collection_for(bounds):
+    """Sentinel-1 IW scenes with VV polarisation over bounds (a geometry or feature collection)."""
+    return (ee.ImageCollection(S1_COLLECTION)
+            .filter(ee.Filter.eq('instrumentMode', S1_INSTRUMENT_MODE))
+            .filter(ee.Filter.listContains('transmitterReceiverPolarisation', S1_POLARIZATION))
+            .filterBounds(bounds)
+            .select(S1_POLARIZATION))
+
 def get_flood_image_url(image, region_geometry, vis_params, label):
     try:
-        url = image.getThumbURL({
+        url = call_ee(lambda: image.getThumbURL({
             'min': vis_params.get('min', 0),
             'max': vis_params.get('max', 1),
             'dimensions': vis_params.get('dimensions', 512),
             'palette': vis_params.get('palette', ['#333399', '#00ffff']),
             'region': region_geometry
-        })
+        }), 'getThumbURL', image)
         return url
     except Exception as e:
         print(f"WARNING: Could not get {label} flood image URL: {e}", file=sys.stderr)
         return None
 
+def result_cache_key(geojson_geometry, buffer_radius, threshold_percent):
+    return cache_key(
+        'FLOODING', geojson_geometry, buffer_radius, {'threshold_percent': threshold_percent},
+        REDUCTION_SCALE_S1, analysis_window(RECENT_FLOOD_PERIOD_DAYS, BASELINE_PERIOD_OFFSET_YEARS, BASELINE_PERIOD_DURATION_DAYS)
+    )
+
+def error_fields(threshold_percent, buffer_radius_meters):
+    """The detector-specific fields of an error result (values unknown), e.g. for preflight_failure."""
+    return {
+        "flooded_area_sqkm": None,
+        "flooded_percentage": None,
+        "total_area_sqkm": None,
+        "threshold_percent": threshold_percent,
+        "buffer_radius_meters": buffer_radius_meters,
+    }
+
+def preflight_windows(region_geometry):
+    """Sentinel-1 scene counts and footprint coverage for both windows (see common.preflight)."""
+    start_recent, end_recent = window_ending_at(resolve_anchor(), RECENT_FLOOD_PERIOD_DAYS)
+    start_baseline, end_baseline = window_ending_at(shift_years(end_recent, -BASELINE_PERIOD_OFFSET_YEARS), BASELINE_PERIOD_DURATION_DAYS)
+    s1_collection = s1_collection_for(region_geometry)
+    return {
+        'baseline': window_availability(s1_collection, start_baseline, end_baseline, region_geometry),
+        'recent': window_availability(s1_collection, start_recent, end_recent, region_geometry),
+    }
+
+def monthly_stats(region_geometry):
+    """Per-month scene count and open-water area, as a server-side function of the month's start (see common.time_series)."""
+    s1_collection = s1_collection_for(region_geometry)
+    pixel_area = ee.Image.pixelArea().divide(1000000).rename('area')
+    scale = adaptive_scale(region_geometry, REDUCTION_SCALE_S1)
+
+    def month_stats(start):
+        month_s1 = s1_collection.filterDate(start, start.advance(1, 'month'))
+        water_composite = with_band_placeholder(month_s1.map(apply_water_threshold), ['water']).median().unmask(0)
+        area_stats = ee.Dictionary(water_composite.multiply(pixel_area).rename('water').addBands(pixel_area).reduceRegion(
+            reducer=ee.Reducer.sum(),
+            geometry=region_geometry,
+            scale=scale,
+            maxPixels=1e9,
+            bestEffort=True
+        ))
+        scene_count = month_s1.size()
+        return ee.Dictionary({
+            'scene_count': scene_count,
+            'water_area_sqkm': ee.Algorithms.If(scene_count.gt(0), area_stats.get('water', None), None),
+            'total_area_sqkm': area_stats.get('area', None),
+            SCALE_PROPERTY: scale,
+        })
+    return month_stats
+
 def check_flooding(region_geometry, threshold_percent, buffer_radius_meters):
     try:
-        from datetime import timezone
-        end_date_recent = ee.Date(datetime.datetime.now(timezone.utc))
-        start_date_recent = end_date_recent.advance(-RECENT_FLOOD_PERIOD_DAYS, 'day')
-
-        end_date_baseline = end_date_recent.advance(-BASELINE_PERIOD_OFFSET_YEARS, 'year')
-        start_date_baseline = end_date_baseline.advance(-BASELINE_PERIOD_DURATION_DAYS, 'day')
+        start_recent, end_recent = window_ending_at(resolve_anchor(), RECENT_FLOOD_PERIOD_DAYS)
+        start_baseline, end_baseline = window_ending_at(shift_years(end_recent, -BASELINE_PERIOD_OFFSET_YEARS), BASELINE_PERIOD_DURATION_DAYS)
+        response_dates = {
+            **period_fields('recent', start_recent, end_recent),
+            **period_fields('baseline', start_baseline, end_baseline),
+        }
+        start_date_recent, end_date_recent = ee.Date(start_recent), ee.Date(end_recent)
+        start_date_baseline, end_date_baseline = ee.Date(start_baseline), ee.Date(end_baseline)
 
-        s1_collection = (ee.ImageCollection(S1_COLLECTION)
-                          .filter(ee.Filter.eq('instrumentMode', S1_INSTRUMENT_MODE))
-                          .filter(ee.Filter.listContains('transmitterReceiverPolarisation', S1_POLARIZATION))
-                          .filterBounds(region_geometry)
-                          .select(S1_POLARIZATION))
+        s1_collection = s1_collection_for(region_geometry)
 
         recent_s1 = s1_collection.filterDate(start_date_recent, end_date_recent)
         baseline_s1 = s1_collection.filterDate(start_date_baseline, end_date_baseline)
@@ -84,54 +138,44 @@ def check_flooding(region_geometry, threshold_percent, buffer_radius_meters):
             'palette': ['#333399', '#00ffff'],
             'dimensions': 512
         }
-        start_image_url = get_flood_image_url(baseline_water_composite, region_geometry, vis_params, "before")
-        end_image_url = get_flood_image_url(recent_water_composite, region_geometry, vis_params, "after")
 
         # --- Calculate Flood Water ---
         flood_water_mask = recent_water_composite.subtract(baseline_water_composite).gt(0).rename('flood_water')
         pixel_area = ee.Image.pixelArea().divide(1000000).rename('area')
         flood_area_image = flood_water_mask.multiply(pixel_area)
-        flood_stats = flood_area_image.reduceRegion(
-            reducer=ee.Reducer.sum(),
-            geometry=region_geometry,
-            scale=REDUCTION_SCALE_S1,
-            maxPixels=1e9,
-            bestEffort=True
-        )
-        total_area_stats = pixel_area.reduceRegion(
+        scale = adaptive_scale(region_geometry, REDUCTION_SCALE_S1)
+        # Flooded and total area reduced together so both sums come back in one pass
+        area_stats = ee.Dictionary(flood_area_image.addBands(pixel_area).reduceRegion(
             reducer=ee.Reducer.sum(),
             geometry=region_geometry,
-            scale=REDUCTION_SCALE_S1,
+            scale=scale,
             maxPixels=1e9,
             bestEffort=True
-        )
-
+        ))
+        analysis_summary = ee.Dictionary({
+            'flooded_area_sqkm': area_stats.get('flood_water', None),
+            'total_area_sqkm': area_stats.get('area', None),
+            SCALE_PROPERTY: scale,
+        })
         flooded_area_sqkm = None
         total_area_sqkm = None
         flooded_percentage = 0.0
         alert_triggered = False
         error_message = None
         try:
-            flood_area_result = flood_stats.get('flood_water')
-            if flood_area_result is not None:
-                flooded_area_sqkm = flood_area_result.getInfo()
-                if flooded_area_sqkm is None:
-                    flooded_area_sqkm = 0.0
-            else:
+            summary = evaluate(analysis_summary)
+            flooded_area_sqkm = summary.get('flooded_area_sqkm')
+            if flooded_area_sqkm is None:
                 flooded_area_sqkm = 0.0
 
-            total_area_result = total_area_stats.get('area')
-            if total_area_result is not None:
-                total_area_sqkm = total_area_result.getInfo()
-                if total_area_sqkm is None or total_area_sqkm == 0:
-                    error_message = "Could not calculate total area of the region."
-                    total_area_sqkm = 0
-                elif total_area_sqkm > 0:
-                    flooded_percentage = (flooded_area_sqkm / total_area_sqkm) * 100 if total_area_sqkm else 0.0
-                    alert_triggered = flooded_percentage > threshold_percent
-            else:
+            total_area_sqkm = summary.get('total_area_sqkm')
+            if total_area_sqkm is None or total_area_sqkm == 0:
                 error_message = "Could not calculate total area of the region."
                 total_area_sqkm = 0
+            elif total_area_sqkm > 0:
+                flooded_percentage = (flooded_area_sqkm / total_area_sqkm) * 100 if total_area_sqkm else 0.0
+                alert_triggered = flooded_percentage > threshold_percent
+            emit_stats(flooded_area_sqkm=flooded_area_sqkm, total_area_sqkm=total_area_sqkm, flooded_percentage=flooded_percentage)
         except Exception as reduce_error:
             print(f"ERROR: Failed during reduceRegion getInfo(): {reduce_error}", file=sys.stderr)
             print(traceback.format_exc(), file=sys.stderr)
@@ -144,20 +188,10 @@ def check_flooding(region_geometry, threshold_percent, buffer_radius_meters):
                 "total_area_sqkm": None,
                 "threshold_percent": threshold_percent,
                 "buffer_radius_meters": buffer_radius_meters,
-                "start_image_url": start_image_url,
-                "end_image_url": end_image_url
+                "start_image_url": None,
+                "end_image_url": None
             }
 
-        try:
-            response_dates = {
-                "recent_period_start": start_date_recent.format('YYYY-MM-dd').getInfo(),
-                "recent_period_end": end_date_recent.format('YYYY-MM-dd').getInfo(),
-                "baseline_period_start": start_date_baseline.format('YYYY-MM-dd').getInfo(),
-                "baseline_period_end": end_date_baseline.format('YYYY-MM-dd').getInfo(),
-            }
-        except Exception as date_format_error:
-            response_dates = {}
-
         if error_message:
             return {
                 "status": "error",
@@ -169,10 +203,12 @@ def check_flooding(region_geometry, threshold_percent, buffer_radius_meters):
                 "threshold_percent": threshold_percent,
                 **response_dates,
                 "buffer_radius_meters": buffer_radius_meters,
-                "start_image_url": start_image_url,
-                "end_image_url": end_image_url
+                "start_image_url": None,
+                "end_image_url": None
             }
 
+        # Thumbnails are only rendered once the area statistics came back
+        thumbnails = thumbnail_fields(get_flood_image_url, baseline_water_composite, recent_water_composite, region_geometry, vis_params)
         return {
             "status": "success",
             "alert_triggered": alert_triggered,
@@ -183,8 +219,8 @@ def check_flooding(region_geometry, threshold_percent, buffer_radius_meters):
             **response_dates,
             "buffer_radius_meters": buffer_radius_meters,
             "water_detection_threshold_db": WATER_THRESHOLD_DB,
-            "start_image_url": start_image_url,
-            "end_image_url": end_image_url
+            SCALE_PROPERTY: summary.get(SCALE_PROPERTY),
+            **thumbnails
         }
 
     except ee.EEException as gee_error:
@@ -216,6 +252,177 @@ def check_flooding(region_geometry, threshold_percent, buffer_radius_meters):
             "end_image_url": None
         }
 
+def check_flooding_batch(regions, threshold_percent):
+    """
+    Batch variant of check_flooding for many regions sharing one time window.
+    regions: [{'region_id', 'geometry' (ee.Geometry), optional 'threshold_percent', optional 'buffer_radius_meters'}].
+    Water composites are built once over the union footprint and flooded/total area for every
+    region come back from a single reduceRegions call. Thumbnails are only generated for alerts.
+    """
+    try:
+        start_recent, end_recent = window_ending_at(resolve_anchor(), RECENT_FLOOD_PERIOD_DAYS)
+        start_baseline, end_baseline = window_ending_at(shift_years(end_recent, -BASELINE_PERIOD_OFFSET_YEARS), BASELINE_PERIOD_DURATION_DAYS)
+        response_dates = {
+            **period_fields('recent', start_recent, end_recent),
+            **period_fields('baseline', start_baseline, end_baseline),
+        }
+        print(f"Batch of {len(regions)} regions, Analysis Periods: Baseline {response_dates['baseline_period_start']} -> {response_dates['baseline_period_end']}, Recent {response_dates['recent_period_start']} -> {response_dates['recent_period_end']}", file=sys.stderr)
+
+        region_collection = build_region_collection(regions)
+        s1_collection = s1_collection_for(region_collection)
+        recent_water = with_band_placeholder(
+            s1_collection.filterDate(ee.Date(start_recent), ee.Date(end_recent)).map(apply_water_threshold), ['water']
+        )
+        baseline_water = with_band_placeholder(
+            s1_collection.filterDate(ee.Date(start_baseline), ee.Date(end_baseline)).map(apply_water_threshold), ['water']
+        )
+        recent_water_composite = recent_water.median().unmask(0)
+        baseline_water_composite = baseline_water.median().unmask(0)
+
+        flood_water_mask = recent_water_composite.subtract(baseline_water_composite).gt(0).rename('flood_water')
+        pixel_area = ee.Image.pixelArea().divide(1000000).rename('area')
+        area_table = reduce_regions_table(
+            flood_water_mask.multiply(pixel_area).addBands(pixel_area),
+            region_collection, ee.Reducer.sum(), REDUCTION_SCALE_S1, ['flood_water', 'area']
+        )
+    except ee.EEException as gee_error:
+        print(f"ERROR: GEE batch computation failed: {gee_error}", file=sys.stderr)
+        return [{
+            "status": "error",
+            "message": f"GEE Computation Error: {str(gee_error)}",
+            "alert_triggered": False,
+            "flooded_area_sqkm": None,
+            "flooded_percentage": None,
+            "threshold_percent": region.get('threshold_percent', threshold_percent),
+            "buffer_radius_meters": region.get('buffer_radius_meters'),
+            "start_image_url": None,
+            "end_image_url": None,
+            "region_id": str(region['region_id'])
+        } for region in regions]
+
+    vis_params = {
+        'min': 0,
+        'max': 1,
+        'palette': ['#333399', '#00ffff'],
+        'dimensions': 512
+    }
+    results = []
+    thumbnail_requests = {}
+    for region in regions:
+        region_id = str(region['region_id'])
+        region_threshold = region.get('threshold_percent', threshold_percent)
+        buffer_radius_meters = region.get('buffer_radius_meters')
+        stats = area_table.get(region_id, {})
+        flooded_area_sqkm = stats.get('flood_water') or 0.0
+        total_area_sqkm = stats.get('area')
+        if not total_area_sqkm:
+            results.append({
+                "status": "error",
+                "message": "Could not calculate total area of the region.",
+                "alert_triggered": False,
+                "flooded_area_sqkm": flooded_area_sqkm,
+                "total_area_sqkm": 0,
+                "flooded_percentage": None,
+                "threshold_percent": region_threshold,
+                **response_dates,
+                "buffer_radius_meters": buffer_radius_meters,
+                "start_image_url": None,
+                "end_image_url": None,
+                "region_id": region_id
+            })
+            continue
+
+        flooded_percentage = (flooded_area_sqkm / total_area_sqkm) * 100
+        alert_triggered = flooded_percentage > region_threshold
+        thumbnails = {"start_image_url": None, "end_image_url": None}
+        if alert_triggered:
+            region_geometry = region['geometry']
+            # Rendered concurrently across alerting regions and filled in below
+            thumbnail_requests[len(results)] = submit_thumbnail_fields(get_flood_image_url, baseline_water_composite.clip(region_geometry), recent_water_composite.clip(region_geometry), region_geometry, vis_params)
+        results.append({
+            "status": "success",
+            "alert_triggered": alert_triggered,
+            "flooded_area_sqkm": flooded_area_sqkm,
+            "total_area_sqkm": total_area_sqkm,
+            "flooded_percentage": flooded_percentage,
+            "threshold_percent": region_threshold,
+            **response_dates,
+            "buffer_radius_meters": buffer_radius_meters,
+            "water_detection_threshold_db": WATER_THRESHOLD_DB,
+            SCALE_PROPERTY: stats.get(SCALE_PROPERTY),
+            **thumbnails,
+            "region_id": region_id
+        })
+    return finish_region_results(results, thumbnail_requests)
+
+def raster_cache_key(geojson_geometry, buffer_radius):
+    """Key for the downloaded windows; thresholds are left out so every threshold reuses them."""
+    return cache_key(
+        'FLOODING', geojson_geometry, buffer_radius, {},
+        REDUCTION_SCALE_S1, analysis_window(RECENT_FLOOD_PERIOD_DAYS, BASELINE_PERIOD_OFFSET_YEARS, BASELINE_PERIOD_DURATION_DAYS)
+    )
+
+def local_rasters(region_geometry):
+    """Raw VV backscatter stacks of both windows on one grid, for check_flooding_local."""
+    start_recent, end_recent = window_ending_at(resolve_anchor(), RECENT_FLOOD_PERIOD_DAYS)
+    start_baseline, end_baseline = window_ending_at(shift_years(end_recent, -BASELINE_PERIOD_OFFSET_YEARS), BASELINE_PERIOD_DURATION_DAYS)
+    s1_collection = s1_collection_for(region_geometry)
+    grid = raster_grid(region_geometry, REDUCTION_SCALE_S1, s1_collection, [(start_baseline, end_baseline), (start_recent, end_recent)])
+    return run_concurrently({
+        'baseline': lambda: download_window(s1_collection, start_baseline, end_baseline, [S1_POLARIZATION], region_geometry, grid),
+        'recent': lambda: download_window(s1_collection, start_recent, end_recent, [S1_POLARIZATION], region_geometry, grid),
+    })
+
+def water_composite(raster):
+    """apply_water_threshold + median + unmask(0) on a local VV stack."""
+    backscatter = raster['bands'][S1_POLARIZATION]
+    water = np.where(np.isnan(backscatter), np.nan, backscatter < WATER_THRESHOLD_DB)
+    return np.nan_to_num(median_composite(water), nan=0.0)
+
+def check_flooding_local(rasters, threshold_percent, buffer_radius_meters):
+    """
+    check_flooding on local rasters ({'baseline', 'recent'}, see common.raster) with NumPy.
+    Same result fields; there are no thumbnails.
+    """
+    region = rasters['recent']['region']
+    pixel_area = pixel_area_km2(rasters['recent'])
+    flood_water = (water_composite(rasters['recent']) - water_composite(rasters['baseline'])) > 0
+    flooded_area_sqkm = region_sum(flood_water * pixel_area, region)
+    total_area_sqkm = region_sum(pixel_area, region)
+    response_dates = {
+        **raster_period_fields('recent', rasters['recent']),
+        **raster_period_fields('baseline', rasters['baseline']),
+    }
+    if not total_area_sqkm:
+        return {
+            "status": "error",
+            "message": "Could not calculate total area of the region.",
+            "alert_triggered": False,
+            "flooded_area_sqkm": flooded_area_sqkm,
+            "total_area_sqkm": 0,
+            "flooded_percentage": None,
+            "threshold_percent": threshold_percent,
+            **response_dates,
+            "buffer_radius_meters": buffer_radius_meters,
+            "start_image_url": None,
+            "end_image_url": None
+        }
+    flooded_percentage = flooded_area_sqkm / total_area_sqkm * 100
+    return {
+        "status": "success",
+        "alert_triggered": flooded_percentage > threshold_percent,
+        "flooded_area_sqkm": flooded_area_sqkm,
+        "total_area_sqkm": total_area_sqkm,
+        "flooded_percentage": flooded_percentage,
+        "threshold_percent": threshold_percent,
+        **response_dates,
+        "buffer_radius_meters": buffer_radius_meters,
+        "water_detection_threshold_db": WATER_THRESHOLD_DB,
+        "start_image_url": None,
+        "end_image_url": None,
+        "backend": "numpy"
+    }
+
 if __name__ == "__main__":
     if len(sys.argv) < 2:
         print("ERROR: Missing credentials file path argument.", file=sys.stderr)
@@ -246,38 +453,31 @@ if __name__ == "__main__":
         print(json.dumps({"status": "error", "message": f"Unexpected error processing input: {e}", "region_id": region_id}))
         sys.exit(1)
 
-    if not initialize_gee(credentials_path_from_arg):
-        print(json.dumps({"status": "error", "message": "GEE initialization failed.", "region_id": region_id}))
-        sys.exit(1)
+    result_key = result_cache_key(geojson_geometry, buffer_radius, threshold_pct)
+    bind_trace_context(detector='FLOODING', region_id=region_id)
+    if input_params.get('stream'):
+        bind_progress(sys.stdout, region_id=region_id)
 
-    ee_geometry = None
-    effective_buffer = None
-    try:
-        geom_type = geojson_geometry.get('type')
-        coords = geojson_geometry.get('coordinates')
-        if not geom_type or not coords:
-            raise ValueError("Invalid GeoJSON structure: Missing 'type' or 'coordinates'.")
-        if geom_type == 'Polygon':
-            ee_geometry = ee.Geometry.Polygon(coords)
-        elif geom_type == 'MultiPolygon':
-            ee_geometry = ee.Geometry.MultiPolygon(coords)
-        elif geom_type == 'Point':
-            if not isinstance(coords, list) or len(coords) != 2:
-                raise ValueError("Invalid Point coordinates.")
-            ee_geometry = ee.Geometry.Point(coords).buffer(buffer_radius)
-            effective_buffer = buffer_radius
-        else:
-            raise ValueError(f"Unsupported geometry type: {geom_type}")
-    except Exception as e:
-        print(f"ERROR: GeoJSON convert fail: {e}", file=sys.stderr)
-        print(json.dumps({"status": "error", "message": f"GeoJSON Error: {e}", "region_id": region_id}))
-        sys.exit(1)
+    def run_analysis():
+        if not initialize_gee(credentials_path_from_arg):
+            return {"status": "error", "message": "GEE initialization failed."}
+
+        try:
+            ee_geometry, effective_buffer = geojson_to_ee_geometry(geojson_geometry, buffer_radius, REDUCTION_SCALE_S1)
+        except Exception as e:
+            print(f"ERROR: GeoJSON convert fail: {e}", file=sys.stderr)
+            return {"status": "error", "message": f"GeoJSON Error: {e}"}
+
+        print(f"Starting GEE flood analysis for region: {region_id}...", file=sys.stderr)
+        start_time = time.time()
+        analysis_result = preflight_failure('FLOODING', preflight_windows(ee_geometry), error_fields(threshold_pct, effective_buffer)) \
+            or check_flooding(ee_geometry, threshold_pct, effective_buffer)
+        end_time = time.time()
+        print(f"GEE analysis duration: {end_time - start_time:.2f} seconds.", file=sys.stderr)
+        return analysis_result
 
-    print(f"Starting GEE flood analysis for region: {region_id}...", file=sys.stderr)
-    start_time = time.time()
-    analysis_result = check_flooding(ee_geometry, threshold_pct, effective_buffer)
-    end_time = time.time()
-    print(f"GEE analysis duration: {end_time - start_time:.2f} seconds.", file=sys.stderr)
+    # Cache hits skip GEE initialization as well as the analysis
+    analysis_result = cached_run(result_key, 'FLOODING', run_analysis)
 
     analysis_result['region_id'] = region_id
     print(json.dumps(analysis_result))
@@ -0,0 +1,274 @@
+import path from "path";
+import readline from "readline";
+import { spawn } from "child_process";
+import { fileURLToPath } from "url";
+import fs from "fs";
+
+// --- Calculate __dirname equivalent in ESM ---
+const __filename = fileURLToPath(import.meta.url);
+const __dirname = path.dirname(__filename);
+
+/**
+ * Long-lived Python worker that initializes Earth Engine once and then
+ * serves newline-delimited JSON jobs for every detector category.
+ */
+class GeeWorker {
+  /**
+   * @param {string} credentialsPath - Path to GCP credentials file
+   * @param {Object} [options]
+   * @param {string} [options.thumbnailMode] - "eager" (getThumbURL during checks) or "lazy" (return recipes)
+   */
+  constructor(credentialsPath, options = {}) {
+    this.credentialsPath = credentialsPath;
+    this.thumbnailMode = options.thumbnailMode;
+    this.pythonProcess = null;
+    this.pending = new Map();
+    this.nextJobId = 1;
+    this.exitError = null;
+  }
+
+  /**
+   * Spawns the worker and waits until Earth Engine is initialized.
+   * @returns {Promise<void>}
+   */
+  start() {
+    return new Promise((resolve, reject) => {
+      const pythonExecutable = "python";
+      const scriptPath = path.resolve(__dirname, "gee_worker.py");
+
+      if (!fs.existsSync(scriptPath)) {
+        return reject(
+          new Error(`Python script not found at path: ${scriptPath}`)
+        );
+      }
+
+      console.log(`Starting GEE worker: ${scriptPath}`);
+      const env = { ...process.env };
+      if (this.thumbnailMode) env.GEE_THUMBNAIL_MODE = this.thumbnailMode;
+      this.pythonProcess = spawn(
+        pythonExecutable,
+        [scriptPath, this.credentialsPath],
+        { env }
+      );
+
+      let ready = false;
+      const lines = readline.createInterface({
+        input: this.pythonProcess.stdout,
+      });
+
+      lines.on("line", (line) => {
+        if (!line.trim()) return;
+        let message;
+        try {
+          message = JSON.parse(line);
+        } catch (parseError) {
+          console.error("GEE worker sent invalid JSON line:", line);
+          return;
+        }
+        if (!ready) {
+          if (message.status === "ready") {
+            ready = true;
+            console.log("GEE worker ready.");
+            resolve();
+          } else {
+            reject(
+              new Error(message.message || "GEE worker failed to start.")
+            );
+          }
+          return;
+        }
+        if (message.job_id === null && message.status === "error") {
+          // A job line the worker couldn't parse; jobs run in order, so it is the oldest pending one
+          const oldest = this.pending.entries().next().value;
+          if (oldest) {
+            const [oldestId, oldestJob] = oldest;
+            this.pending.delete(oldestId);
+            oldestJob.reject(new Error(message.message || "GEE worker rejected the job."));
+          }
+          return;
+        }
+        const job = this.pending.get(message.job_id);
+        if (!job) {
+          if (!message.event) {
+            console.error("GEE worker returned result for unknown job:", line);
+          }
+          return;
+        }
+        if (message.event) {
+          // Progress of a streaming job: stage timings, stats, per-region results
+          job.onEvent(message);
+          return;
+        }
+        this.pending.delete(message.job_id);
+        job.resolve(message);
+      });
+
+      this.pythonProcess.stderr.on("data", (data) => {
+        console.error(`   GEE worker stderr: ${data.toString().trim()}`);
+      });
+
+      this.pythonProcess.on("error", (err) => {
+        console.error("Failed to start GEE worker subprocess:", err);
+        this.exitError = new Error(
+          `Failed to start GEE worker process: ${err.message}`
+        );
+        if (!ready) reject(this.exitError);
+        this.rejectPending(this.exitError);
+      });
+
+      this.pythonProcess.on("close", (code) => {
+        console.log(`GEE worker exited with code ${code}`);
+        this.exitError =
+          this.exitError || new Error(`GEE worker exited with code ${code}`);
+        if (!ready) reject(this.exitError);
+        this.rejectPending(this.exitError);
+        this.pythonProcess = null;
+      });
+    });
+  }
+
+  /**
+   * Sends one job to the worker.
+   * @param {string} category - Canonical category (DEFORESTATION, FLOODING, GLACIER, COASTAL_EROSION, FIRE_PROTECTION, SENTINEL2_FUSED, PREFLIGHT)
+   * @param {Object} regionGeoJson - GeoJSON object for the region to analyze
+   * @param {string} regionId - Identifier for the region
+   * @param {Object} [params] - Category specific parameters (threshold, threshold_percent, buffer_meters, days_back;
+   *   anchor: an ISO date to analyse the windows ending then instead of now;
+   *   pixel_budget: pixels per reduction before the scale is coarsened (default GEE_PIXEL_BUDGET, 1e7);
+   *   SENTINEL2_FUSED takes { categories: { DEFORESTATION: {...}, COASTAL_EROSION: {...}, GLACIER: {...} } };
+   *   PREFLIGHT takes { categories: [...] } and returns scene counts and coverage per analysis window;
+   *   DEFORESTATION, FLOODING, GLACIER and COASTAL_EROSION take backend: "numpy" to run the math locally
+   *   on downloaded pixels, or on the window files in raster_dir; the same four take mode: "time_series"
+   *   with months (default 12) and an optional anchor date to get per-month stats instead of an alert check)
+   * @param {Object} [options] - Streaming options, see send()
+   * @returns {Promise<Object>} - Analysis results
+   */
+  runJob(category, regionGeoJson, regionId, params = {}, options = {}) {
+    return this.send(
+      {
+        ...params,
+        category,
+        geometry: regionGeoJson,
+        region_id: regionId,
+      },
+      options
+    );
+  }
+
+  /**
+   * Sends one multi-region job; the composite is computed once for all regions.
+   * Supported for DEFORESTATION, FLOODING, GLACIER and FIRE_PROTECTION
+   * (fire regions are matched locally against one global detection snapshot).
+   * @param {string} category - Canonical category
+   * @param {Array<Object>} regions - [{ region_id, geometry, ...per-region params }]
+   * @param {Object} [params] - Default parameters for regions that don't set their own
+   * @param {Object} [options] - Streaming options, see send(); with onEvent, each region's
+   *   result arrives as a "region_result" event as soon as it is ready
+   * @returns {Promise<Object>} - { status, results: [per-region analysis results] }
+   */
+  runBatch(category, regions, params = {}, options = {}) {
+    return this.send(
+      {
+        ...params,
+        category,
+        regions: regions.map((region) => stripEmpty({ ...region })),
+      },
+      options
+    );
+  }
+
+  /**
+   * Sends a job and resolves with its result line. Either option turns on streaming, so the
+   * worker reports progress events ({ event: "stage" | "stats" | "region_result", ... }).
+   * @param {Object} payload - Job fields
+   * @param {Object} [options]
+   * @param {Function} [options.onEvent] - Called with every progress event of the job
+   * @param {number} [options.stageTimeoutMs] - Rejects when the job goes this long without an
+   *   event. The worker still finishes the job; its late result is dropped.
+   * @returns {Promise<Object>}
+   */
+  send(payload, options = {}) {
+    if (!this.pythonProcess) {
+      return Promise.reject(
+        this.exitError || new Error("GEE worker is not running.")
+      );
+    }
+    const jobId = this.nextJobId++;
+    const { onEvent, stageTimeoutMs } = options;
+    const stream = Boolean(onEvent || stageTimeoutMs) || undefined;
+    const job = stripEmpty({ ...payload, stream, job_id: jobId });
+
+    return new Promise((resolve, reject) => {
+      let timer = null;
+      const armTimer = () => {
+        if (!stageTimeoutMs) return;
+        clearTimeout(timer);
+        timer = setTimeout(() => {
+          this.pending.delete(jobId);
+          reject(
+            new Error(
+              `GEE worker job ${jobId} sent no progress for ${stageTimeoutMs}ms.`
+            )
+          );
+        }, stageTimeoutMs);
+      };
+      this.pending.set(jobId, {
+        resolve: (message) => {
+          clearTimeout(timer);
+          resolve(message);
+        },
+        reject: (error) => {
+          clearTimeout(timer);
+          reject(error);
+        },
+        onEvent: (event) => {
+          armTimer();
+          if (!onEvent) return;
+          try {
+            onEvent(event);
+          } catch (handlerError) {
+            console.error("GEE worker event handler failed:", handlerError);
+          }
+        },
+      });
+      armTimer();
+      try {
+        this.pythonProcess.stdin.write(JSON.stringify(job) + "\n");
+      } catch (stdinError) {
+        this.pending.get(jobId).reject(
+          new Error(`Error writing to GEE worker stdin: ${stdinError.message}`)
+        );
+        this.pending.delete(jobId);
+      }
+    });
+  }
+
+  /**
+   * Closes the worker's stdin and waits for it to exit.
+   * @returns {Promise<void>}
+   */
+  stop() {
+    if (!this.pythonProcess) return Promise.resolve();
+    return new Promise((resolve) => {
+      this.pythonProcess.once("close", () => resolve());
+      this.pythonProcess.stdin.end();
+    });
+  }
+
+  rejectPending(error) {
+    for (const job of this.pending.values()) {
+      job.reject(error);
+    }
+    this.pending.clear();
+  }
+}
+
+function stripEmpty(object) {
+  Object.keys(object).forEach(
+    (key) =>
+      (object[key] === undefined || object[key] === null) && delete object[key]
+  );
+  return object;
+}
+
+export { GeeWorker };
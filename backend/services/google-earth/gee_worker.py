@@ -0,0 +1,359 @@
+import re
+import sys
+import json
+import time
+import traceback
+from pathlib import Path
+
+# Detector scripts live in per-category folders; make them importable as modules.
+SERVICES_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(SERVICES_DIR))
+for detector_dir in ['deforestation', 'flooding', 'glacier', 'coastal_erosion', 'fire', 'sentinel2_fused']:
+    sys.path.insert(0, str(SERVICES_DIR / detector_dir))
+
+from common.gee_init import initialize_gee
+from common.geometry import geojson_to_ee_geometry
+from common.result_cache import cached_run
+from common.ee_requests import request_stats
+from common.preflight import preflight_failure, preflight_report, missing_windows
+from common.raster import cached_windows, load_windows
+from common.time_series import check_time_series, series_key, DEFAULT_MONTHS
+from common.scale import pixel_budget
+from common.time_windows import resolve_anchor, anchored_at
+from common.tracing import trace_context, trace_span
+from common.progress import progress_to, stream_writer, write_json_line, emit_region_result
+import deforestation
+import flooding
+import glacier_melting
+import coastal_erosion
+import fire_protection
+import fire_snapshot
+import sentinel2_fused
+
+def with_preflight(category, module, ee_geometry, run, error_fields):
+    """Wraps a detector call so it is skipped when its windows have no usable imagery."""
+    return lambda: preflight_failure(category, module.preflight_windows(ee_geometry), error_fields) or run()
+
+def local_rasters_for(module, ee_geometry, params, effective_buffer):
+    """
+    Windows for the NumPy backend (params backend='numpy'): files in params['raster_dir'] when
+    given, otherwise downloaded once and kept, so other thresholds reuse them.
+    """
+    if params.get('raster_dir'):
+        return load_windows(params['raster_dir'], module.RASTER_WINDOWS)
+    key = module.raster_cache_key(params['geometry'], effective_buffer)
+    return cached_windows(key, module.RASTER_WINDOWS, lambda: module.local_rasters(ee_geometry))
+
+def time_series_for(category, module, ee_geometry, params, effective_buffer):
+    """
+    Monthly stats (params mode='time_series') for params['months'] months up to the month of
+    params['anchor'] (default: now), from the detector's monthly_stats.
+    """
+    key = series_key(category, params['geometry'], effective_buffer, DETECTORS[category][2])
+    result = check_time_series(
+        category, module.monthly_stats(ee_geometry), key, params.get('months', DEFAULT_MONTHS), params.get('anchor')
+    )
+    result['buffer_radius_meters'] = effective_buffer
+    return result
+
+def run_deforestation(ee_geometry, params, effective_buffer):
+    threshold = float(params.get('threshold', deforestation.DEFAULT_NDVI_DROP_THRESHOLD))
+    if params.get('mode') == 'time_series':
+        return time_series_for('DEFORESTATION', deforestation, ee_geometry, params, effective_buffer)
+    if params.get('backend') == 'numpy':
+        rasters = local_rasters_for(deforestation, ee_geometry, params, effective_buffer)
+        return deforestation.check_deforestation_local(rasters, threshold, effective_buffer)
+    key = deforestation.result_cache_key(params['geometry'], effective_buffer, threshold)
+    return cached_run(key, 'DEFORESTATION', with_preflight(
+        'DEFORESTATION', deforestation, ee_geometry,
+        lambda: deforestation.check_deforestation(ee_geometry, threshold, effective_buffer),
+        deforestation.error_fields(threshold, effective_buffer)
+    ))
+
+def run_flooding(ee_geometry, params, effective_buffer):
+    threshold_pct = float(params.get('threshold_percent', flooding.DEFAULT_FLOOD_ALERT_THRESHOLD_PERCENT))
+    if params.get('mode') == 'time_series':
+        return time_series_for('FLOODING', flooding, ee_geometry, params, effective_buffer)
+    if params.get('backend') == 'numpy':
+        rasters = local_rasters_for(flooding, ee_geometry, params, effective_buffer)
+        return flooding.check_flooding_local(rasters, threshold_pct, effective_buffer)
+    key = flooding.result_cache_key(params['geometry'], effective_buffer, threshold_pct)
+    return cached_run(key, 'FLOODING', with_preflight(
+        'FLOODING', flooding, ee_geometry,
+        lambda: flooding.check_flooding(ee_geometry, threshold_pct, effective_buffer),
+        flooding.error_fields(threshold_pct, effective_buffer)
+    ))
+
+def run_glacier(ee_geometry, params, effective_buffer):
+    threshold_pct = float(params.get('threshold_percent', glacier_melting.DEFAULT_GLACIER_ALERT_THRESHOLD_PERCENT))
+    if params.get('mode') == 'time_series':
+        return time_series_for('GLACIER', glacier_melting, ee_geometry, params, effective_buffer)
+    if params.get('backend') == 'numpy':
+        rasters = local_rasters_for(glacier_melting, ee_geometry, params, effective_buffer)
+        return glacier_melting.check_glacier_melting_local(rasters, threshold_pct, effective_buffer)
+    key = glacier_melting.result_cache_key(params['geometry'], effective_buffer, threshold_pct)
+    return cached_run(key, 'GLACIER', with_preflight(
+        'GLACIER', glacier_melting, ee_geometry,
+        lambda: glacier_melting.check_glacier_melting(ee_geometry, threshold_pct, effective_buffer),
+        glacier_melting.error_fields(threshold_pct, effective_buffer)
+    ))
+
+def run_coastal_erosion(ee_geometry, params, effective_buffer):
+    threshold = float(params.get('threshold', coastal_erosion.DEFAULT_SHORELINE_RETREAT_THRESHOLD))
+    if params.get('mode') == 'time_series':
+        return time_series_for('COASTAL_EROSION', coastal_erosion, ee_geometry, params, effective_buffer)
+    if params.get('backend') == 'numpy':
+        rasters = local_rasters_for(coastal_erosion, ee_geometry, params, effective_buffer)
+        return coastal_erosion.check_coastal_erosion_local(rasters, threshold, effective_buffer)
+    key = coastal_erosion.result_cache_key(params['geometry'], effective_buffer, threshold)
+    return cached_run(key, 'COASTAL_EROSION', with_preflight(
+        'COASTAL_EROSION', coastal_erosion, ee_geometry,
+        lambda: coastal_erosion.check_coastal_erosion(ee_geometry, threshold, effective_buffer),
+        coastal_erosion.error_fields(threshold, effective_buffer)
+    ))
+
+def run_fire_protection(ee_geometry, params, effective_buffer):
+    days_back = int(params.get('days_back', fire_protection.DEFAULT_DAYS_BACK))
+    watermark_key = None
+    if params.get('incremental') and not params.get('anchor'):
+        watermark_key = fire_protection.fire_watermark_key(params['geometry'], params.get('region_id', 'unknown_region'))
+    return fire_protection.detect_active_fires(
+        ee_geometry, days_back, watermark_key, bool(params.get('columnar')), bool(params.get('cluster'))
+    )
+
+def run_sentinel2_fused(ee_geometry, params, effective_buffer):
+    # params['categories'] maps DEFORESTATION / COASTAL_EROSION / GLACIER to their thresholds.
+    category_params = {
+        str(category).upper(): category_job or {}
+        for category, category_job in (params.get('categories') or {}).items()
+    }
+    unsupported = [category for category in category_params if category not in sentinel2_fused.FUSED_CATEGORIES]
+    if unsupported or not category_params:
+        return {"status": "error", "message": f"Fused mode supports {sentinel2_fused.FUSED_CATEGORIES}, got: {list(category_params)}"}
+    results = sentinel2_fused.run_sentinel2_fused(ee_geometry, params['geometry'], category_params, effective_buffer)
+    return {"status": "success", "results": results}
+
+# --- Detectors with a preflight_windows(region) description of their imagery windows ---
+PREFLIGHT_MODULES = {
+    'DEFORESTATION': deforestation,
+    'FLOODING': flooding,
+    'GLACIER': glacier_melting,
+    'COASTAL_EROSION': coastal_erosion,
+}
+
+def run_preflight(ee_geometry, params, effective_buffer):
+    # Availability for several detectors over one region in a single request; params['categories']
+    # lists them (default: all with a preflight).
+    categories = [str(category).upper() for category in (params.get('categories') or PREFLIGHT_MODULES)]
+    unsupported = [category for category in categories if category not in PREFLIGHT_MODULES]
+    if unsupported:
+        return {"status": "error", "message": f"Preflight supports {list(PREFLIGHT_MODULES)}, got: {unsupported}"}
+    report = preflight_report({
+        category: PREFLIGHT_MODULES[category].preflight_windows(ee_geometry) for category in categories
+    })
+    return {
+        "status": "success",
+        "report": report,
+        "missing": {category: missing_windows(windows) for category, windows in report.items()},
+    }
+
+# --- Category -> (runner, default point buffer, geometry simplification scale in meters) ---
+DETECTORS = {
+    'DEFORESTATION': (run_deforestation, deforestation.DEFAULT_POINT_BUFFER, deforestation.REDUCTION_SCALE),
+    'FLOODING': (run_flooding, flooding.DEFAULT_POINT_BUFFER, flooding.REDUCTION_SCALE_S1),
+    'GLACIER': (run_glacier, glacier_melting.DEFAULT_POINT_BUFFER, glacier_melting.REDUCTION_SCALE),
+    'COASTAL_EROSION': (run_coastal_erosion, coastal_erosion.DEFAULT_POINT_BUFFER, coastal_erosion.REDUCTION_SCALE),
+    'FIRE_PROTECTION': (run_fire_protection, fire_protection.DEFAULT_POINT_BUFFER, fire_protection.GEOMETRY_SCALE),
+    'SENTINEL2_FUSED': (run_sentinel2_fused, sentinel2_fused.DEFAULT_POINT_BUFFER, min(sentinel2_fused.CATEGORY_SCALE.values())),
+    'PREFLIGHT': (run_preflight, coastal_erosion.DEFAULT_POINT_BUFFER, coastal_erosion.REDUCTION_SCALE),
+}
+
+def run_deforestation_batch(regions, job):
+    threshold = float(job.get('threshold', deforestation.DEFAULT_NDVI_DROP_THRESHOLD))
+    for region in regions:
+        region['threshold'] = float(region['params'].get('threshold', threshold))
+    return deforestation.check_deforestation_batch(regions, threshold)
+
+def run_flooding_batch(regions, job):
+    threshold_pct = float(job.get('threshold_percent', flooding.DEFAULT_FLOOD_ALERT_THRESHOLD_PERCENT))
+    for region in regions:
+        region['threshold_percent'] = float(region['params'].get('threshold_percent', threshold_pct))
+    return flooding.check_flooding_batch(regions, threshold_pct)
+
+def run_glacier_batch(regions, job):
+    threshold_pct = float(job.get('threshold_percent', glacier_melting.DEFAULT_GLACIER_ALERT_THRESHOLD_PERCENT))
+    for region in regions:
+        region['threshold_percent'] = float(region['params'].get('threshold_percent', threshold_pct))
+    return glacier_melting.check_glacier_melting_batch(regions, threshold_pct)
+
+def run_fire_protection_batch(regions, job):
+    # Fire batches are answered from one downloaded snapshot instead of a query per region.
+    days_back = int(job.get('days_back', fire_protection.DEFAULT_DAYS_BACK))
+    for region in regions:
+        region['days_back'] = int(region['params'].get('days_back', days_back))
+    return fire_snapshot.check_fire_snapshot_batch(regions)
+
+# --- Categories that support multi-region jobs ({..., "regions": [...]}) ---
+BATCH_DETECTORS = {
+    'DEFORESTATION': run_deforestation_batch,
+    'FLOODING': run_flooding_batch,
+    'GLACIER': run_glacier_batch,
+    'FIRE_PROTECTION': run_fire_protection_batch,
+}
+
+def handle_batch_job(job, category, default_buffer, geometry_scale):
+    """
+    Runs a multi-region job. Each entry of job['regions'] carries its own geometry, region_id
+    and optional thresholds/buffer_meters; job-level thresholds are the defaults.
+    Returns {status, job_id, results: [per-region result, ...]}.
+    """
+    job_id = job.get('job_id')
+    results = []
+    regions = []
+    for entry in job['regions']:
+        region_id = str(entry.get('region_id', 'unknown_region'))
+        try:
+            buffer_radius = int(entry.get('buffer_meters') or job.get('buffer_meters') or default_buffer)
+            ee_geometry, effective_buffer = geojson_to_ee_geometry(entry['geometry'], buffer_radius, geometry_scale)
+        except Exception as e:
+            print(f"ERROR: GeoJSON convert fail for region {region_id} in job {job_id}: {e}", file=sys.stderr)
+            results.append({"status": "error", "message": f"GeoJSON Error: {e}", "region_id": region_id})
+            emit_region_result(region_id, results[-1])
+            continue
+        regions.append({
+            'region_id': region_id,
+            'geometry': ee_geometry,
+            'buffer_radius_meters': effective_buffer,
+            'params': entry,
+        })
+
+    print(f"Starting {category} batch job {job_id} for {len(regions)} regions...", file=sys.stderr)
+    start_time = time.time()
+    if regions:
+        try:
+            with trace_context(detector=category, job_id=job_id), trace_span('batch_job') as span:
+                span['region_count'] = len(regions)
+                results.extend(BATCH_DETECTORS[category](regions, job))
+        except Exception as e:
+            print(f"ERROR: Unexpected error in {category} batch job {job_id}: {e}", file=sys.stderr)
+            print(traceback.format_exc(), file=sys.stderr)
+            results.extend(
+                {"status": "error", "message": f"Python Script Error: {e}", "region_id": region['region_id']}
+                for region in regions
+            )
+    print(f"GEE analysis duration ({category} batch job {job_id}): {time.time() - start_time:.2f} seconds.", file=sys.stderr)
+    return {"status": "success", "job_id": job_id, "results": results}
+
+def handle_job(job):
+    """
+    Runs a single job dict ({job_id, category, geometry, region_id, ...thresholds})
+    and returns the detector's result dict, tagged with job_id and region_id.
+    Jobs carrying a 'regions' list are handed to the batch detectors instead. An 'anchor'
+    (ISO date) ends the analysis windows then instead of now; a 'pixel_budget' overrides
+    GEE_PIXEL_BUDGET for the job's reduction scale (common.scale).
+    """
+    job_id = job.get('job_id')
+    region_id = str(job.get('region_id', 'unknown_region'))
+    category = str(job.get('category', '')).upper()
+
+    detector = DETECTORS.get(category)
+    if detector is None:
+        return {"status": "error", "message": f"Unknown category: {category}", "job_id": job_id, "region_id": region_id}
+    runner, default_buffer, geometry_scale = detector
+    try:
+        anchor = resolve_anchor(job['anchor']) if job.get('anchor') else None
+    except (TypeError, ValueError) as e:
+        return {"status": "error", "message": f"Invalid anchor: {e}", "job_id": job_id, "region_id": region_id}
+    budget = job.get('pixel_budget')
+    try:
+        if budget is not None and not float(budget) > 0:
+            raise ValueError("must be positive")
+    except (TypeError, ValueError) as e:
+        return {"status": "error", "message": f"Invalid pixel_budget: {e}", "job_id": job_id, "region_id": region_id}
+
+    if 'regions' in job:
+        if category not in BATCH_DETECTORS:
+            return {"status": "error", "message": f"Batch mode not supported for category: {category}", "job_id": job_id}
+        with anchored_at(anchor), pixel_budget(budget):
+            return handle_batch_job(job, category, default_buffer, geometry_scale)
+
+    try:
+        if category == 'FIRE_PROTECTION':
+            buffer_radius = default_buffer
+        else:
+            buffer_radius = int(job.get('buffer_meters') or default_buffer)
+        ee_geometry, effective_buffer = geojson_to_ee_geometry(job['geometry'], buffer_radius, geometry_scale)
+    except Exception as e:
+        print(f"ERROR: GeoJSON convert fail for job {job_id}: {e}", file=sys.stderr)
+        return {"status": "error", "message": f"GeoJSON Error: {e}", "job_id": job_id, "region_id": region_id}
+    if category == 'FIRE_PROTECTION':
+        effective_buffer = None
+
+    print(f"Starting {category} job {job_id} for region: {region_id}...", file=sys.stderr)
+    start_time = time.time()
+    try:
+        with trace_context(detector=category, region_id=region_id, job_id=job_id), anchored_at(anchor), pixel_budget(budget), trace_span('job') as span:
+            result = runner(ee_geometry, job, effective_buffer)
+            span['status'] = result.get('status')
+    except Exception as e:
+        print(f"ERROR: Unexpected error in {category} job {job_id}: {e}", file=sys.stderr)
+        print(traceback.format_exc(), file=sys.stderr)
+        result = {"status": "error", "message": f"Python Script Error: {e}"}
+    print(f"GEE analysis duration ({category} job {job_id}): {time.time() - start_time:.2f} seconds.", file=sys.stderr)
+
+    result['job_id'] = job_id
+    result['region_id'] = region_id
+    return result
+
+# Finds the job_id of a line that isn't valid JSON, so its error still reaches the right caller
+JOB_ID_PATTERN = re.compile(r'"job_id"\s*:\s*(-?\d+|"(?:[^"\\]|\\.)*")')
+
+def salvage_job_id(line):
+    """The job_id field of a malformed job line when it can still be read, otherwise None."""
+    match = JOB_ID_PATTERN.search(line)
+    if match is None:
+        return None
+    try:
+        return json.loads(match.group(1))
+    except ValueError:
+        return None
+
+def serve(input_stream, output_stream):
+    """
+    Reads newline-delimited JSON jobs until EOF and writes one JSON result per line. Jobs with
+    "stream": true also get progress events (common.progress), tagged with their job_id,
+    ahead of their result line.
+    """
+    for line in input_stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            job = json.loads(line)
+            if not isinstance(job, dict):
+                raise ValueError("Job must be a JSON object.")
+        except ValueError as e:
+            print(f"ERROR: Invalid job line: {e}", file=sys.stderr)
+            result = {"status": "error", "message": f"Invalid Job JSON: {e}", "job_id": salvage_job_id(line)}
+        else:
+            emit = stream_writer(output_stream, job_id=job.get('job_id')) if job.get('stream') else None
+            with progress_to(emit):
+                result = handle_job(job)
+            print(f"EE request counters: {request_stats()}", file=sys.stderr)
+        write_json_line(output_stream, result)
+
+# --- Main Execution Block ---
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("ERROR: Missing credentials file path argument.", file=sys.stderr)
+        print(json.dumps({"status": "error", "message": "Missing credentials file path argument."}))
+        sys.exit(1)
+
+    if not initialize_gee(sys.argv[1]):
+        print(json.dumps({"status": "error", "message": "GEE initialization failed.", "job_id": None}))
+        sys.exit(1)
+
+    # Signals the parent process that jobs can now be accepted.
+    print(json.dumps({"status": "ready", "job_id": None}), flush=True)
+    serve(sys.stdin, sys.stdout)
+    print("Worker input closed, exiting.", file=sys.stderr)
@@ -1,12 +1,25 @@
 import sys
 import json
-import os
 import ee
-import datetime
 import time
 import traceback
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common.gee_init import initialize_gee
+from common.tracing import bind_trace_context
+from common.progress import bind_progress, emit_stats
+from common.scale import adaptive_scale, SCALE_PROPERTY
+from common.geometry import geojson_to_ee_geometry
+from common.result_cache import cache_key, analysis_window, cached_run
+from common.thumbnails import thumbnail_fields, submit_thumbnail_fields
+from common.ee_requests import run_concurrently, call_ee, evaluate
+from common.batch import build_region_collection, with_band_placeholder, reduce_regions_table, finish_region_results
+from common.time_windows import resolve_anchor, shift_years, window_ending_at, period_fields
+from common.preflight import window_availability, preflight_failure
+from common.raster import raster_grid, download_window, scene_count, masked_index, median_composite, pixel_area_km2, region_sum, raster_period_fields
+from common.sentinel2 import mask_s2_clouds
+
 # --- Configuration Constants ---
 DEFAULT_GLACIER_ALERT_THRESHOLD_PERCENT = 2.0  # Alert if > 2% glacier area loss
 
@@ -20,116 +33,158 @@ NDSI_GREEN_BAND = 'B3'
 NDSI_SWIR_BAND = 'B11'
 REDUCTION_SCALE = 30
 DEFAULT_POINT_BUFFER = 1000
-gcp_project_id = 'project-ultron-457221'
-
-def initialize_gee(credentials_path_arg):
-    global gcp_project_id
-    try:
-        credentials_path = credentials_path_arg
-        print(f"DEBUG: Received credentials path via argument: {credentials_path}", file=sys.stderr)
-        if not credentials_path or not os.path.exists(credentials_path):
-            print(f"ERROR: Credentials file not found or path empty: {credentials_path}", file=sys.stderr)
-            return False
-        print(f"Attempting GEE init with key: {credentials_path}", file=sys.stderr)
-        credentials = ee.ServiceAccountCredentials(None, key_file=credentials_path)
-        ee.Initialize(credentials=credentials, project=gcp_project_id, opt_url='https://earthengine-highvolume.googleapis.com')
-        print(f"GEE Initialized OK for project: {gcp_project_id}.", file=sys.stderr)
-        return True
-    except ee.EEException as e:
-        print(f"ERROR: Failed GEE init: {e}", file=sys.stderr)
-        return False
-    except Exception as e:
-        print(f"ERROR: Unexpected GEE init error: {e}", file=sys.stderr)
-        print(traceback.format_exc(), file=sys.stderr)
-        return False
-
-def mask_s2_clouds(image):
-    scl = image.select('SCL')
-    mask = scl.neq(3).And(scl.neq(8)).And(scl.neq(9)).And(scl.neq(10)).And(scl.neq(11))
-    return image.updateMask(mask)
+RASTER_WINDOWS = ['baseline', 'recent']
 
 def calculate_ndsi(image):
     ndsi = image.normalizedDifference([NDSI_GREEN_BAND, NDSI_SWIR_BAND]).rename('NDSI')
     return image.addBands(ndsi).copyProperties(image, ['system:time_start'])
 
 def get_median_ndsi_image(s2_collection, start, end, region_geometry):
-    try:
-        filtered_collection = s2_collection.filterDate(start, end).filterBounds(region_geometry)
-        image_count = filtered_collection.size().getInfo()
-        print(f"DEBUG: Found {image_count} images for period {start.format('YYYY-MM-dd').getInfo()} to {end.format('YYYY-MM-dd').getInfo()}", file=sys.stderr)
-        if image_count == 0:
-            print(f"WARNING: No images found for period {start.format('YYYY-MM-dd').getInfo()} to {end.format('YYYY-MM-dd').getInfo()}", file=sys.stderr)
-            return None
-        ndsi_collection = filtered_collection.map(mask_s2_clouds).map(calculate_ndsi)
-        ndsi_only_collection = ndsi_collection.select(['NDSI'])
-        ndsi_median_img = ndsi_only_collection.median().clip(region_geometry)
-        bands = ndsi_median_img.bandNames().getInfo()
-        print(f"DEBUG: Bands of median NDSI image: {bands}", file=sys.stderr)
-        if not bands or 'NDSI' not in bands:
-            print("WARNING: No NDSI band in median composite", file=sys.stderr)
-            return None
-        return ndsi_median_img
-    except Exception as e:
-        print(f"ERROR in get_median_ndsi_image: {e}", file=sys.stderr)
-        print(traceback.format_exc(), file=sys.stderr)
-        return None
+    """Builds the median NDSI composite for a window. Returns (image, ee.Number scene count); nothing is evaluated here."""
+    filtered_collection = s2_collection.filterDate(start, end).filterBounds(region_geometry)
+    ndsi_collection = filtered_collection.map(mask_s2_clouds).map(calculate_ndsi)
+    ndsi_only_collection = ndsi_collection.select(['NDSI'])
+    ndsi_median_img = ndsi_only_collection.median().clip(region_geometry)
+    return ndsi_median_img, filtered_collection.size()
 
 def glacier_area_mask(image, ndsi_threshold=0.4):
     glacier = image.select('NDSI').gt(ndsi_threshold).rename('glacier')
     return glacier
 
+def summarize_ndsi_window(ndsi_img, image_count, region_geometry):
+    """
+    Server-side summary of one window: scene count, band names, glacier area and the scale it
+    was reduced at. The area is only computed when the window has scenes, so empty windows don't error.
+    """
+    pixel_area = ee.Image.pixelArea().divide(1e6).rename('area_km2')
+    scale = adaptive_scale(region_geometry, REDUCTION_SCALE)
+    area_stats = ee.Dictionary(glacier_area_mask(ndsi_img).multiply(pixel_area).reduceRegion(
+        reducer=ee.Reducer.sum(),
+        geometry=region_geometry,
+        scale=scale,
+        maxPixels=1e9,
+        bestEffort=True
+    ))
+    return ee.Dictionary({
+        'image_count': image_count,
+        'bands': ndsi_img.bandNames(),
+        'glacier_area_sqkm': ee.Algorithms.If(ee.Number(image_count).gt(0), area_stats.get('glacier', None), None),
+        SCALE_PROPERTY: scale,
+    })
+
 def get_ndsi_image_url(image, region_geometry, vis_params, label):
     try:
-        url = image.getThumbURL({
+        url = call_ee(lambda: image.getThumbURL({
             'min': vis_params.get('min', -1),
             'max': vis_params.get('max', 1),
             'dimensions': vis_params.get('dimensions', 512),
             'palette': vis_params.get('palette', ['black', 'white', 'lightblue']),
             'region': region_geometry
-        })
+        }), 'getThumbURL', image)
         return url
     except Exception as e:
         print(f"WARNING: Could not get {label} glacier image URL: {e}", file=sys.stderr)
         return None
 
-def try_alternative_baseline(s2_collection, region_geometry, end_date_recent):
+def baseline_candidates(end_recent):
+    """[(year_offset, start, end)] for every fallback baseline window, in BASELINE_FALLBACK_YEARS order."""
+    return [
+        (year_offset, *window_ending_at(shift_years(end_recent, -year_offset), BASELINE_PERIOD_DURATION_DAYS))
+        for year_offset in BASELINE_FALLBACK_YEARS
+    ]
+
+def candidate_scene_counts(s2_collection, candidates):
+    """ee.List of scene counts, one per candidate window, from a single mapped expression."""
+    windows = ee.List([ee.List([ee.Date(start), ee.Date(end)]) for _, start, end in candidates])
+    return windows.map(lambda window: s2_collection.filterDate(ee.List(window).get(0), ee.List(window).get(1)).size())
+
+def try_alternative_baseline(s2_collection, region_geometry, end_recent, scene_counts=None):
+    """
+    Picks the first fallback baseline with scenes and summarizes it. scene_counts (one per
+    candidate) can come along with an earlier request; otherwise all candidates are counted in
+    one call. Returns (image, summary, start, end), or Nones when no candidate has data.
+    """
     print("Attempting to find alternative baseline period with sufficient data...", file=sys.stderr)
-    for year_offset in BASELINE_FALLBACK_YEARS:
+    candidates = baseline_candidates(end_recent)
+    if scene_counts is None:
+        scene_counts = evaluate(candidate_scene_counts(s2_collection, candidates))
+    print(f"Alternative baseline scene counts: {dict(zip(BASELINE_FALLBACK_YEARS, scene_counts))}", file=sys.stderr)
+    for (year_offset, start_alt, end_alt), scene_count in zip(candidates, scene_counts):
+        if not scene_count:
+            continue
+        print(f"Using alternate baseline {year_offset} years ago: {start_alt:%Y-%m-%d} to {end_alt:%Y-%m-%d}", file=sys.stderr)
+        alt_ndsi_img, alt_count = get_median_ndsi_image(s2_collection, ee.Date(start_alt), ee.Date(end_alt), region_geometry)
         try:
-            end_date_alt = end_date_recent.advance(-year_offset, 'year')
-            start_date_alt = end_date_alt.advance(-BASELINE_PERIOD_DURATION_DAYS, 'day')
-            print(f"Trying alternate baseline: {start_date_alt.format('YYYY-MM-dd').getInfo()} to {end_date_alt.format('YYYY-MM-dd').getInfo()}", file=sys.stderr)
-            alt_ndsi_img = get_median_ndsi_image(s2_collection, start_date_alt, end_date_alt, region_geometry)
-            if alt_ndsi_img is not None and 'NDSI' in alt_ndsi_img.bandNames().getInfo():
-                print(f"Found valid alternative baseline {year_offset} years ago.", file=sys.stderr)
-                return alt_ndsi_img, start_date_alt, end_date_alt
-        except Exception as e:
+            alt_summary = evaluate(summarize_ndsi_window(alt_ndsi_img, alt_count, region_geometry))
+        except ee.EEException as e:
             print(f"Error trying alternative baseline {year_offset} years ago: {e}", file=sys.stderr)
             continue
+        if alt_summary.get('image_count') and 'NDSI' in (alt_summary.get('bands') or []):
+            return alt_ndsi_img, alt_summary, start_alt, end_alt
     print("All alternative baseline periods failed.", file=sys.stderr)
-    return None, None, None
+    return None, None, None, None
+
+def result_cache_key(geojson_geometry, buffer_radius, threshold_percent):
+    return cache_key(
+        'GLACIER', geojson_geometry, buffer_radius, {'threshold_percent': threshold_percent},
+        REDUCTION_SCALE, analysis_window(RECENT_PERIOD_DAYS, BASELINE_PERIOD_YEARS_AGO, BASELINE_PERIOD_DURATION_DAYS)
+    )
+
+def error_fields(threshold_percent, buffer_radius_meters):
+    """The detector-specific fields of an error result (values unknown), e.g. for preflight_failure."""
+    return {
+        "baseline_area_sqkm": None,
+        "recent_area_sqkm": None,
+        "loss_percent": None,
+        "threshold_percent": threshold_percent,
+        "buffer_radius_meters": buffer_radius_meters,
+    }
+
+def preflight_windows(region_geometry):
+    """
+    Availability of the recent NDSI window (see common.preflight). The baseline is left out:
+    when it is empty check_glacier_melting searches the fallback years itself.
+    """
+    start_recent, end_recent = window_ending_at(resolve_anchor(), RECENT_PERIOD_DAYS)
+    s2_collection = ee.ImageCollection(S2_COLLECTION).filterBounds(region_geometry)
+    return {
+        'recent': window_availability(s2_collection, start_recent, end_recent, region_geometry, mask_s2_clouds),
+    }
+
+def monthly_stats(region_geometry):
+    """Per-month scene count and glacier area, as a server-side function of the month's start (see common.time_series)."""
+    s2_collection = ee.ImageCollection(S2_COLLECTION).filterBounds(region_geometry)
+
+    def month_stats(start):
+        ndsi_img, image_count = get_median_ndsi_image(s2_collection, start, start.advance(1, 'month'), region_geometry)
+        return summarize_ndsi_window(ndsi_img, image_count, region_geometry).remove(['bands'])
+    return month_stats
 
 def check_glacier_melting(region_geometry, threshold_percent, buffer_radius_meters):
     try:
-        from datetime import timezone
-        end_date_recent = ee.Date(datetime.datetime.now(timezone.utc))
-        start_date_recent = end_date_recent.advance(-RECENT_PERIOD_DAYS, 'day')
-        end_date_baseline = end_date_recent.advance(-BASELINE_PERIOD_YEARS_AGO, 'year')
-        start_date_baseline = end_date_baseline.advance(-BASELINE_PERIOD_DURATION_DAYS, 'day')
-
-        try:
-            start_date_baseline_str = start_date_baseline.format('YYYY-MM-dd').getInfo()
-            end_date_baseline_str = end_date_baseline.format('YYYY-MM-dd').getInfo()
-            start_date_recent_str = start_date_recent.format('YYYY-MM-dd').getInfo()
-            end_date_recent_str = end_date_recent.format('YYYY-MM-dd').getInfo()
-            print(f"Analysis Periods: Baseline {start_date_baseline_str} -> {end_date_baseline_str}", file=sys.stderr)
-            print(f"                  Recent   {start_date_recent_str} -> {end_date_recent_str}", file=sys.stderr)
-        except Exception as date_error:
-            print(f"WARNING: Unable to format date strings for logging: {date_error}", file=sys.stderr)
+        start_recent, end_recent = window_ending_at(resolve_anchor(), RECENT_PERIOD_DAYS)
+        start_baseline, end_baseline = window_ending_at(shift_years(end_recent, -BASELINE_PERIOD_YEARS_AGO), BASELINE_PERIOD_DURATION_DAYS)
+        print(f"Analysis Periods: Baseline {start_baseline:%Y-%m-%d} -> {end_baseline:%Y-%m-%d}", file=sys.stderr)
+        print(f"                  Recent   {start_recent:%Y-%m-%d} -> {end_recent:%Y-%m-%d}", file=sys.stderr)
 
         s2_collection = ee.ImageCollection(S2_COLLECTION).filterBounds(region_geometry)
-        recent_ndsi_img = get_median_ndsi_image(s2_collection, start_date_recent, end_date_recent, region_geometry)
-        if recent_ndsi_img is None:
+        recent_ndsi_img, recent_count = get_median_ndsi_image(s2_collection, ee.Date(start_recent), ee.Date(end_recent), region_geometry)
+        baseline_ndsi_img, baseline_count = get_median_ndsi_image(s2_collection, ee.Date(start_baseline), ee.Date(end_baseline), region_geometry)
+
+        # Scene counts, band presence and glacier areas for both windows in a single request,
+        # plus the fallback baselines' scene counts when the primary baseline turns out empty
+        summary = evaluate(ee.Dictionary({
+            'recent': summarize_ndsi_window(recent_ndsi_img, recent_count, region_geometry),
+            'baseline': summarize_ndsi_window(baseline_ndsi_img, baseline_count, region_geometry),
+            'fallback_counts': ee.Algorithms.If(
+                baseline_count.gt(0), None, candidate_scene_counts(s2_collection, baseline_candidates(end_recent))
+            ),
+        }))
+        recent_summary = summary['recent']
+        baseline_summary = summary['baseline']
+        print(f"Scene counts: Baseline {baseline_summary.get('image_count')}, Recent {recent_summary.get('image_count')}", file=sys.stderr)
+
+        if not recent_summary.get('image_count'):
             error_message = "No cloud-free data available for recent period. Cannot perform analysis."
             print(f"ERROR: {error_message}", file=sys.stderr)
             return {
@@ -144,11 +199,10 @@ def check_glacier_melting(region_geometry, threshold_percent, buffer_radius_mete
                 "start_image_url": None,
                 "end_image_url": None
             }
-        baseline_ndsi_img = get_median_ndsi_image(s2_collection, start_date_baseline, end_date_baseline, region_geometry)
-        if baseline_ndsi_img is None:
+        if not baseline_summary.get('image_count'):
             print("Primary baseline period has no data, trying alternatives...", file=sys.stderr)
-            baseline_ndsi_img, start_date_baseline, end_date_baseline = try_alternative_baseline(
-                s2_collection, region_geometry, end_date_recent
+            baseline_ndsi_img, baseline_summary, start_baseline, end_baseline = try_alternative_baseline(
+                s2_collection, region_geometry, end_recent, summary.get('fallback_counts')
             )
             if baseline_ndsi_img is None:
                 error_message = "No cloud-free data available for any baseline period. Cannot perform analysis."
@@ -166,8 +220,8 @@ def check_glacier_melting(region_geometry, threshold_percent, buffer_radius_mete
                     "end_image_url": None
                 }
 
-        baseline_bands = baseline_ndsi_img.bandNames().getInfo()
-        recent_bands = recent_ndsi_img.bandNames().getInfo()
+        baseline_bands = baseline_summary.get('bands')
+        recent_bands = recent_summary.get('bands')
         print("DEBUG: Bands of baseline_ndsi_img:", baseline_bands, file=sys.stderr)
         print("DEBUG: Bands of recent_ndsi_img:", recent_bands, file=sys.stderr)
 
@@ -202,77 +256,26 @@ def check_glacier_melting(region_geometry, threshold_percent, buffer_radius_mete
                 "end_image_url": None
             }
 
-        baseline_glacier_mask = glacier_area_mask(baseline_ndsi_img)
-        recent_glacier_mask = glacier_area_mask(recent_ndsi_img)
-
-        print("DEBUG: baseline_glacier_mask type:", type(baseline_glacier_mask), file=sys.stderr)
-        print("DEBUG: recent_glacier_mask type:", type(recent_glacier_mask), file=sys.stderr)
+        baseline_area = baseline_summary.get('glacier_area_sqkm')
+        if baseline_area is None:
+            baseline_area = 0.0
+        recent_area = recent_summary.get('glacier_area_sqkm')
+        if recent_area is None:
+            recent_area = 0.0
+        error_message = None
 
-        pixel_area = ee.Image.pixelArea().divide(1e6).rename('area_km2')
+        if baseline_area > 0:
+            loss_percent = (baseline_area - recent_area) / baseline_area * 100
+        else:
+            loss_percent = 0.0
 
-        baseline_area_stats = baseline_glacier_mask.multiply(pixel_area).reduceRegion(
-            reducer=ee.Reducer.sum(),
-            geometry=region_geometry,
-            scale=REDUCTION_SCALE,
-            maxPixels=1e9,
-            bestEffort=True
-        )
-        recent_area_stats = recent_glacier_mask.multiply(pixel_area).reduceRegion(
-            reducer=ee.Reducer.sum(),
-            geometry=region_geometry,
-            scale=REDUCTION_SCALE,
-            maxPixels=1e9,
-            bestEffort=True
-        )
+        alert_triggered = loss_percent > threshold_percent
 
-        baseline_area = None
-        recent_area = None
-        loss_percent = 0.0
-        alert_triggered = False
-        error_message = None
-        try:
-            baseline_result = baseline_area_stats.get('glacier')
-            if baseline_result is not None:
-                baseline_area = baseline_result.getInfo()
-                if baseline_area is None:
-                    baseline_area = 0.0
-            else:
-                baseline_area = 0.0
-
-            recent_result = recent_area_stats.get('glacier')
-            if recent_result is not None:
-                recent_area = recent_result.getInfo()
-                if recent_area is None:
-                    recent_area = 0.0
-            else:
-                recent_area = 0.0
-
-            if baseline_area > 0:
-                loss_percent = (baseline_area - recent_area) / baseline_area * 100
-            else:
-                loss_percent = 0.0
-
-            alert_triggered = loss_percent > threshold_percent
-
-            print(f"Baseline Glacier Area: {baseline_area:.4f} sqkm", file=sys.stderr)
-            print(f"Recent Glacier Area: {recent_area:.4f} sqkm", file=sys.stderr)
-            print(f"Loss Percentage: {loss_percent:.2f}%", file=sys.stderr)
-            print(f"Alert Triggered (>{threshold_percent}%): {alert_triggered}", file=sys.stderr)
-        except Exception as reduce_error:
-            print(f"ERROR: Failed during reduceRegion getInfo(): {reduce_error}", file=sys.stderr)
-            print(traceback.format_exc(), file=sys.stderr)
-            return {
-                "status": "error",
-                "message": f"Failed to retrieve area statistics: {reduce_error}. Check region geometry and date ranges.",
-                "alert_triggered": False,
-                "baseline_area_sqkm": None,
-                "recent_area_sqkm": None,
-                "loss_percent": None,
-                "threshold_percent": threshold_percent,
-                "buffer_radius_meters": buffer_radius_meters,
-                "start_image_url": None,
-                "end_image_url": None
-            }
+        print(f"Baseline Glacier Area: {baseline_area:.4f} sqkm", file=sys.stderr)
+        print(f"Recent Glacier Area: {recent_area:.4f} sqkm", file=sys.stderr)
+        print(f"Loss Percentage: {loss_percent:.2f}%", file=sys.stderr)
+        emit_stats(baseline_area_sqkm=baseline_area, recent_area_sqkm=recent_area, loss_percent=loss_percent)
+        print(f"Alert Triggered (>{threshold_percent}%): {alert_triggered}", file=sys.stderr)
 
         vis_params = {
             'min': -1,
@@ -280,18 +283,12 @@ def check_glacier_melting(region_geometry, threshold_percent, buffer_radius_mete
             'palette': ['black', 'white', 'lightblue'],
             'dimensions': 512
         }
-        start_image_url = get_ndsi_image_url(baseline_ndsi_img, region_geometry, vis_params, "before")
-        end_image_url = get_ndsi_image_url(recent_ndsi_img, region_geometry, vis_params, "after")
+        thumbnails = thumbnail_fields(get_ndsi_image_url, baseline_ndsi_img, recent_ndsi_img, region_geometry, vis_params)
 
-        try:
-            response_dates = {
-                "recent_period_start": start_date_recent.format('YYYY-MM-dd').getInfo(),
-                "recent_period_end": end_date_recent.format('YYYY-MM-dd').getInfo(),
-                "baseline_period_start": start_date_baseline.format('YYYY-MM-dd').getInfo(),
-                "baseline_period_end": end_date_baseline.format('YYYY-MM-dd').getInfo(),
-            }
-        except Exception:
-            response_dates = {}
+        response_dates = {
+            **period_fields('recent', start_recent, end_recent),
+            **period_fields('baseline', start_baseline, end_baseline),
+        }
 
         if error_message:
             return {
@@ -304,8 +301,7 @@ def check_glacier_melting(region_geometry, threshold_percent, buffer_radius_mete
                 "threshold_percent": threshold_percent,
                 **response_dates,
                 "buffer_radius_meters": buffer_radius_meters,
-                "start_image_url": start_image_url,
-                "end_image_url": end_image_url
+                **thumbnails
             }
 
         return {
@@ -317,8 +313,8 @@ def check_glacier_melting(region_geometry, threshold_percent, buffer_radius_mete
             "threshold_percent": threshold_percent,
             **response_dates,
             "buffer_radius_meters": buffer_radius_meters,
-            "start_image_url": start_image_url,
-            "end_image_url": end_image_url
+            SCALE_PROPERTY: recent_summary.get(SCALE_PROPERTY),
+            **thumbnails
         }
 
     except ee.EEException as gee_error:
@@ -353,6 +349,195 @@ def check_glacier_melting(region_geometry, threshold_percent, buffer_radius_mete
             "end_image_url": None
         }
 
+def check_glacier_melting_batch(regions, threshold_percent):
+    """
+    Batch variant of check_glacier_melting for many regions sharing one time window.
+    regions: [{'region_id', 'geometry' (ee.Geometry), optional 'threshold_percent', optional 'buffer_radius_meters'}].
+    NDSI composites are built once over the union footprint and glacier areas plus valid pixel
+    counts for every region come back from a single reduceRegions call. Regions whose primary
+    baseline has no cloud-free pixels fall back to check_glacier_melting for the alternative
+    baseline search. Thumbnails are only generated for alerts.
+    """
+    try:
+        start_recent, end_recent = window_ending_at(resolve_anchor(), RECENT_PERIOD_DAYS)
+        start_baseline, end_baseline = window_ending_at(shift_years(end_recent, -BASELINE_PERIOD_YEARS_AGO), BASELINE_PERIOD_DURATION_DAYS)
+        response_dates = {
+            **period_fields('recent', start_recent, end_recent),
+            **period_fields('baseline', start_baseline, end_baseline),
+        }
+        print(f"Batch of {len(regions)} regions, Analysis Periods: Baseline {response_dates['baseline_period_start']} -> {response_dates['baseline_period_end']}, Recent {response_dates['recent_period_start']} -> {response_dates['recent_period_end']}", file=sys.stderr)
+
+        region_collection = build_region_collection(regions)
+        s2_collection = ee.ImageCollection(S2_COLLECTION).filterBounds(region_collection)
+        recent_ndsi_img = with_band_placeholder(
+            s2_collection.filterDate(ee.Date(start_recent), ee.Date(end_recent)).map(mask_s2_clouds).map(calculate_ndsi).select(['NDSI']), ['NDSI']
+        ).median()
+        baseline_ndsi_img = with_band_placeholder(
+            s2_collection.filterDate(ee.Date(start_baseline), ee.Date(end_baseline)).map(mask_s2_clouds).map(calculate_ndsi).select(['NDSI']), ['NDSI']
+        ).median()
+
+        pixel_area = ee.Image.pixelArea().divide(1e6).rename('area_km2')
+        area_stack = (glacier_area_mask(baseline_ndsi_img).multiply(pixel_area).rename('baseline_area')
+                      .addBands(glacier_area_mask(recent_ndsi_img).multiply(pixel_area).rename('recent_area'))
+                      .addBands(baseline_ndsi_img.mask().rename('baseline_valid'))
+                      .addBands(recent_ndsi_img.mask().rename('recent_valid')))
+        area_table = reduce_regions_table(
+            area_stack, region_collection, ee.Reducer.sum(), REDUCTION_SCALE,
+            ['baseline_area', 'recent_area', 'baseline_valid', 'recent_valid']
+        )
+    except ee.EEException as gee_error:
+        print(f"ERROR: GEE batch computation failed: {gee_error}", file=sys.stderr)
+        return [{
+            "status": "error",
+            "message": f"GEE Computation Error: {str(gee_error)}",
+            "alert_triggered": False,
+            "baseline_area_sqkm": None,
+            "recent_area_sqkm": None,
+            "loss_percent": None,
+            "threshold_percent": region.get('threshold_percent', threshold_percent),
+            "buffer_radius_meters": region.get('buffer_radius_meters'),
+            "start_image_url": None,
+            "end_image_url": None,
+            "region_id": str(region['region_id'])
+        } for region in regions]
+
+    vis_params = {
+        'min': -1,
+        'max': 1,
+        'palette': ['black', 'white', 'lightblue'],
+        'dimensions': 512
+    }
+    results = []
+    thumbnail_requests = {}
+    for region in regions:
+        region_id = str(region['region_id'])
+        region_threshold = region.get('threshold_percent', threshold_percent)
+        buffer_radius_meters = region.get('buffer_radius_meters')
+        stats = area_table.get(region_id, {})
+
+        if not stats.get('recent_valid'):
+            error_message = "No cloud-free data available for recent period. Cannot perform analysis."
+            print(f"ERROR: {error_message} (region {region_id})", file=sys.stderr)
+            results.append({
+                "status": "error",
+                "message": error_message,
+                "alert_triggered": False,
+                "baseline_area_sqkm": None,
+                "recent_area_sqkm": None,
+                "loss_percent": None,
+                "threshold_percent": region_threshold,
+                "buffer_radius_meters": buffer_radius_meters,
+                "start_image_url": None,
+                "end_image_url": None,
+                "region_id": region_id
+            })
+            continue
+        if not stats.get('baseline_valid'):
+            print(f"Primary baseline has no data for region {region_id}, running single-region check with fallbacks...", file=sys.stderr)
+            result = check_glacier_melting(region['geometry'], region_threshold, buffer_radius_meters)
+            result['region_id'] = region_id
+            results.append(result)
+            continue
+
+        baseline_area = stats.get('baseline_area') or 0.0
+        recent_area = stats.get('recent_area') or 0.0
+        loss_percent = (baseline_area - recent_area) / baseline_area * 100 if baseline_area > 0 else 0.0
+        alert_triggered = loss_percent > region_threshold
+        thumbnails = {"start_image_url": None, "end_image_url": None}
+        if alert_triggered:
+            region_geometry = region['geometry']
+            # Rendered concurrently across alerting regions and filled in below
+            thumbnail_requests[len(results)] = submit_thumbnail_fields(get_ndsi_image_url, baseline_ndsi_img.clip(region_geometry), recent_ndsi_img.clip(region_geometry), region_geometry, vis_params)
+        results.append({
+            "status": "success",
+            "alert_triggered": alert_triggered,
+            "baseline_area_sqkm": baseline_area,
+            "recent_area_sqkm": recent_area,
+            "loss_percent": loss_percent,
+            "threshold_percent": region_threshold,
+            **response_dates,
+            "buffer_radius_meters": buffer_radius_meters,
+            SCALE_PROPERTY: stats.get(SCALE_PROPERTY),
+            **thumbnails,
+            "region_id": region_id
+        })
+    return finish_region_results(results, thumbnail_requests)
+
+def raster_cache_key(geojson_geometry, buffer_radius):
+    """Key for the downloaded windows; thresholds are left out so every threshold reuses them."""
+    return cache_key(
+        'GLACIER', geojson_geometry, buffer_radius, {},
+        REDUCTION_SCALE, analysis_window(RECENT_PERIOD_DAYS, BASELINE_PERIOD_YEARS_AGO, BASELINE_PERIOD_DURATION_DAYS)
+    )
+
+def local_rasters(region_geometry):
+    """
+    Raw green, SWIR and SCL stacks of both windows on one grid, for check_glacier_melting_local.
+    An empty baseline is replaced by the first fallback year with scenes, as in the EE path.
+    """
+    start_recent, end_recent = window_ending_at(resolve_anchor(), RECENT_PERIOD_DAYS)
+    start_baseline, end_baseline = window_ending_at(shift_years(end_recent, -BASELINE_PERIOD_YEARS_AGO), BASELINE_PERIOD_DURATION_DAYS)
+    s2_collection = ee.ImageCollection(S2_COLLECTION).filterBounds(region_geometry)
+    grid = raster_grid(region_geometry, REDUCTION_SCALE, s2_collection, [(start_recent, end_recent), (start_baseline, end_baseline)])
+    band_names = [NDSI_GREEN_BAND, NDSI_SWIR_BAND, 'SCL']
+    rasters = run_concurrently({
+        'recent': lambda: download_window(s2_collection, start_recent, end_recent, band_names, region_geometry, grid),
+        'baseline': lambda: download_window(s2_collection, start_baseline, end_baseline, band_names, region_geometry, grid),
+    })
+    if not scene_count(rasters['recent']) or scene_count(rasters['baseline']):
+        return rasters
+    candidates = baseline_candidates(end_recent)
+    scene_counts = evaluate(candidate_scene_counts(s2_collection, candidates))
+    for (year_offset, start_alt, end_alt), count in zip(candidates, scene_counts):
+        if count:
+            print(f"Using alternate baseline {year_offset} years ago: {start_alt:%Y-%m-%d} to {end_alt:%Y-%m-%d}", file=sys.stderr)
+            rasters['baseline'] = download_window(s2_collection, start_alt, end_alt, band_names, region_geometry, grid, count)
+            break
+    return rasters
+
+def glacier_area_sqkm(raster, ndsi_threshold=0.4):
+    """Local summarize_ndsi_window: area of median NDSI above ndsi_threshold inside the region."""
+    ndsi = median_composite(masked_index(raster, NDSI_GREEN_BAND, NDSI_SWIR_BAND))
+    return region_sum((ndsi > ndsi_threshold) * pixel_area_km2(raster), raster['region'])
+
+def check_glacier_melting_local(rasters, threshold_percent, buffer_radius_meters):
+    """
+    check_glacier_melting on local rasters ({'baseline', 'recent'}, see common.raster) with NumPy.
+    Same result fields; there are no thumbnails.
+    """
+    for label, raster in (('recent', rasters['recent']), ('any baseline', rasters['baseline'])):
+        if not scene_count(raster):
+            return {
+                "status": "error",
+                "message": f"No cloud-free data available for {label} period. Cannot perform analysis.",
+                "alert_triggered": False,
+                "baseline_area_sqkm": None,
+                "recent_area_sqkm": None,
+                "loss_percent": None,
+                "threshold_percent": threshold_percent,
+                "buffer_radius_meters": buffer_radius_meters,
+                "start_image_url": None,
+                "end_image_url": None
+            }
+    baseline_area = glacier_area_sqkm(rasters['baseline'])
+    recent_area = glacier_area_sqkm(rasters['recent'])
+    loss_percent = (baseline_area - recent_area) / baseline_area * 100 if baseline_area > 0 else 0.0
+    print(f"Glacier Area (local): Baseline {baseline_area:.4f} sqkm, Recent {recent_area:.4f} sqkm, Loss {loss_percent:.2f}%", file=sys.stderr)
+    return {
+        "status": "success",
+        "alert_triggered": loss_percent > threshold_percent,
+        "baseline_area_sqkm": baseline_area,
+        "recent_area_sqkm": recent_area,
+        "loss_percent": loss_percent,
+        "threshold_percent": threshold_percent,
+        **raster_period_fields('recent', rasters['recent']),
+        **raster_period_fields('baseline', rasters['baseline']),
+        "buffer_radius_meters": buffer_radius_meters,
+        "start_image_url": None,
+        "end_image_url": None,
+        "backend": "numpy"
+    }
+
 if __name__ == "__main__":
     if len(sys.argv) < 2:
         print("ERROR: Missing credentials file path argument.", file=sys.stderr)
@@ -383,49 +568,38 @@ if __name__ == "__main__":
         print(json.dumps({"status": "error", "message": f"Unexpected error processing input: {e}", "region_id": region_id}))
         sys.exit(1)
 
-    if not initialize_gee(credentials_path_from_arg):
-        print(json.dumps({"status": "error", "message": "GEE initialization failed.", "region_id": region_id}))
-        sys.exit(1)
-
-    ee_geometry = None
-    effective_buffer = None
-    try:
-        geom_type = geojson_geometry.get('type')
-        coords = geojson_geometry.get('coordinates')
-        if not geom_type or not coords:
-            raise ValueError("Invalid GeoJSON structure: Missing 'type' or 'coordinates'.")
-
-        if geom_type == 'Polygon':
-            ee_geometry = ee.Geometry.Polygon(coords)
-        elif geom_type == 'MultiPolygon':
-            ee_geometry = ee.Geometry.MultiPolygon(coords)
-        elif geom_type == 'Point':
-            if not isinstance(coords, list) or len(coords) != 2:
-                raise ValueError("Invalid Point coordinates.")
-            ee_geometry = ee.Geometry.Point(coords).buffer(buffer_radius)
-            effective_buffer = buffer_radius
-        else:
-            raise ValueError(f"Unsupported geometry type: {geom_type}")
+    result_key = result_cache_key(geojson_geometry, buffer_radius, threshold_pct)
+    bind_trace_context(detector='GLACIER', region_id=region_id)
+    if input_params.get('stream'):
+        bind_progress(sys.stdout, region_id=region_id)
 
-    except ValueError as e:
-        print(f"ERROR: Invalid GeoJSON geometry: {e}", file=sys.stderr)
-        print(json.dumps({"status": "error", "message": f"Invalid GeoJSON Geometry: {e}", "region_id": region_id}))
-        sys.exit(1)
-    except ee.EEException as e:
-        print(f"ERROR: GEE error processing geometry: {e}", file=sys.stderr)
-        print(json.dumps({"status": "error", "message": f"GEE error processing geometry: {e}", "region_id": region_id}))
-        sys.exit(1)
-    except Exception as e:
-        print(f"ERROR: Unexpected error converting GeoJSON: {e}", file=sys.stderr)
-        print(traceback.format_exc(), file=sys.stderr)
-        print(json.dumps({"status": "error", "message": f"Unexpected GeoJSON Conversion Error: {e}", "region_id": region_id}))
-        sys.exit(1)
+    def run_analysis():
+        if not initialize_gee(credentials_path_from_arg):
+            return {"status": "error", "message": "GEE initialization failed."}
 
-    print(f"Starting GEE glacier melting analysis for region: {region_id}...", file=sys.stderr)
-    start_time = time.time()
-    analysis_result = check_glacier_melting(ee_geometry, threshold_pct, effective_buffer)
-    end_time = time.time()
-    print(f"GEE analysis duration: {end_time - start_time:.2f} seconds.", file=sys.stderr)
+        try:
+            ee_geometry, effective_buffer = geojson_to_ee_geometry(geojson_geometry, buffer_radius, REDUCTION_SCALE)
+        except ValueError as e:
+            print(f"ERROR: Invalid GeoJSON geometry: {e}", file=sys.stderr)
+            return {"status": "error", "message": f"Invalid GeoJSON Geometry: {e}"}
+        except ee.EEException as e:
+            print(f"ERROR: GEE error processing geometry: {e}", file=sys.stderr)
+            return {"status": "error", "message": f"GEE error processing geometry: {e}"}
+        except Exception as e:
+            print(f"ERROR: Unexpected error converting GeoJSON: {e}", file=sys.stderr)
+            print(traceback.format_exc(), file=sys.stderr)
+            return {"status": "error", "message": f"Unexpected GeoJSON Conversion Error: {e}"}
+
+        print(f"Starting GEE glacier melting analysis for region: {region_id}...", file=sys.stderr)
+        start_time = time.time()
+        analysis_result = preflight_failure('GLACIER', preflight_windows(ee_geometry), error_fields(threshold_pct, effective_buffer)) \
+            or check_glacier_melting(ee_geometry, threshold_pct, effective_buffer)
+        end_time = time.time()
+        print(f"GEE analysis duration: {end_time - start_time:.2f} seconds.", file=sys.stderr)
+        return analysis_result
+
+    # Cache hits skip GEE initialization as well as the analysis
+    analysis_result = cached_run(result_key, 'GLACIER', run_analysis)
 
     analysis_result['region_id'] = region_id
     print(json.dumps(analysis_result))
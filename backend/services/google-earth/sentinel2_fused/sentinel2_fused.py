@@ -0,0 +1,403 @@
+import sys
+import json
+import ee
+import time
+import traceback
+from pathlib import Path
+
+SERVICES_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(SERVICES_DIR))
+for detector_dir in ['deforestation', 'coastal_erosion', 'glacier']:
+    sys.path.insert(0, str(SERVICES_DIR / detector_dir))
+
+from common.gee_init import initialize_gee
+from common.tracing import bind_trace_context
+from common.progress import bind_progress
+from common.scale import adaptive_scale, SCALE_PROPERTY
+from common.geometry import geojson_to_ee_geometry
+from common.batch import with_band_placeholder
+from common.sentinel2 import mask_s2_clouds
+from common.thumbnails import thumbnail_fields
+from common.ee_requests import evaluate
+from common.result_cache import get_cached_result, store_result
+from common.preflight import preflight_failures
+from common.time_windows import resolve_anchor, shift_years, window_ending_at, clamp_start, period_fields, ISO_FORMAT, SENTINEL2_START
+import deforestation
+import coastal_erosion
+import glacier_melting
+
+# --- Configuration Constants ---
+S2_COLLECTION = 'COPERNICUS/S2_SR_HARMONIZED'
+GLACIER_NDSI_THRESHOLD = 0.4
+DEFAULT_POINT_BUFFER = 1000
+
+# Index -> (bands for normalizedDifference)
+INDEX_BANDS = {
+    'NDVI': [deforestation.NIR_BAND, deforestation.RED_BAND],
+    'NDWI': ['B3', 'B8'],
+    'NDSI': [glacier_melting.NDSI_GREEN_BAND, glacier_melting.NDSI_SWIR_BAND],
+}
+CATEGORY_INDEX = {
+    'DEFORESTATION': 'NDVI',
+    'COASTAL_EROSION': 'NDWI',
+    'GLACIER': 'NDSI',
+}
+CATEGORY_SCALE = {
+    'DEFORESTATION': deforestation.REDUCTION_SCALE,
+    'COASTAL_EROSION': coastal_erosion.REDUCTION_SCALE,
+    'GLACIER': glacier_melting.REDUCTION_SCALE,
+}
+FUSED_CATEGORIES = list(CATEGORY_INDEX)
+CATEGORY_MODULES = {
+    'DEFORESTATION': deforestation,
+    'COASTAL_EROSION': coastal_erosion,
+    'GLACIER': glacier_melting,
+}
+
+def category_threshold(category, params):
+    """The threshold the category's detector takes (threshold, or threshold_percent for GLACIER)."""
+    if category == 'GLACIER':
+        return float(params.get('threshold_percent', glacier_melting.DEFAULT_GLACIER_ALERT_THRESHOLD_PERCENT))
+    if category == 'COASTAL_EROSION':
+        return float(params.get('threshold', coastal_erosion.DEFAULT_SHORELINE_RETREAT_THRESHOLD))
+    return float(params.get('threshold', deforestation.DEFAULT_NDVI_DROP_THRESHOLD))
+
+def category_windows(category, anchor):
+    """Returns {'before': (start, end), 'after': (start, end)} for a category, mirroring its detector."""
+    if category == 'DEFORESTATION':
+        start_recent, end_recent = window_ending_at(anchor, deforestation.RECENT_PERIOD_DAYS)
+        before = window_ending_at(start_recent, deforestation.PREVIOUS_PERIOD_DAYS)
+    elif category == 'COASTAL_EROSION':
+        start_recent, end_recent = window_ending_at(anchor, coastal_erosion.RECENT_PERIOD_DAYS)
+        start_baseline, end_baseline = window_ending_at(start_recent, coastal_erosion.BASELINE_PERIOD_DAYS)
+        before = (clamp_start(start_baseline, SENTINEL2_START), end_baseline)
+    else:
+        start_recent, end_recent = window_ending_at(anchor, glacier_melting.RECENT_PERIOD_DAYS)
+        before = window_ending_at(shift_years(end_recent, -glacier_melting.BASELINE_PERIOD_YEARS_AGO), glacier_melting.BASELINE_PERIOD_DURATION_DAYS)
+    return {'before': before, 'after': (start_recent, end_recent)}
+
+def build_fused_composite(s2_collection, start, end, indices, region_geometry):
+    """One cloud-masked median over every band the requested indices need, with the indices added as bands."""
+    bands = sorted({band for index in indices for band in INDEX_BANDS[index]})
+    window_collection = s2_collection.filterDate(ee.Date(start), ee.Date(end))
+    masked = with_band_placeholder(window_collection.map(mask_s2_clouds).select(bands), bands)
+    composite = masked.median().clip(region_geometry)
+    for index in indices:
+        composite = composite.addBands(composite.normalizedDifference(INDEX_BANDS[index]).rename(index))
+    return composite, window_collection.size()
+
+def check_sentinel2_fused(region_geometry, category_params, buffer_radius_meters):
+    """
+    Runs several Sentinel-2 detectors from shared composites.
+    category_params: {'DEFORESTATION': {'threshold': ...}, 'COASTAL_EROSION': {'threshold': ...},
+                      'GLACIER': {'threshold_percent': ...}} (any subset).
+    Each distinct time window is cloud-masked and composited once; NDVI/NDWI/NDSI are bands of
+    that composite. Each category is reduced at its own detector's scale (one reduceRegion per
+    scale) and all statistics come back in one request.
+    Returns {category: result} with the same fields as the single-detector checks.
+    """
+    categories = [category for category in FUSED_CATEGORIES if category in category_params]
+    anchor = resolve_anchor()
+
+    # --- Collect distinct windows and the indices each one needs ---
+    windows = {}
+    window_indices = {}
+    category_window_keys = {}
+    for category in categories:
+        category_window_keys[category] = {}
+        for role, window in category_windows(category, anchor).items():
+            window_key = windows.setdefault(window, f"w{len(windows)}")
+            window_indices.setdefault(window_key, set()).add(CATEGORY_INDEX[category])
+            category_window_keys[category][role] = window_key
+    print(f"Fused Sentinel-2 pass for {categories}: {len(windows)} distinct windows", file=sys.stderr)
+
+    s2_collection = ee.ImageCollection(S2_COLLECTION).filterBounds(region_geometry)
+    composites = {}
+    counts = {}
+    for (start, end), window_key in windows.items():
+        composites[window_key], counts[window_key] = build_fused_composite(
+            s2_collection, start, end, sorted(window_indices[window_key]), region_geometry
+        )
+
+    # --- Stack the per-window statistics into one image per reduction scale ---
+    pixel_area = ee.Image.pixelArea().divide(1e6)
+    scale_bands = {}
+    shorelines = {}
+    for category in categories:
+        before_key = category_window_keys[category]['before']
+        after_key = category_window_keys[category]['after']
+        index = CATEGORY_INDEX[category]
+        stat_bands = scale_bands.setdefault(CATEGORY_SCALE[category], [])
+        if category == 'DEFORESTATION':
+            stat_bands.append(composites[after_key].select('NDVI').subtract(composites[before_key].select('NDVI')).rename('ndvi_change'))
+        elif category == 'COASTAL_EROSION':
+            for window_key in (before_key, after_key):
+                stat_bands.append(composites[window_key].select(index).rename(f"{window_key}_{index}"))
+                shoreline = coastal_erosion.get_shoreline_edge(coastal_erosion.extract_shoreline(composites[window_key]), region_geometry)
+                shorelines[window_key] = ee.Algorithms.If(
+                    ee.Number(counts[window_key]).gt(0), shoreline.geometry().centroid().coordinates(), None
+                )
+        else:
+            for window_key in (before_key, after_key):
+                stat_bands.append(
+                    composites[window_key].select(index).gt(GLACIER_NDSI_THRESHOLD).multiply(pixel_area).rename(f"{window_key}_glacier_area")
+                )
+    reducer = ee.Reducer.mean().combine(reducer2=ee.Reducer.sum(), sharedInputs=True)
+    scales = {}
+    scale_stats = {}
+    for native_scale, stat_bands in scale_bands.items():
+        scale_key = f"s{native_scale}"
+        scales[scale_key] = adaptive_scale(region_geometry, native_scale)
+        scale_stats[scale_key] = ee.Image.cat(stat_bands).reduceRegion(
+            reducer=reducer,
+            geometry=region_geometry,
+            scale=scales[scale_key],
+            maxPixels=1e9,
+            bestEffort=True
+        )
+    summary = evaluate(ee.Dictionary({
+        'stats': ee.Dictionary(scale_stats),
+        'scales': ee.Dictionary(scales),
+        'counts': ee.Dictionary(counts),
+        'shorelines': ee.Dictionary(shorelines),
+    }))
+    # Band names are distinct across categories, so the scale groups merge into one dict
+    stats = {}
+    for group_stats in (summary.get('stats') or {}).values():
+        stats.update(group_stats or {})
+    scales = summary.get('scales') or {}
+    counts = summary.get('counts') or {}
+    shorelines = summary.get('shorelines') or {}
+    print(f"Fused scene counts per window: {counts}", file=sys.stderr)
+
+    results = {}
+    for category in categories:
+        params = category_params[category]
+        before_key = category_window_keys[category]['before']
+        after_key = category_window_keys[category]['after']
+        (start_before, end_before), (start_after, end_after) = category_windows(category, anchor).values()
+        if category == 'DEFORESTATION':
+            results[category] = deforestation_result(
+                params, stats.get('ndvi_change_mean'), composites[before_key], composites[after_key],
+                region_geometry, buffer_radius_meters,
+                {**period_fields('recent', start_after, end_after, ISO_FORMAT), **period_fields('previous', start_before, end_before, ISO_FORMAT)}
+            )
+        elif category == 'COASTAL_EROSION':
+            results[category] = coastal_result(
+                params, counts, stats, shorelines, before_key, after_key, composites, region_geometry, buffer_radius_meters,
+                {**period_fields('recent', start_after, end_after), **period_fields('baseline', start_before, end_before)}
+            )
+        else:
+            results[category] = glacier_result(
+                params, counts, stats, before_key, after_key, composites, region_geometry, buffer_radius_meters,
+                {**period_fields('recent', start_after, end_after), **period_fields('baseline', start_before, end_before)}
+            )
+        if results[category].get('status') == 'success':
+            results[category][SCALE_PROPERTY] = scales.get(f"s{CATEGORY_SCALE[category]}")
+    return results
+
+def run_sentinel2_fused(region_geometry, geojson_geometry, category_params, buffer_radius_meters):
+    """
+    check_sentinel2_fused() behind the single detectors' result cache and preflight. Categories
+    cached under their own detector's key are answered from the cache; one preflight request
+    covers the rest, and only categories with usable imagery go through the fused pass.
+    Fresh successful results are cached under the detector's key, so single runs reuse them.
+    """
+    results = {}
+    keys = {}
+    for category, params in category_params.items():
+        module = CATEGORY_MODULES[category]
+        keys[category] = module.result_cache_key(geojson_geometry, buffer_radius_meters, category_threshold(category, params))
+        cached = get_cached_result(keys[category])
+        if cached is not None:
+            print(f"Result cache hit for {category} ({keys[category][:12]}), left out of the fused pass.", file=sys.stderr)
+            cached['cached'] = True
+            results[category] = cached
+
+    pending = [category for category in category_params if category not in results]
+    results.update(preflight_failures(
+        {category: CATEGORY_MODULES[category].preflight_windows(region_geometry) for category in pending},
+        {
+            category: CATEGORY_MODULES[category].error_fields(category_threshold(category, category_params[category]), buffer_radius_meters)
+            for category in pending
+        }
+    ))
+    runnable = {category: category_params[category] for category in pending if category not in results}
+    if runnable:
+        for category, result in check_sentinel2_fused(region_geometry, runnable, buffer_radius_meters).items():
+            store_result(keys[category], category, result)
+            results[category] = result
+    return {category: results[category] for category in category_params}
+
+def deforestation_result(params, mean_ndvi_change, before_img, after_img, region_geometry, buffer_radius_meters, response_dates):
+    threshold = float(params.get('threshold', deforestation.DEFAULT_NDVI_DROP_THRESHOLD))
+    if mean_ndvi_change is None:
+        return {
+            "status": "error",
+            "message": f"Could not calculate mean NDVI change. No valid pixels found in the region for the specified time periods after cloud masking. Try adjusting dates, buffer size ({buffer_radius_meters}m), or check region coordinates.",
+            "mean_ndvi_change": None,
+            "alert_triggered": False,
+            "threshold": threshold,
+            "buffer_radius_meters": buffer_radius_meters
+        }
+    ndvi_vis_params = {
+        'min': -0.2,
+        'max': 0.8,
+        'palette': ['#d7191c', '#ffffbf', '#1a9641'],
+        'dimensions': 512
+    }
+    return {
+        "status": "success",
+        "alert_triggered": mean_ndvi_change < threshold,
+        "mean_ndvi_change": mean_ndvi_change,
+        "threshold": threshold,
+        **thumbnail_fields(deforestation.get_image_thumbnail_url, before_img.select('NDVI'), after_img.select('NDVI'), region_geometry, ndvi_vis_params),
+        **response_dates,
+        "buffer_radius_meters": buffer_radius_meters
+    }
+
+def coastal_result(params, counts, stats, shorelines, before_key, after_key, composites, region_geometry, buffer_radius_meters, response_dates):
+    threshold = float(params.get('threshold', coastal_erosion.DEFAULT_SHORELINE_RETREAT_THRESHOLD))
+    for window_key, label in ((before_key, 'baseline'), (after_key, 'recent')):
+        if not counts.get(window_key):
+            return {
+                "status": "error",
+                "message": f"No NDWI band found in {label} composite. No cloud-free data available in this period/region.",
+                "alert_triggered": False,
+                "shoreline_retreat_meters": None,
+                "threshold": threshold,
+                "buffer_radius_meters": buffer_radius_meters,
+                "start_image_url": None,
+                "end_image_url": None,
+                "mean_ndwi_change": None
+            }
+    mean_ndwi_before = stats.get(f"{before_key}_NDWI_mean")
+    mean_ndwi_after = stats.get(f"{after_key}_NDWI_mean")
+    mean_ndwi_change = (
+        mean_ndwi_after - mean_ndwi_before
+        if mean_ndwi_before is not None and mean_ndwi_after is not None
+        else None
+    )
+    try:
+        shoreline_retreat_meters = coastal_erosion.shoreline_shift_meters(shorelines.get(before_key), shorelines.get(after_key))
+    except Exception as calc_error:
+        print(f"ERROR: Failed to calculate shoreline shift: {calc_error}", file=sys.stderr)
+        shoreline_retreat_meters = None
+    vis_params = {
+        'min': -1,
+        'max': 1,
+        'palette': ['#0d0887', '#43ea80', '#f7fcb9'],
+        'dimensions': 512
+    }
+    return {
+        "status": "success" if shoreline_retreat_meters is not None else "error",
+        "alert_triggered": shoreline_retreat_meters is not None and abs(shoreline_retreat_meters) > threshold,
+        "shoreline_retreat_meters": shoreline_retreat_meters,
+        "threshold": threshold,
+        **response_dates,
+        "buffer_radius_meters": buffer_radius_meters,
+        **thumbnail_fields(coastal_erosion.get_ndwi_image_url, composites[before_key].select('NDWI'), composites[after_key].select('NDWI'), region_geometry, vis_params),
+        "mean_ndwi_change": mean_ndwi_change
+    }
+
+def glacier_result(params, counts, stats, before_key, after_key, composites, region_geometry, buffer_radius_meters, response_dates):
+    threshold_percent = float(params.get('threshold_percent', glacier_melting.DEFAULT_GLACIER_ALERT_THRESHOLD_PERCENT))
+    if not counts.get(after_key):
+        return {
+            "status": "error",
+            "message": "No cloud-free data available for recent period. Cannot perform analysis.",
+            "alert_triggered": False,
+            "baseline_area_sqkm": None,
+            "recent_area_sqkm": None,
+            "loss_percent": None,
+            "threshold_percent": threshold_percent,
+            "buffer_radius_meters": buffer_radius_meters,
+            "start_image_url": None,
+            "end_image_url": None
+        }
+    if not counts.get(before_key):
+        # The alternative-baseline search lives in the single detector.
+        print("Primary glacier baseline has no data, running single-detector check with fallbacks...", file=sys.stderr)
+        return glacier_melting.check_glacier_melting(region_geometry, threshold_percent, buffer_radius_meters)
+
+    baseline_area = stats.get(f"{before_key}_glacier_area_sum") or 0.0
+    recent_area = stats.get(f"{after_key}_glacier_area_sum") or 0.0
+    loss_percent = (baseline_area - recent_area) / baseline_area * 100 if baseline_area > 0 else 0.0
+    vis_params = {
+        'min': -1,
+        'max': 1,
+        'palette': ['black', 'white', 'lightblue'],
+        'dimensions': 512
+    }
+    return {
+        "status": "success",
+        "alert_triggered": loss_percent > threshold_percent,
+        "baseline_area_sqkm": baseline_area,
+        "recent_area_sqkm": recent_area,
+        "loss_percent": loss_percent,
+        "threshold_percent": threshold_percent,
+        **response_dates,
+        "buffer_radius_meters": buffer_radius_meters,
+        **thumbnail_fields(glacier_melting.get_ndsi_image_url, composites[before_key].select('NDSI'), composites[after_key].select('NDSI'), region_geometry, vis_params)
+    }
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("ERROR: Missing credentials file path argument.", file=sys.stderr)
+        print(json.dumps({"status": "error", "message": "Missing credentials file path argument."}))
+        sys.exit(1)
+    credentials_path_from_arg = sys.argv[1]
+
+    input_data_str = sys.stdin.read()
+    region_id = "unknown_region"
+    buffer_radius = DEFAULT_POINT_BUFFER
+
+    try:
+        input_params = json.loads(input_data_str)
+        geojson_geometry = input_params['geometry']
+        category_params = {str(category).upper(): params or {} for category, params in input_params['categories'].items()}
+        unsupported = [category for category in category_params if category not in FUSED_CATEGORIES]
+        if unsupported or not category_params:
+            raise ValueError(f"Fused mode supports {FUSED_CATEGORIES}, got: {list(category_params)}")
+        region_id = str(input_params.get('region_id', region_id))
+        buffer_radius = int(input_params.get('buffer_meters', DEFAULT_POINT_BUFFER))
+        print(f"Received job: region='{region_id}', categories={list(category_params)}, buffer={buffer_radius}m", file=sys.stderr)
+    except Exception as e:
+        print(f"ERROR: Invalid stdin params: {e}", file=sys.stderr)
+        print(json.dumps({"status": "error", "message": f"Invalid Stdin Param: {e}", "region_id": region_id}))
+        sys.exit(1)
+
+    bind_trace_context(detector='SENTINEL2_FUSED', region_id=region_id)
+    if input_params.get('stream'):
+        bind_progress(sys.stdout, region_id=region_id)
+    if not initialize_gee(credentials_path_from_arg):
+        print(json.dumps({"status": "error", "message": "GEE initialization failed.", "region_id": region_id}))
+        sys.exit(1)
+
+    try:
+        ee_geometry, effective_buffer = geojson_to_ee_geometry(geojson_geometry, buffer_radius, min(CATEGORY_SCALE.values()))
+    except Exception as e:
+        print(f"ERROR: GeoJSON convert fail: {e}", file=sys.stderr)
+        print(json.dumps({"status": "error", "message": f"GeoJSON Error: {e}", "region_id": region_id}))
+        sys.exit(1)
+
+    print(f"Starting fused Sentinel-2 analysis for region: {region_id}...", file=sys.stderr)
+    start_time = time.time()
+    try:
+        results = run_sentinel2_fused(ee_geometry, geojson_geometry, category_params, effective_buffer)
+        analysis_result = {"status": "success", "results": results}
+    except ee.EEException as gee_error:
+        print(f"ERROR: GEE computation failed: {gee_error}", file=sys.stderr)
+        analysis_result = {"status": "error", "message": f"GEE Computation Error: {gee_error}"}
+    except Exception as e:
+        print(f"ERROR: Unexpected Python error during GEE processing: {e}", file=sys.stderr)
+        print(traceback.format_exc(), file=sys.stderr)
+        analysis_result = {"status": "error", "message": f"Python Script Error: {e}"}
+    end_time = time.time()
+    print(f"GEE analysis duration: {end_time - start_time:.2f} seconds.", file=sys.stderr)
+    analysis_result['region_id'] = region_id
+    print(json.dumps(analysis_result))
+    if analysis_result.get("status") == "success":
+        sys.exit(0)
+    else:
+        sys.exit(1)
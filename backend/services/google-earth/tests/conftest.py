@@ -0,0 +1,25 @@
+import os
+import sys
+from pathlib import Path
+
+# Unit tests for the pieces that run in plain Python (windows, keys, caches, local geometry).
+# Detector modules are imported the way gee_worker.py imports them. Without the earthengine-api
+# the benchmark fake stands in for `ee`: the code under test only builds expressions with it.
+#   python -m pytest backend/services/google-earth/tests
+
+SERVICES_DIR = Path(__file__).resolve().parent.parent
+DETECTOR_DIRS = ['deforestation', 'flooding', 'glacier', 'coastal_erosion', 'fire', 'sentinel2_fused']
+
+os.environ.setdefault('GEE_RESULT_CACHE', 'off')
+os.environ.setdefault('GEE_WATERMARKS', 'off')
+sys.path.insert(0, str(SERVICES_DIR))
+for detector_dir in DETECTOR_DIRS:
+    sys.path.insert(0, str(SERVICES_DIR / detector_dir))
+
+try:
+    import ee  # noqa: F401
+except ImportError:
+    sys.path.insert(0, str(SERVICES_DIR / 'benchmarks'))
+    import fake_ee
+    fake_ee.LATENCY_SECONDS = 0
+    fake_ee.install()
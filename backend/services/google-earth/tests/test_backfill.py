@@ -0,0 +1,37 @@
+import datetime
+
+from contextlib import closing
+
+import backfill
+
+UTC = datetime.timezone.utc
+START = datetime.datetime(2026, 1, 1, tzinfo=UTC)
+JOB = {"category": "FLOODING", "threshold_percent": 5, "regions": [{"region_id": f"r{i}"} for i in range(5)]}
+
+def test_anchor_dates_step_from_start_up_to_end():
+    anchors = backfill.anchor_dates(START, datetime.datetime(2026, 3, 2, tzinfo=UTC), 30)
+    assert [anchor.strftime(backfill.DATE_FORMAT) for anchor in anchors] == ['2026-01-01', '2026-01-31', '2026-03-02']
+
+def test_later_end_only_adds_slices():
+    early = backfill.build_slices([JOB], backfill.anchor_dates(START, START + datetime.timedelta(days=45), 30), 2)
+    late = backfill.build_slices([JOB], backfill.anchor_dates(START, START + datetime.timedelta(days=75), 30), 2)
+    assert len(early) == 6 and len(late) == 9
+    assert [entry['slice_id'] for entry in late[:len(early)]] == [entry['slice_id'] for entry in early]
+
+def test_slices_chunk_regions_and_carry_the_anchor():
+    slices = backfill.build_slices([JOB], [START], 2)
+    assert [[region['region_id'] for region in entry['job']['regions']] for entry in slices] == [['r0', 'r1'], ['r2', 'r3'], ['r4']]
+    assert {entry['job']['anchor'] for entry in slices} == {'2026-01-01'}
+    assert len({entry['slice_id'] for entry in slices}) == 3
+    # Ids depend on the job's content, not on dict order
+    reordered = {key: JOB[key] for key in reversed(list(JOB))}
+    assert backfill.build_slices([reordered], [START], 2) == slices
+
+def test_failed_slices_are_forgotten_for_a_retry(tmp_path):
+    with closing(backfill._connect(tmp_path / 'backfill.sqlite3')) as conn:
+        job = {**JOB, 'anchor': '2026-01-01'}
+        backfill.store_slice(conn, 'ok', job, [{"status": "success", "region_id": "r0"}])
+        backfill.store_slice(conn, 'failed', job, [{"status": "success", "region_id": "r1"}, {"status": "error", "region_id": "r2"}])
+        assert backfill.finished_slices(conn) == {'ok', 'failed'}
+        assert backfill.forget_failed_slices(conn) == 1
+        assert backfill.finished_slices(conn) == {'ok'}
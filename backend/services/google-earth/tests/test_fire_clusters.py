@@ -0,0 +1,66 @@
+import pytest
+
+pytest.importorskip('numpy')
+
+from common.geometry import METERS_PER_DEGREE
+import fire_clusters
+
+STEP = fire_clusters.CLUSTER_CELL_METERS / METERS_PER_DEGREE  # one grid cell in latitude
+
+def points(*detections):
+    """detections: (lon, lat, acq_date, acq_time) tuples, in the columnar form cluster_fire_events takes."""
+    columns = {'latitude': [], 'longitude': [], 'brightness': [], 'acq_date': [], 'acq_time': []}
+    for lon, lat, acq_date, acq_time in detections:
+        columns['latitude'].append(lat)
+        columns['longitude'].append(lon)
+        columns['brightness'].append(330.0)
+        columns['acq_date'].append(acq_date)
+        columns['acq_time'].append(acq_time)
+    return columns
+
+def test_touching_cells_form_one_event_and_far_points_another():
+    events = fire_clusters.cluster_fire_events(points(
+        (10.0, 45.0, '2026-01-01', '0130'),
+        (10.0, 45.0 + STEP, '2026-01-01', '1200'),
+        (12.0, 47.0, '2026-01-02', '0900'),
+    ))
+    assert sorted(event['pixel_count'] for event in events) == [1, 2]
+    pair = next(event for event in events if event['pixel_count'] == 2)
+    assert (pair['first_acq'], pair['last_acq']) == ('2026-01-01T0130', '2026-01-01T1200')
+
+def test_numeric_acq_times_sort_by_time_of_day():
+    # 930 as a number would sort after 1200 as text; the canonical key gives '0930'
+    [event] = fire_clusters.cluster_fire_events(points(
+        (10.0, 45.0, '2026-01-01', 1200),
+        (10.0, 45.0, '2026-01-01', 930),
+    ))
+    assert (event['first_acq'], event['last_acq']) == ('2026-01-01T0930', '2026-01-01T1200')
+
+def test_new_detections_extend_and_bridge_previous_events():
+    first = fire_clusters.cluster_fire_events(points(
+        (10.0, 45.0, '2026-01-01', '0100'),
+        (10.0, 45.0 + 2 * STEP, '2026-01-01', '0200'),
+    ))
+    assert len(first) == 2
+    # A detection in the cell between them joins both into the older event
+    [event] = fire_clusters.cluster_fire_events(points((10.0, 45.0 + STEP, '2026-01-02', '0300')), first)
+    assert event['pixel_count'] == 3
+    assert event['new_pixel_count'] == 1
+    assert event['first_acq'] == '2026-01-01T0100'
+    assert event['last_acq'] == '2026-01-02T0300'
+    assert event['event_id'] == min(previous['event_id'] for previous in first)
+
+def test_expired_events_are_dropped():
+    first = fire_clusters.cluster_fire_events(points((10.0, 45.0, '2026-01-01', '0100')))
+    assert fire_clusters.cluster_fire_events(points(), first, expire_before='2026-01-01') == first
+    assert fire_clusters.cluster_fire_events(points(), first, expire_before='2026-01-02') == []
+
+def test_event_summary_is_in_geojson_order():
+    [event] = fire_clusters.cluster_fire_events(points(
+        (10.0, 45.0, '2026-01-01', '0100'),
+        (10.002, 45.002, '2026-01-01', '0100'),
+    ))
+    summary = fire_clusters.event_summary(event)
+    assert summary['centroid'] == pytest.approx([10.001, 45.001])
+    assert summary['bbox'] == pytest.approx([10.0, 45.0, 10.002, 45.002])
+    assert 'cells' not in summary
@@ -0,0 +1,53 @@
+import datetime
+
+import pytest
+
+pytest.importorskip('numpy')
+
+from common import watermarks
+import fire_protection
+from fire_acquisition import acq_key, canonical_acq_time
+
+NOW = datetime.datetime(2026, 1, 3, tzinfo=datetime.timezone.utc)
+
+@pytest.fixture
+def watermark_store(tmp_path, monkeypatch):
+    monkeypatch.setattr(watermarks, 'WATERMARKS_ENABLED', True)
+    monkeypatch.setattr(watermarks, 'WATERMARKS_PATH', tmp_path / 'watermarks.sqlite3')
+
+def columnar_summary(acq_times, acq_date='2026-01-02'):
+    count = len(acq_times)
+    return {
+        'count': count,
+        'days': {acq_date: count},
+        'points': [[45.0] * count, [10.0] * count, [320.0] * count, [80] * count, [acq_date] * count, list(acq_times)],
+    }
+
+@pytest.mark.parametrize('acq_time', ['0130', '130', 130, 130.0])
+def test_canonical_acq_time_pads_strings_and_numbers(acq_time):
+    assert canonical_acq_time(acq_time) == '0130'
+    assert acq_key('2026-01-02', acq_time) == '2026-01-02T0130'
+
+def test_watermark_is_the_newest_detection_for_numeric_acq_time():
+    result = fire_protection.fire_result(columnar_summary([905, 1000, 45]), None, None, 5, NOW, True, False)
+    assert result['watermark'] == {'acq_date': '2026-01-02', 'acq_time': '1000'}
+
+def test_watermark_ignores_string_order_of_unpadded_acq_time():
+    # '905' > '1000' as strings; as acquisition times 10:00 is newer
+    result = fire_protection.fire_result(columnar_summary(['905', '1000']), None, None, 5, NOW, True, False)
+    assert result['watermark']['acq_time'] == '1000'
+
+def test_stored_watermark_round_trips_in_canonical_form(watermark_store):
+    fire_protection.fire_result(columnar_summary([45, 130]), None, 'FIRE_PROTECTION:test', 5, NOW, True, False)
+    state = fire_protection.load_fire_state('FIRE_PROTECTION:test', 5)
+    assert state['watermark'] == {'acq_date': '2026-01-02', 'acq_time': '0130'}
+    assert state['day_counts'] == {'2026-01-02': 2}
+    assert fire_protection.load_fire_state('FIRE_PROTECTION:test', 7) is None
+
+@pytest.mark.skipif(not hasattr(fire_protection.ee, 'recorded_calls'), reason="inspects the fake ee expression graph")
+def test_newer_than_filters_on_the_canonical_key():
+    fires = fire_protection.ee.FeatureCollection('fires')
+    newer = fire_protection.newer_than(fires, {'acq_date': '2026-01-02', 'acq_time': 130})
+    condition = newer._args[0]
+    assert condition._op == 'gt'
+    assert condition._args == ('acq_key', '2026-01-02T0130')
@@ -0,0 +1,95 @@
+import datetime
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from common import watermarks
+import fire_snapshot
+import fire_protection
+
+NOW = datetime.datetime(2026, 1, 3, 12, 0, tzinfo=datetime.timezone.utc)
+SQUARE = [[10.0, 45.0], [11.0, 45.0], [11.0, 46.0], [10.0, 46.0], [10.0, 45.0]]
+REGION = {"type": "Polygon", "coordinates": [SQUARE]}
+
+@pytest.fixture
+def watermark_store(tmp_path, monkeypatch):
+    monkeypatch.setattr(watermarks, 'WATERMARKS_ENABLED', True)
+    monkeypatch.setattr(watermarks, 'WATERMARKS_PATH', tmp_path / 'watermarks.sqlite3')
+
+def make_snapshot(points, truncated=False):
+    """points: (lon, lat, acq_date, acq_time) tuples, stored the way download_fire_snapshot stores them."""
+    columns = {name: [] for name in fire_protection.FIRE_POINT_COLUMNS}
+    for lon, lat, acq_date, acq_time in points:
+        columns['latitude'].append(lat)
+        columns['longitude'].append(lon)
+        columns['brightness'].append(330.0)
+        columns['confidence'].append(80)
+        columns['acq_date'].append(acq_date)
+        columns['acq_time'].append(acq_time)
+    snapshot = {name: np.array(columns[name], dtype=np.float64) for name in fire_snapshot.FLOAT_COLUMNS}
+    snapshot['acq_date'] = np.array(columns['acq_date'], dtype=str)
+    snapshot['acq_time'] = np.array([fire_snapshot.canonical_acq_time(t) for t in columns['acq_time']], dtype=str)
+    snapshot['acq_key'] = np.char.add(np.char.add(snapshot['acq_date'], 'T'), snapshot['acq_time'])
+    snapshot['truncated'] = np.array(truncated)
+    return snapshot
+
+def test_points_in_ring_uses_even_odd_rule():
+    longitudes = np.array([10.5, 12.0, 10.5, 9.99])
+    latitudes = np.array([45.5, 45.5, 46.5, 45.5])
+    inside = fire_snapshot.points_in_ring(longitudes, latitudes, np.array(SQUARE))
+    assert inside.tolist() == [True, False, False, False]
+
+def test_region_point_indices_respects_holes_and_other_cells():
+    hole = [[10.4, 45.4], [10.6, 45.4], [10.6, 45.6], [10.4, 45.6], [10.4, 45.4]]
+    region = {"type": "Polygon", "coordinates": [SQUARE, hole]}
+    longitudes = np.array([10.1, 10.5, 10.9, 20.0, 10.7])
+    latitudes = np.array([45.1, 45.5, 45.9, 45.5, 45.2])
+    index = fire_snapshot.build_grid_index(latitudes, longitudes)
+    indices = fire_snapshot.region_point_indices(region, latitudes, longitudes, index)
+    assert indices.tolist() == [0, 2, 4]
+
+def test_region_point_indices_buffers_points():
+    longitudes = np.array([10.0, 10.05, 10.3])
+    latitudes = np.array([45.0, 45.0, 45.0])
+    index = fire_snapshot.build_grid_index(latitudes, longitudes)
+    point = {"type": "Point", "coordinates": [10.0, 45.0]}
+    # DEFAULT_POINT_BUFFER is 10 km: about 0.127 degrees of longitude at 45N
+    assert fire_snapshot.region_point_indices(point, latitudes, longitudes, index).tolist() == [0, 1]
+
+def run_batch(monkeypatch, snapshot, incremental=True):
+    monkeypatch.setattr(fire_snapshot, 'load_fire_snapshot', lambda window_days, now: snapshot)
+    monkeypatch.setattr(fire_snapshot, 'resolve_anchor', lambda: NOW)
+    regions = [{'region_id': 'r1', 'days_back': 2, 'params': {'geometry': REGION, 'incremental': incremental}}]
+    return fire_snapshot.check_fire_snapshot_batch(regions)[0]
+
+def test_batch_counts_window_and_previous_period(monkeypatch):
+    snapshot = make_snapshot([
+        (10.5, 45.5, '2026-01-02', 130),
+        (10.5, 45.5, '2026-01-03', '0900'),
+        (10.5, 45.5, '2025-12-31', 2300),
+        (20.0, 45.5, '2026-01-03', '0900'),
+    ])
+    result = run_batch(monkeypatch, snapshot, incremental=False)
+    assert result['status'] == 'success'
+    assert result['active_fire_count'] == 2
+    assert result['previous_period_fire_count'] == 1
+    assert result['watermark'] == {'acq_date': '2026-01-03', 'acq_time': '0900'}
+    assert 'fire_points' not in result
+
+def test_batch_filters_on_stored_watermark_with_numeric_acq_time(monkeypatch, watermark_store):
+    first = make_snapshot([(10.5, 45.5, '2026-01-02', 130)])
+    assert run_batch(monkeypatch, first)['new_fire_count'] == 1
+    second = make_snapshot([(10.5, 45.5, '2026-01-02', 130), (10.5, 45.5, '2026-01-02', 945)])
+    result = run_batch(monkeypatch, second)
+    assert result['new_fire_count'] == 1
+    assert result['watermark'] == {'acq_date': '2026-01-02', 'acq_time': '0945'}
+
+def test_truncated_snapshot_does_not_move_the_watermark(monkeypatch, watermark_store):
+    run_batch(monkeypatch, make_snapshot([(10.5, 45.5, '2026-01-02', 130)]))
+    truncated = make_snapshot([(10.5, 45.5, '2026-01-03', 800)], truncated=True)
+    result = run_batch(monkeypatch, truncated)
+    assert result['snapshot_truncated'] is True
+    assert result['incremental'] is False
+    key = fire_protection.fire_watermark_key(REGION, 'r1')
+    assert fire_protection.load_fire_state(key, 2)['watermark'] == {'acq_date': '2026-01-02', 'acq_time': '0130'}
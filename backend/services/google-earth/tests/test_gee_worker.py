@@ -0,0 +1,37 @@
+import io
+import json
+
+import pytest
+
+pytest.importorskip('numpy')
+
+import gee_worker
+
+def serve_lines(*lines):
+    output = io.StringIO()
+    gee_worker.serve(io.StringIO(''.join(line + '\n' for line in lines)), output)
+    return [json.loads(line) for line in output.getvalue().splitlines()]
+
+@pytest.mark.parametrize('line, job_id', [
+    ('{"job_id": 7, "category": ', 7),
+    ('{"category": "FLOODING", "job_id": "job-\\"a\\"", ', 'job-"a"'),
+    ('{"job_id": 7', 7),
+    ('not json at all', None),
+    ('[1, 2]', None),
+])
+def test_invalid_lines_keep_their_job_id(line, job_id):
+    [result] = serve_lines(line)
+    assert result['status'] == 'error'
+    assert result['message'].startswith('Invalid Job JSON')
+    assert result['job_id'] == job_id
+
+def test_unknown_category_is_answered_with_its_job_id():
+    [result] = serve_lines('', json.dumps({'job_id': 3, 'category': 'VOLCANO', 'region_id': 'r'}))
+    assert result == {'status': 'error', 'message': 'Unknown category: VOLCANO', 'job_id': 3, 'region_id': 'r'}
+
+@pytest.mark.parametrize('budget', [0, -5, 'lots'])
+def test_invalid_pixel_budget_is_rejected(budget):
+    result = gee_worker.handle_job({'job_id': 4, 'category': 'FLOODING', 'region_id': 'r', 'pixel_budget': budget})
+    assert result['status'] == 'error'
+    assert result['message'].startswith('Invalid pixel_budget')
+    assert (result['job_id'], result['region_id']) == (4, 'r')
@@ -0,0 +1,52 @@
+import pytest
+
+from common import geometry
+
+SQUARE = [[10.0, 45.0], [10.1, 45.0], [10.1, 45.1], [10.0, 45.1], [10.0, 45.0]]
+
+def polygon(*rings):
+    return {"type": "Polygon", "coordinates": [list(ring) for ring in rings]}
+
+def test_rings_are_repaired():
+    # Open ring with a repeated vertex
+    prepared = geometry.prepare_geojson(polygon([[10.0, 45.0], [10.1, 45.0], [10.1, 45.0], [10.1, 45.1], [10.0, 45.1]]))
+    assert prepared['coordinates'] == [SQUARE]
+    # Degenerate holes are dropped, degenerate shells are not repaired
+    prepared = geometry.prepare_geojson(polygon(SQUARE, [[10.05, 45.05], [10.06, 45.05], [10.05, 45.05]]))
+    assert prepared['coordinates'] == [SQUARE]
+    with pytest.raises(ValueError):
+        geometry.prepare_geojson(polygon([[10.0, 45.0], [10.1, 45.0], [10.0, 45.0]]))
+    with pytest.raises(ValueError):
+        geometry.prepare_geojson(polygon([[200.0, 45.0], [10.1, 45.0], [10.1, 45.1], [10.0, 45.0]]))
+
+def test_simplification_drops_vertices_within_half_a_pixel():
+    # A square edge with 50 points wobbling ~1m off the line
+    edge = [[10.0 + 0.1 * i / 50, 45.0 + (1 if i % 2 else -1) * 1e-5] for i in range(50)]
+    ring = edge + [[10.1, 45.1], [10.0, 45.1], edge[0]]
+    simplified = geometry.prepare_geojson(polygon(ring), reduction_scale=10)['coordinates'][0]
+    assert len(simplified) < 10
+    assert simplified[0] == simplified[-1]
+    # At 1m the wobble is kept
+    assert len(geometry.prepare_geojson(polygon(ring), reduction_scale=1)['coordinates'][0]) == len(ring)
+
+def test_simplification_never_collapses_a_ring():
+    tiny = [[10.0, 45.0], [10.00001, 45.0], [10.00002, 45.0], [10.00002, 45.00001], [10.00001, 45.00001], [10.0, 45.00001], [10.0, 45.0]]
+    simplified = geometry.prepare_geojson(polygon(tiny), reduction_scale=1000)['coordinates'][0]
+    assert len(simplified) >= 4
+
+def test_hash_ignores_start_vertex_direction_and_tiny_noise():
+    base = geometry.geometry_hash(polygon(SQUARE))
+    rotated = SQUARE[2:-1] + SQUARE[:2] + [SQUARE[2]]
+    assert geometry.geometry_hash(polygon(rotated)) == base
+    assert geometry.geometry_hash(polygon(list(reversed(SQUARE)))) == base
+    assert geometry.geometry_hash(polygon([[lon + 1e-8, lat] for lon, lat in SQUARE])) == base
+    assert geometry.geometry_hash(polygon([[lon + 1e-3, lat] for lon, lat in SQUARE])) != base
+
+def test_hash_sorts_polygons_and_keeps_point_buffers():
+    other = [[lon + 1, lat] for lon, lat in SQUARE]
+    first = {"type": "MultiPolygon", "coordinates": [[SQUARE], [other]]}
+    second = {"type": "MultiPolygon", "coordinates": [[other], [SQUARE]]}
+    assert geometry.geometry_hash(first) == geometry.geometry_hash(second)
+    assert geometry.geometry_hash(polygon(SQUARE)) == geometry.geometry_hash({"type": "MultiPolygon", "coordinates": [[SQUARE]]})
+    point = {"type": "Point", "coordinates": [10.0, 45.0]}
+    assert geometry.geometry_hash(point, 100) != geometry.geometry_hash(point, 200)
@@ -0,0 +1,42 @@
+import pytest
+
+from common import preflight
+
+REPORT = {
+    'DEFORESTATION': {'previous': {'scene_count': 3, 'coverage': 0.9}, 'recent': {'scene_count': 0, 'coverage': 0}},
+    'GLACIER': {'recent': {'scene_count': 2, 'coverage': 0.4}},
+}
+
+@pytest.fixture
+def report(monkeypatch):
+    requests = []
+    def preflight_report(windows_by_detector):
+        requests.append(sorted(windows_by_detector))
+        return {detector: REPORT[detector] for detector in windows_by_detector}
+    monkeypatch.setattr(preflight, 'PREFLIGHT_ENABLED', True)
+    monkeypatch.setattr(preflight, 'preflight_report', preflight_report)
+    return requests
+
+def test_preflight_failures_uses_one_request_and_detector_error_fields(report):
+    failures = preflight.preflight_failures(
+        {'DEFORESTATION': {'recent': 'w'}, 'GLACIER': {'recent': 'w'}},
+        {'DEFORESTATION': {'mean_ndvi_change': None, 'threshold': -0.1}}
+    )
+    assert report == [['DEFORESTATION', 'GLACIER']]
+    assert list(failures) == ['DEFORESTATION']
+    failure = failures['DEFORESTATION']
+    assert failure['status'] == 'error'
+    assert 'recent period' in failure['message']
+    assert failure['threshold'] == -0.1
+    assert failure['preflight'] == REPORT['DEFORESTATION']
+
+def test_preflight_failure_returns_none_when_windows_are_usable(report, monkeypatch):
+    assert preflight.preflight_failure('GLACIER', {'recent': 'w'}) is None
+    monkeypatch.setattr(preflight, 'MIN_COVERAGE', 0.5)
+    assert preflight.preflight_failure('GLACIER', {'recent': 'w'})['status'] == 'error'
+
+def test_preflight_is_skipped_when_off_or_without_windows(report, monkeypatch):
+    assert preflight.preflight_failures({'GLACIER': {}}) == {}
+    monkeypatch.setattr(preflight, 'PREFLIGHT_ENABLED', False)
+    assert preflight.preflight_failure('DEFORESTATION', {'recent': 'w'}) is None
+    assert report == []
@@ -0,0 +1,44 @@
+import os
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+import ee
+from common import raster
+import coastal_erosion
+
+def make_raster(region):
+    region = np.asarray(region, dtype=bool)
+    return {'bands': {}, 'region': region, 'grid': [10.0, 46.0, 0.1, 0.1], 'start': None, 'end': None}
+
+def test_region_centroid_is_lon_first_pixel_centre_mean():
+    window = make_raster([[True, True], [False, False]])
+    assert raster.region_centroid(window) == pytest.approx([10.1, 45.95])
+    assert raster.region_centroid(make_raster([[False]])) is None
+
+def test_local_windows_reuse_the_grid_request_for_scene_counts():
+    if not hasattr(ee, 'recorded_calls'):
+        pytest.skip('needs the benchmark fake to count requests')
+    ee.reset_calls()
+    rasters = coastal_erosion.local_rasters(ee.Geometry.Point([10.0, 45.0]).buffer(1000))
+    kinds = sorted(call['kind'] for call in ee.recorded_calls())
+    assert kinds == ['computePixels', 'computePixels', 'getInfo']
+    assert raster.scene_count(rasters['recent']) == ee.SCENE_COUNT
+
+def store(directory, size, used_at):
+    directory.mkdir(parents=True)
+    (directory / 'recent.npz').write_bytes(b'x' * size)
+    os.utime(directory, (used_at, used_at))
+
+def test_prune_drops_expired_then_least_recently_used(tmp_path, monkeypatch):
+    monkeypatch.setattr(raster, 'RASTER_DIR', tmp_path)
+    monkeypatch.setattr(raster, 'RASTER_TTL_SECONDS', 100)
+    monkeypatch.setattr(raster, 'RASTER_MAX_BYTES', 25)
+    now = raster.time.time()
+    store(tmp_path / 'expired', 1, now - 200)
+    store(tmp_path / 'old', 10, now - 50)
+    store(tmp_path / 'middle', 10, now - 40)
+    store(tmp_path / 'new', 10, now - 30)
+    raster.prune_raster_cache()
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['middle', 'new']
@@ -0,0 +1,77 @@
+import datetime
+
+import pytest
+
+from common import result_cache
+
+REGION = {"type": "Polygon", "coordinates": [[[10.0, 45.0], [10.1, 45.0], [10.1, 45.1], [10.0, 45.1], [10.0, 45.0]]]}
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(result_cache, 'CACHE_ENABLED', True)
+    monkeypatch.setattr(result_cache, 'CACHE_PATH', tmp_path / 'results.sqlite3')
+    return result_cache
+
+class FakeClock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(result_cache.time, 'time', fake.time)
+    return fake
+
+def test_cached_run_calls_once_and_marks_hits(cache):
+    calls = []
+    def run():
+        calls.append(1)
+        return {"status": "success", "value": 1}
+    assert cache.cached_run('k', 'TEST', run) == {"status": "success", "value": 1}
+    assert cache.cached_run('k', 'TEST', run) == {"status": "success", "value": 1, "cached": True}
+    assert len(calls) == 1
+
+def test_errors_are_not_cached(cache):
+    calls = []
+    def run():
+        calls.append(1)
+        return {"status": "error", "message": "no data"}
+    cache.cached_run('k', 'TEST', run)
+    cache.cached_run('k', 'TEST', run)
+    assert len(calls) == 2
+
+def test_entries_expire_after_ttl(cache, clock, monkeypatch):
+    monkeypatch.setattr(cache, 'CACHE_TTL_SECONDS', 60)
+    cache.store_result('k', 'TEST', {"status": "success"})
+    clock.now += 59
+    assert cache.get_cached_result('k') == {"status": "success"}
+    clock.now += 2
+    assert cache.get_cached_result('k') is None
+
+def test_least_recently_used_entry_is_evicted(cache, clock, monkeypatch):
+    monkeypatch.setattr(cache, 'CACHE_MAX_ENTRIES', 2)
+    cache.store_result('a', 'TEST', {"status": "success", "key": "a"})
+    clock.now += 1
+    cache.store_result('b', 'TEST', {"status": "success", "key": "b"})
+    clock.now += 1
+    assert cache.get_cached_result('a') is not None  # a is now more recent than b
+    clock.now += 1
+    cache.store_result('c', 'TEST', {"status": "success", "key": "c"})
+    assert cache.get_cached_result('b') is None
+    assert cache.get_cached_result('a') is not None
+    assert cache.get_cached_result('c') is not None
+
+def test_cache_key_changes_with_inputs():
+    window = result_cache.analysis_window(30, anchor=datetime.datetime(2026, 1, 1))
+    key = result_cache.cache_key('TEST', REGION, 100, {'threshold': 0.1}, 10, window)
+    assert key == result_cache.cache_key('TEST', REGION, 100, {'threshold': 0.1}, 10, window)
+    assert key != result_cache.cache_key('TEST', REGION, 100, {'threshold': 0.2}, 10, window)
+    point = {"type": "Point", "coordinates": [10.0, 45.0]}
+    # The buffer only changes the area covered by Points
+    assert result_cache.cache_key('TEST', point, 100, {}, 10, window) != result_cache.cache_key('TEST', point, 200, {}, 10, window)
+    next_day = result_cache.analysis_window(30, anchor=datetime.datetime(2026, 1, 2))
+    assert key != result_cache.cache_key('TEST', REGION, 100, {'threshold': 0.1}, 10, next_day)
+    assert result_cache.cache_key('TEST', {"type": "Polygon"}, 100, {}, 10, window) is None
@@ -0,0 +1,50 @@
+import datetime
+import math
+
+import pytest
+
+import ee
+from common import scale, result_cache
+
+POINT = {"type": "Point", "coordinates": [10.0, 45.0]}
+
+def evaluate_number(node, area):
+    """Evaluates an adaptive_scale expression of the benchmark fake, with area for the region's area."""
+    if not isinstance(node, ee.Node):
+        return node
+    if node._op == 'area':
+        return area
+    if node._op == 'Number':
+        return evaluate_number(node._args[0], area)
+    value = evaluate_number(node._parent, area)
+    args = [evaluate_number(arg, area) for arg in node._args]
+    operations = {'divide': lambda: value / args[0], 'sqrt': lambda: math.sqrt(value),
+                  'ceil': lambda: math.ceil(value), 'max': lambda: max(value, args[0])}
+    return operations[node._op]()
+
+@pytest.mark.parametrize('area, budget, expected', [
+    (1e9, 1e7, 30),      # 1000 km² fits the budget at the native 30m
+    (1e11, 1e7, 100),    # 100000 km² covers 1e7 pixels at 100m
+    (1e11, 1e8, 32),     # a larger budget keeps it closer to native: ceil(31.6)
+])
+def test_adaptive_scale_covers_the_pixel_budget(area, budget, expected):
+    if not hasattr(ee, 'Node'):
+        pytest.skip('needs the benchmark fake to evaluate the expression')
+    with scale.pixel_budget(budget):
+        expression = scale.adaptive_scale(ee.Geometry.Point([10.0, 45.0]), 30)
+    assert evaluate_number(expression, area) == expected
+
+def test_pixel_budget_is_scoped_to_the_block():
+    assert scale.current_pixel_budget() == scale.DEFAULT_PIXEL_BUDGET
+    with scale.pixel_budget('5e6'):
+        assert scale.current_pixel_budget() == 5e6
+        with scale.pixel_budget(None):
+            assert scale.current_pixel_budget() == scale.DEFAULT_PIXEL_BUDGET
+        assert scale.current_pixel_budget() == 5e6
+    assert scale.current_pixel_budget() == scale.DEFAULT_PIXEL_BUDGET
+
+def test_pixel_budget_is_part_of_the_result_cache_key():
+    window = result_cache.analysis_window(30, anchor=datetime.datetime(2026, 1, 1))
+    default_key = result_cache.cache_key('TEST', POINT, 100, {}, 10, window)
+    with scale.pixel_budget(1e6):
+        assert result_cache.cache_key('TEST', POINT, 100, {}, 10, window) != default_key
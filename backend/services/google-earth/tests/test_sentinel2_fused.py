@@ -0,0 +1,63 @@
+import pytest
+
+pytest.importorskip('numpy')
+
+from common import result_cache
+import sentinel2_fused
+import deforestation
+
+POINT = {"type": "Point", "coordinates": [10.0, 45.0]}
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(result_cache, 'CACHE_ENABLED', True)
+    monkeypatch.setattr(result_cache, 'CACHE_PATH', tmp_path / 'results.sqlite3')
+
+@pytest.fixture
+def fused_calls(monkeypatch):
+    calls = []
+    def check(region_geometry, category_params, buffer_radius_meters):
+        calls.append(sorted(category_params))
+        return {category: {"status": "success", "category": category} for category in category_params}
+    monkeypatch.setattr(sentinel2_fused, 'check_sentinel2_fused', check)
+    return calls
+
+@pytest.fixture(autouse=True)
+def no_preflight_windows(monkeypatch):
+    # Only the preflight request would read these; the tests replace it
+    for module in sentinel2_fused.CATEGORY_MODULES.values():
+        monkeypatch.setattr(module, 'preflight_windows', lambda region: {'recent': None})
+
+def no_preflight_failures(windows_by_detector, error_fields_by_detector=None):
+    return {}
+
+def test_cached_categories_skip_the_fused_pass(cache, fused_calls, monkeypatch):
+    monkeypatch.setattr(sentinel2_fused, 'preflight_failures', no_preflight_failures)
+    key = deforestation.result_cache_key(POINT, 1000, -0.2)
+    result_cache.store_result(key, 'DEFORESTATION', {"status": "success", "mean_ndvi_change": -0.5})
+
+    results = sentinel2_fused.run_sentinel2_fused(None, POINT, {'GLACIER': {}, 'DEFORESTATION': {'threshold': -0.2}}, 1000)
+    assert list(results) == ['GLACIER', 'DEFORESTATION']
+    assert results['DEFORESTATION'] == {"status": "success", "mean_ndvi_change": -0.5, "cached": True}
+    assert fused_calls == [['GLACIER']]
+
+    # The fused GLACIER result was stored under the single detector's key
+    again = sentinel2_fused.run_sentinel2_fused(None, POINT, {'GLACIER': {}, 'DEFORESTATION': {'threshold': -0.2}}, 1000)
+    assert again['GLACIER']['cached'] is True
+    assert fused_calls == [['GLACIER']]
+
+def test_preflight_failures_are_left_out_of_the_fused_pass(cache, fused_calls, monkeypatch):
+    seen = {}
+    def preflight_failures(windows_by_detector, error_fields_by_detector=None):
+        seen.update(error_fields_by_detector)
+        return {'COASTAL_EROSION': {"status": "error", "message": "no data", **error_fields_by_detector['COASTAL_EROSION']}}
+    monkeypatch.setattr(sentinel2_fused, 'preflight_failures', preflight_failures)
+
+    results = sentinel2_fused.run_sentinel2_fused(None, POINT, {'DEFORESTATION': {}, 'COASTAL_EROSION': {'threshold': 25}}, 1000)
+    assert fused_calls == [['DEFORESTATION']]
+    assert results['COASTAL_EROSION']['status'] == 'error'
+    assert results['COASTAL_EROSION']['threshold'] == 25.0
+    assert seen['DEFORESTATION']['threshold'] == deforestation.DEFAULT_NDVI_DROP_THRESHOLD
+    # Errors are not cached
+    sentinel2_fused.run_sentinel2_fused(None, POINT, {'COASTAL_EROSION': {'threshold': 25}}, 1000)
+    assert fused_calls == [['DEFORESTATION']]
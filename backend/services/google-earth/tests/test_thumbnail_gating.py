@@ -0,0 +1,34 @@
+import pytest
+
+import ee
+import flooding
+
+if not hasattr(ee, 'recorded_calls'):
+    pytest.skip('needs the benchmark fake to count requests', allow_module_level=True)
+
+@pytest.fixture
+def responses(monkeypatch):
+    monkeypatch.setenv('GEE_THUMBNAIL_MODE', 'eager')
+    monkeypatch.setattr(ee, 'RESPONSES', {})
+    ee.reset_calls()
+    return ee.RESPONSES
+
+def region():
+    return ee.Geometry.Point([10.0, 45.0]).buffer(1000)
+
+def thumbnail_calls():
+    return [call for call in ee.recorded_calls() if call['kind'] == 'getThumbURL']
+
+def test_regions_without_data_render_no_thumbnails(responses):
+    responses['total_area_sqkm'] = None
+    result = flooding.check_flooding(region(), 5, 1000)
+    assert result['status'] == 'error'
+    assert (result['start_image_url'], result['end_image_url']) == (None, None)
+    assert thumbnail_calls() == []
+
+def test_successful_checks_render_both_thumbnails(responses):
+    responses.update({'flooded_area_sqkm': 1.0, 'total_area_sqkm': 10.0})
+    result = flooding.check_flooding(region(), 5, 1000)
+    assert result['status'] == 'success'
+    assert result['alert_triggered'] is True
+    assert len(thumbnail_calls()) == 2
@@ -0,0 +1,51 @@
+import json
+import zlib
+import base64
+
+import pytest
+
+import ee
+from common import thumbnails
+
+VIS = {'min': -1, 'max': 1, 'palette': ['red', 'green'], 'bands': ['NDVI']}
+
+@pytest.fixture
+def secret(monkeypatch):
+    monkeypatch.setenv('GEE_THUMBNAIL_SECRET', 'test-secret')
+
+def make_recipe():
+    return thumbnails.thumbnail_recipe(ee.Image('before'), ee.Geometry.Point([10.0, 45.0]), VIS)
+
+def decode(recipe):
+    body = recipe.rsplit('.', 1)[0]
+    return json.loads(zlib.decompress(base64.urlsafe_b64decode(body)))
+
+def test_recipe_keeps_only_vis_params_and_renders(secret):
+    recipe = make_recipe()
+    assert decode(recipe)['vis'] == {'min': -1, 'max': 1, 'palette': ['red', 'green']}
+    if not hasattr(ee, 'recorded_calls'):
+        pytest.skip('needs the benchmark fake to render without Earth Engine')
+    assert thumbnails.render_thumbnail_recipe(recipe).startswith('https://')
+
+@pytest.mark.parametrize('tamper, message', [
+    (lambda recipe: recipe.rsplit('.', 1)[0], 'not signed'),
+    (lambda recipe: 'A' + recipe[1:], 'bad signature'),
+    (lambda recipe: recipe[:-1] + ('A' if recipe[-1] != 'A' else 'B'), 'bad signature'),
+    (lambda recipe: None, 'not signed'),
+])
+def test_tampered_recipes_are_rejected(secret, tamper, message):
+    with pytest.raises(ValueError, match=message):
+        thumbnails.render_thumbnail_recipe(tamper(make_recipe()))
+
+def test_recipes_signed_with_another_key_are_rejected(secret, monkeypatch):
+    recipe = make_recipe()
+    monkeypatch.setenv('GEE_THUMBNAIL_SECRET', 'other-secret')
+    with pytest.raises(ValueError, match='bad signature'):
+        thumbnails.render_thumbnail_recipe(recipe)
+
+def test_lazy_fields_without_a_key_leave_out_the_recipes(monkeypatch):
+    monkeypatch.delenv('GEE_THUMBNAIL_SECRET', raising=False)
+    monkeypatch.setenv('GEE_THUMBNAIL_MODE', 'lazy')
+    monkeypatch.setattr(thumbnails, 'initialized_key_fingerprint', lambda: None)
+    fields = thumbnails.thumbnail_fields(None, ee.Image('before'), ee.Image('after'), ee.Geometry.Point([10.0, 45.0]), VIS)
+    assert fields == {"start_image_url": None, "end_image_url": None}
@@ -0,0 +1,76 @@
+import path from "path";
+import { spawn } from "child_process";
+import { fileURLToPath } from "url";
+import fs from "fs";
+
+// --- Calculate __dirname equivalent in ESM ---
+const __filename = fileURLToPath(import.meta.url);
+const __dirname = path.dirname(__filename);
+
+/**
+ * Renders a lazy thumbnail recipe (start_image_recipe / end_image_recipe) into a URL.
+ * @param {string} recipe - Serialized thumbnail recipe returned by a check
+ * @param {string} credentialsPath - Path to GCP credentials file
+ * @returns {Promise<Object>} - { status, url } or { status: "error", message }
+ */
+function runRenderThumbnail(recipe, credentialsPath) {
+  return new Promise((resolve, reject) => {
+    const pythonExecutable = "python";
+    const scriptPath = path.resolve(__dirname, "render_thumbnail.py");
+
+    if (!fs.existsSync(scriptPath)) {
+      return reject(
+        new Error(`Python script not found at path: ${scriptPath}`)
+      );
+    }
+
+    const pythonProcess = spawn(pythonExecutable, [
+      scriptPath,
+      credentialsPath,
+    ]);
+
+    let scriptOutput = "";
+    let scriptError = "";
+
+    pythonProcess.stdout.on("data", (data) => {
+      scriptOutput += data.toString();
+    });
+
+    pythonProcess.stderr.on("data", (data) => {
+      scriptError += data.toString();
+      console.error(`Python stderr: ${data}`);
+    });
+
+    pythonProcess.on("close", (code) => {
+      const trimmedOutput = scriptOutput.trim();
+      if (!trimmedOutput) {
+        return reject(
+          new Error(
+            `Python script exited with code ${code} and no output. Error output: ${scriptError}`
+          )
+        );
+      }
+      try {
+        // Errors are reported as { status: "error", message } on stdout.
+        resolve(JSON.parse(trimmedOutput));
+      } catch (parseError) {
+        console.error("Raw Python output:", scriptOutput);
+        reject(new Error(`Failed to parse JSON output: ${parseError.message}`));
+      }
+    });
+
+    pythonProcess.on("error", (err) => {
+      console.error("Failed to start Python subprocess:", err);
+      reject(new Error(`Failed to start Python process: ${err.message}`));
+    });
+
+    try {
+      pythonProcess.stdin.write(JSON.stringify({ recipe }));
+      pythonProcess.stdin.end();
+    } catch (stdinError) {
+      reject(new Error(`Error writing to Python stdin: ${stdinError.message}`));
+    }
+  });
+}
+
+export { runRenderThumbnail };
@@ -0,0 +1,47 @@
+import sys
+import json
+import ee
+import traceback
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from common.gee_init import initialize_gee
+from common.thumbnails import render_thumbnail_recipe
+
+# Turns a thumbnail recipe (start_image_recipe / end_image_recipe from a lazy-thumbnail
+# check) into a getThumbURL link. Input on stdin: {"recipe": "..."}.
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("ERROR: Missing credentials file path argument.", file=sys.stderr)
+        print(json.dumps({"status": "error", "message": "Missing credentials file path argument."}))
+        sys.exit(1)
+    credentials_path_from_arg = sys.argv[1]
+
+    try:
+        input_params = json.loads(sys.stdin.read())
+        recipe = input_params['recipe']
+    except Exception as e:
+        print(f"ERROR: Invalid stdin params: {e}", file=sys.stderr)
+        print(json.dumps({"status": "error", "message": f"Invalid Stdin Param: {e}"}))
+        sys.exit(1)
+
+    if not initialize_gee(credentials_path_from_arg):
+        print(json.dumps({"status": "error", "message": "GEE initialization failed."}))
+        sys.exit(1)
+
+    try:
+        result = {"status": "success", "url": render_thumbnail_recipe(recipe)}
+    except ValueError as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        result = {"status": "error", "message": str(e)}
+    except ee.EEException as gee_error:
+        print(f"ERROR: GEE thumbnail rendering failed: {gee_error}", file=sys.stderr)
+        result = {"status": "error", "message": f"GEE Computation Error: {gee_error}"}
+    except Exception as e:
+        print(f"ERROR: Unexpected error rendering thumbnail: {e}", file=sys.stderr)
+        print(traceback.format_exc(), file=sys.stderr)
+        result = {"status": "error", "message": f"Python Script Error: {e}"}
+
+    print(json.dumps(result))
+    sys.exit(0 if result["status"] == "success" else 1)